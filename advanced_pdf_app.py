@@ -4,14 +4,13 @@ Enhanced version with better PDF viewing and text selection capabilities
 """
 
 import streamlit as st
-import fitz  # PyMuPDF
-import tempfile
 import os
-import base64
 from pathlib import Path
 import time
 import json
-from math_video_generator import MathVideoGenerator
+from math_video_generator import get_generator
+from pdf_ingest import open_pdf
+from asset_server import publish_pdf
 
 # Page configuration
 st.set_page_config(
@@ -130,49 +129,29 @@ def initialize_session_state():
 def extract_pdf_content(pdf_file):
     """Extract comprehensive content from PDF using PyMuPDF."""
     try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(pdf_file.getvalue())
-            tmp_path = tmp_file.name
+        # Text comes from the shared content-hash cache when this PDF was seen before
+        document = open_pdf(pdf_file)
+        metadata = dict(document.metadata)
         
-        # Open PDF with PyMuPDF
-        doc = fitz.open(tmp_path)
-        
-        # Extract metadata
-        metadata = {
-            'title': doc.metadata.get('title', 'Unknown'),
-            'author': doc.metadata.get('author', 'Unknown'),
-            'subject': doc.metadata.get('subject', 'Unknown'),
-            'page_count': doc.page_count,
-            'file_size': len(pdf_file.getvalue())
-        }
-        
-        # Extract text from all pages
-        pages_content = []
-        for page_num in range(doc.page_count):
-            page = doc[page_num]
-            
-            # Extract text
-            text = page.get_text()
-            
-            # Extract text blocks with coordinates (for better selection)
-            blocks = page.get_text("blocks")
-            
-            # Get page dimensions
-            rect = page.rect
-            
-            page_info = {
+        def page_info(page_num):
+            page_text = document.page_text(page_num)
+            return {
                 'page_num': page_num + 1,
-                'text': text,
-                'blocks': blocks,
-                'width': rect.width,
-                'height': rect.height,
-                'word_count': len(text.split()) if text else 0
+                'text': page_text['text'],
+                'math_text': document.math_text(page_num)['text'],  # Formulas as LaTeX, for prompts
+                'blocks': page_text['blocks'],  # Text blocks with coordinates (for better selection)
+                'width': page_text['width'],
+                'height': page_text['height'],
+                'word_count': page_text['word_count']
             }
-            pages_content.append(page_info)
         
-        doc.close()
-        os.unlink(tmp_path)
+        # Analysis needs every page: extract them across worker processes, streaming progress
+        progress_bar = st.progress(0.0)
+        for done, _ in enumerate(document.render_pages(zoom=None), start=1):
+            progress_bar.progress(done / document.page_count, text=f"Extracted {done} of {document.page_count} pages")
+        progress_bar.empty()
+        
+        pages_content = document.lazy(page_info)
         
         return pages_content, metadata
     
@@ -183,8 +162,8 @@ def extract_pdf_content(pdf_file):
 def create_enhanced_pdf_viewer(pdf_file):
     """Create enhanced PDF viewer with better controls."""
     try:
-        # Convert PDF to base64 for display
-        base64_pdf = base64.b64encode(pdf_file.getvalue()).decode('utf-8')
+        # Published once per upload (the URL is kept in the session); the browser fetches byte ranges as it pages
+        pdf_url = publish_pdf(pdf_file, published=st.session_state.setdefault('published_pdfs', {}))
         
         # Enhanced PDF viewer with controls
         pdf_viewer_html = f'''
@@ -193,7 +172,7 @@ def create_enhanced_pdf_viewer(pdf_file):
                 <h5 style="margin: 0; color: #495057;">📄 PDF Viewer</h5>
                 <small style="color: #6c757d;">Click and drag to select text, then copy to generate videos</small>
             </div>
-            <iframe src="data:application/pdf;base64,{base64_pdf}" 
+            <iframe src="{pdf_url}" 
                     width="100%" height="700px" type="application/pdf"
                     style="border: none;">
                 <p>Your browser does not support PDFs. Please download the PDF to view it.</p>
@@ -249,7 +228,7 @@ def display_page_content(page_info, page_num):
     # Editable text area for easy selection
     selected_text = st.text_area(
         "Page Text:",
-        value=page_info['text'],
+        value=page_info['math_text'],
         height=400,
         key=f"page_content_{page_num}",
         help="Select and copy the mathematical content you want to create a video for"
@@ -450,13 +429,13 @@ def main():
                 if st.session_state.pdf_pages_text:
                     st.subheader("📖 Page Navigation")
                     
-                    page_options = [f"Page {i+1} ({page['word_count']} words)" 
-                                  for i, page in enumerate(st.session_state.pdf_pages_text)]
+                    # Labels must not touch page contents, or every page would be extracted up front
+                    page_count = len(st.session_state.pdf_pages_text)
                     
                     selected_page_idx = st.selectbox(
                         "Select Page:",
                         range(len(st.session_state.pdf_pages_text)),
-                        format_func=lambda x: page_options[x]
+                        format_func=lambda x: f"Page {x + 1} of {page_count}"
                     )
                     
                     # Display selected page content
@@ -479,7 +458,7 @@ def main():
             
             try:
                 # Initialize generator
-                generator = MathVideoGenerator()
+                generator = get_generator()
                 
                 # Add to video history
                 video_info = {
@@ -502,26 +481,21 @@ def main():
                     progress_bar = st.progress(0)
                     status_text = st.empty()
                     
-                    status_text.text("🤖 AI analyzing mathematical content...")
-                    progress_bar.progress(20)
-                    time.sleep(1)
-                    
-                    status_text.text("📝 Generating Manim animation code...")
-                    progress_bar.progress(40)
+                    # Progress is driven by the generator's real pipeline stages
+                    def update_progress(event):
+                        progress_bar.progress(event["progress"])
+                        status_text.text(event["message"])
                     
                     # Generate video
                     video_path = generator.create_video(
                         math_topic=user_input,
                         difficulty=difficulty,
                         duration=duration,
-                        quality=quality
+                        quality=quality,
+                        progress_callback=update_progress,
+                        preview=False
                     )
                     
-                    progress_bar.progress(80)
-                    status_text.text("🎬 Rendering final video...")
-                    time.sleep(1)
-                    progress_bar.progress(100)
-                    
                     # Clear progress
                     progress_bar.empty()
                     status_text.empty()
@@ -0,0 +1,469 @@
+"""
+Static Asset Server for the Math Video Generator Apps
+Content-addressed store of encoded page images and uploaded PDFs, served same-origin through
+Streamlit's static file serving (or a separate HTTP server behind a proxy) with cache headers
+and byte ranges, so the browser fetches each asset once (and PDFs incrementally) instead of
+receiving it inline on every rerun.
+"""
+
+import io
+import os
+import re
+import sys
+import base64
+import hashlib
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from pdf_ingest import PageSequence, pdf_digest, get_page_cache, SPOOL_THRESHOLD_BYTES
+
+# Encoding of published page images
+IMAGE_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+CONTENT_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg", "pdf": "application/pdf"}
+
+ASSET_NAME_RE = re.compile(r"^[0-9a-f]{64}\.(webp|jpeg|pdf)$")
+BYTE_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+# Asset URLs never change meaning, so browsers may keep them for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _remove_file(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+class AssetStore:
+    """Directory of immutable assets named by the SHA-256 of what they were derived from."""
+
+    def __init__(self, root, max_bytes=1024 ** 3):
+        """
+        Initialize the store.
+
+        Args:
+            root (str | Path): Directory holding the assets
+            max_bytes (int): Total size above which the least recently written assets are removed
+        """
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def name_for(self, extension, *parts):
+        """Return the asset name for content identified by the given parts."""
+        digest = hashlib.sha256("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+        return f"{digest}.{extension}"
+
+    def path_for(self, name):
+        if not ASSET_NAME_RE.match(name):
+            raise ValueError(f"Invalid asset name: {name!r}")
+        return self.root / name
+
+    def exists(self, name):
+        return self.path_for(name).is_file()
+
+    def write(self, name, data):
+        """Atomically store an asset, evicting old ones every so often."""
+        path = self.path_for(name)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Could not write asset {name}: {e}")
+            _remove_file(tmp_path)
+            return
+
+        with self._lock:
+            self._writes += 1
+            due = self._writes % 50 == 0
+        if due:
+            self.evict()
+
+    def link(self, name, source):
+        """
+        Store an asset as a hard link to an existing file, so it takes no extra space.
+
+        Returns:
+            bool: False when linking is impossible (another filesystem, no link support)
+        """
+        path = self.path_for(name)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            os.link(source, tmp_path)
+            os.replace(tmp_path, path)
+        except OSError:
+            _remove_file(tmp_path)
+            return False
+        return True
+
+    def evict(self):
+        """Remove the oldest assets until the store fits in max_bytes."""
+        entries = []
+        total = 0
+        for path in self.root.iterdir():
+            if not ASSET_NAME_RE.match(path.name):
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            _remove_file(path)
+            total -= size
+
+
+def parse_byte_range(header, size):
+    """
+    Parse a single-range Range header.
+
+    Returns:
+        tuple: (start, end) inclusive, None when the range cannot be satisfied, or
+            (0, size - 1) for headers this server ignores (multiple or malformed ranges)
+    """
+    match = BYTE_RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return 0, size - 1
+
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0:
+            return None
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return None
+    return start, end
+
+
+class AssetRequestHandler(BaseHTTPRequestHandler):
+    """Serve /assets/<name> from the store with immutable caching, ETags and byte ranges."""
+
+    store = None
+
+    def do_GET(self):
+        self._send_asset(include_body=True)
+
+    def do_HEAD(self):
+        self._send_asset(include_body=False)
+
+    def _send_asset(self, include_body):
+        prefix = "/assets/"
+        name = self.path.split("?", 1)[0][len(prefix):] if self.path.startswith(prefix) else ""
+        if not ASSET_NAME_RE.match(name) or not self.store.exists(name):
+            self.send_error(404, "Asset not found")
+            return
+
+        etag = f'"{name.split(".")[0]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", IMMUTABLE_CACHE_CONTROL)
+            self.end_headers()
+            return
+
+        path = self.store.path_for(name)
+        size = path.stat().st_size
+        start, end = 0, size - 1
+        status = 200
+        if self.headers.get("Range"):
+            byte_range = parse_byte_range(self.headers["Range"], size)
+            if byte_range is None:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if byte_range != (0, size - 1):
+                start, end = byte_range
+                status = 206
+
+        self.send_response(status)
+        self.send_header("Content-Type", CONTENT_TYPES[name.rsplit(".", 1)[1]])
+        self.send_header("Content-Length", str(end - start + 1))
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", IMMUTABLE_CACHE_CONTROL)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Expose-Headers", "Accept-Ranges, Content-Range, Content-Length")
+        self.end_headers()
+        if not include_body:
+            return
+
+        try:
+            with open(path, "rb") as f:
+                f.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            # PDF viewers routinely abandon range requests they no longer need
+            pass
+
+    def log_message(self, format, *args):
+        # Page loads would flood the Streamlit console
+        pass
+
+
+class AssetServer:
+    """Background HTTP server for an AssetStore."""
+
+    def __init__(self, store, host="127.0.0.1", port=8765, base_url=None):
+        """
+        Start serving the store.
+
+        Args:
+            store (AssetStore): Assets to serve
+            host (str): Interface to bind
+            port (int): Port to bind; when it is taken and no base_url is configured,
+                a free port is used instead
+            base_url (str): Public URL prefix of the server, if it sits behind a proxy
+        """
+        self.store = store
+        handler = type("BoundAssetRequestHandler", (AssetRequestHandler,), {"store": store})
+        try:
+            self.httpd = ThreadingHTTPServer((host, port), handler)
+        except OSError:
+            if base_url:
+                raise
+            # Another app process already holds the port; any free port will do
+            self.httpd = ThreadingHTTPServer((host, 0), handler)
+        self.httpd.daemon_threads = True
+
+        bound_port = self.httpd.server_address[1]
+        public_host = "localhost" if host in ("0.0.0.0", "127.0.0.1") else host
+        self.base_url = (base_url or f"http://{public_host}:{bound_port}").rstrip("/")
+
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="asset-server", daemon=True)
+        self._thread.start()
+        print(f"🖼️ Serving assets at {self.base_url}/assets/")
+
+    def url_for(self, name):
+        return f"{self.base_url}/assets/{name}"
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class StaticAssets:
+    """Assets in the app's static/ folder, served same-origin by Streamlit at /app/static/."""
+
+    def __init__(self, store, base_path):
+        """
+        Args:
+            store (AssetStore): Store rooted inside the static/ folder
+            base_path (str): URL path of the store's directory, e.g. /app/static/mvg-assets
+        """
+        self.store = store
+        self.base_path = base_path.rstrip("/")
+
+    def url_for(self, name):
+        # Streamlit's tornado handler only sends a long max-age for URLs with a "v" argument;
+        # names are content hashes, so the name itself is the version
+        return f"{self.base_path}/{name}?v={name.rsplit('.', 1)[0]}"
+
+
+class InlineAssets:
+    """Fallback that embeds assets as data: URLs when nothing can serve them by URL."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def url_for(self, name):
+        data = self.store.path_for(name).read_bytes()
+        content_type = CONTENT_TYPES[name.rsplit(".", 1)[1]]
+        return f"data:{content_type};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+# Subdirectory of the Streamlit app's static/ folder that holds the assets
+STATIC_ASSET_DIR = "mvg-assets"
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def _streamlit_static_serving():
+    """Return the URL prefix of Streamlit's static files, or None when static serving is off."""
+    try:
+        import streamlit as st
+        if not st.get_option("server.enableStaticServing"):
+            return None
+        base_path = (st.get_option("server.baseUrlPath") or "").strip("/")
+    except Exception:
+        return None
+    return f"/{base_path}/app/static" if base_path else "/app/static"
+
+
+def _resolve_asset_mode():
+    mode = os.environ.get("MVG_ASSET_MODE", "").lower()
+    if mode in ("static", "server", "inline"):
+        return mode
+    if os.environ.get("MVG_ASSET_BASE_URL"):
+        return "server"
+    return "static" if _streamlit_static_serving() else "inline"
+
+
+def get_asset_server():
+    """
+    Return the process-wide asset host, creating it on first use.
+
+    MVG_ASSET_MODE picks how the browser reaches assets:
+
+    - static: the app's static/ folder, served by Streamlit on the app's own origin and port
+      (needs server.enableStaticServing, which .streamlit/config.toml turns on)
+    - server: a separate HTTP server on MVG_ASSET_HOST:MVG_ASSET_PORT (default
+      127.0.0.1:8765), reachable by remote browsers only through MVG_ASSET_BASE_URL
+    - inline: data: URLs, as before the asset store existed
+
+    By default "server" is used when MVG_ASSET_BASE_URL is set, otherwise "static" when
+    Streamlit static serving is on, otherwise "inline". MVG_ASSET_MAX_MB (default 1024)
+    bounds the store; MVG_ASSET_DIR overrides its location outside static mode.
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            mode = _resolve_asset_mode()
+            max_bytes = int(os.environ.get("MVG_ASSET_MAX_MB", "1024")) * 1024 * 1024
+            if mode == "static":
+                # Streamlit serves static/ next to the main script
+                app_dir = os.path.dirname(os.path.abspath(sys.argv[0])) if sys.argv and sys.argv[0] else os.getcwd()
+                store = AssetStore(os.path.join(app_dir, "static", STATIC_ASSET_DIR), max_bytes=max_bytes)
+                _server = StaticAssets(store, f"{_streamlit_static_serving() or '/app/static'}/{STATIC_ASSET_DIR}")
+            else:
+                store = AssetStore(
+                    os.environ.get("MVG_ASSET_DIR", os.path.join("math_videos", ".cache", "assets")),
+                    max_bytes=max_bytes
+                )
+                if mode == "server":
+                    _server = AssetServer(
+                        store,
+                        host=os.environ.get("MVG_ASSET_HOST", "127.0.0.1"),
+                        port=int(os.environ.get("MVG_ASSET_PORT", "8765")),
+                        base_url=os.environ.get("MVG_ASSET_BASE_URL")
+                    )
+                else:
+                    _server = InlineAssets(store)
+            print(f"🖼️ Serving PDF assets in {mode} mode")
+        return _server
+
+
+def encode_image(image, image_format=None, quality=None):
+    """
+    Encode a PIL image for the browser.
+
+    Args:
+        image: PIL image
+        image_format (str): "webp" or "jpeg", defaults to MVG_PAGE_IMAGE_FORMAT (webp)
+        quality (int): Encoder quality 1-100, defaults to MVG_PAGE_IMAGE_QUALITY (80)
+
+    Returns:
+        bytes: Encoded image
+    """
+    image_format = image_format or os.environ.get("MVG_PAGE_IMAGE_FORMAT", "webp").lower()
+    quality = quality or int(os.environ.get("MVG_PAGE_IMAGE_QUALITY", "80"))
+    pil_format = IMAGE_FORMATS[image_format]
+
+    if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format=pil_format, quality=quality)
+    return buffer.getvalue()
+
+
+def publish_page(document, page_index, zoom):
+    """
+    Publish a rendered page and return where the browser can fetch it.
+
+    A page already in the store is neither rendered nor encoded again.
+
+    Returns:
+        dict: url of the page image and its size as (width, height)
+    """
+    server = get_asset_server()
+    image_format = os.environ.get("MVG_PAGE_IMAGE_FORMAT", "webp").lower()
+    quality = int(os.environ.get("MVG_PAGE_IMAGE_QUALITY", "80"))
+    name = server.store.name_for(image_format, document.digest, page_index, zoom, quality)
+
+    if not server.store.exists(name):
+        image = document.page_image(page_index, zoom)
+        server.store.write(name, encode_image(image, image_format, quality))
+
+    return {"url": server.url_for(name), "size": document.image_size(page_index, zoom)}
+
+
+def page_image_urls(document, zoom):
+    """Return every page as a lazily published {url, size} sequence that prefetches neighbours."""
+    return PageSequence(
+        document.page_count,
+        lambda page_index: publish_page(document, page_index, zoom),
+        on_access=lambda page_index: document.prefetch(
+            page_index, zoom, warm=lambda neighbour: publish_page(document, neighbour, zoom)
+        )
+    )
+
+
+def publish_pdf(pdf_file, published=None):
+    """
+    Publish an uploaded PDF so viewers can load it by URL, fetching byte ranges on demand.
+
+    The file is stored once under its content hash; publishing it again copies nothing.
+    Uploads large enough to be spooled by pdf_ingest share the spool's disk blocks through
+    a hard link.
+
+    Args:
+        pdf_file: Streamlit upload or any BytesIO-like object
+        published (dict): Asset names by upload ID (e.g. in st.session_state), so reruns
+            with the same upload skip hashing it again
+
+    Returns:
+        str: URL of the PDF
+    """
+    server = get_asset_server()
+    upload_id = getattr(pdf_file, "file_id", None) or getattr(pdf_file, "id", None)
+    name = published.get(upload_id) if published is not None and upload_id else None
+    if name and server.store.exists(name):
+        return server.url_for(name)
+
+    buffer = pdf_file.getbuffer() if hasattr(pdf_file, "getbuffer") else memoryview(pdf_file.getvalue())
+    try:
+        digest = pdf_digest(buffer)
+        name = f"{digest}.pdf"
+        if not server.store.exists(name):
+            if buffer.nbytes > SPOOL_THRESHOLD_BYTES:
+                # Spool the upload where open_pdf will look for it, then link instead of copying
+                cache = get_page_cache()
+                source = cache.source_path(digest)
+                if not source.exists():
+                    cache.write_bytes(source, buffer)
+                if not (source.exists() and server.store.link(name, source)):
+                    server.store.write(name, buffer)
+            else:
+                server.store.write(name, buffer)
+    finally:
+        buffer.release()
+
+    if published is not None and upload_id:
+        published[upload_id] = name
+    return server.url_for(name)
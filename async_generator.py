@@ -0,0 +1,374 @@
+"""
+Async API for Math Video Generator
+asyncio versions of code generation and Manim rendering, with cancellation and timeouts,
+so one event loop can multiplex many in-flight generations.
+"""
+
+import os
+import re
+import time
+import asyncio
+import functools
+from pathlib import Path
+import httpx
+from openai import AsyncOpenAI
+from math_video_generator import (
+    MathVideoGenerator,
+    CompletionStreamMonitor,
+    ManimProgressParser,
+    GenerationAborted,
+    SYSTEM_PROMPT_VERSION,
+    MAX_COMPLETION_TOKENS,
+    report_progress,
+)
+from code_validator import manim_namespace
+
+# Manim redraws its progress bars with carriage returns, so split on any line ending
+LINE_END_RE = re.compile(rb'\r\n|\r|\n')
+
+
+class AsyncMathVideoGenerator(MathVideoGenerator):
+    """
+    MathVideoGenerator with coroutine methods built on AsyncOpenAI and asyncio subprocesses.
+
+    Caches, prompts, scene files and progress events are shared with the synchronous
+    generator. The async HTTP client is bound to the event loop that first uses it, so
+    create one generator per loop and close it with aclose() (or use "async with").
+    Cancelling a coroutine closes the LLM stream or kills the Manim process.
+    """
+
+    def __init__(self):
+        """Initialize the generator and its async GitHub AI client."""
+        super().__init__()
+
+        timeout = float(os.environ.get("MVG_OPENAI_TIMEOUT", "120"))
+        max_connections = int(os.environ.get("MVG_OPENAI_MAX_CONNECTIONS", "20"))
+        self.async_client = AsyncOpenAI(
+            base_url=self.endpoint,
+            api_key=self.token,
+            timeout=timeout,
+            max_retries=int(os.environ.get("MVG_OPENAI_MAX_RETRIES", "2")),
+            http_client=httpx.AsyncClient(
+                timeout=httpx.Timeout(timeout, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                    keepalive_expiry=120
+                )
+            ),
+        )
+
+        # Default timeouts in seconds; 0 disables them
+        self.llm_timeout = float(os.environ.get("MVG_ASYNC_LLM_TIMEOUT", "180")) or None
+        self.render_timeout = float(os.environ.get("MVG_ASYNC_RENDER_TIMEOUT", "900")) or None
+
+    async def aclose(self):
+        """Close the async HTTP client."""
+        await self.async_client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def agenerate_manim_code(self, math_topic, difficulty="intermediate", duration=30, use_cache=True,
+                                   progress_callback=None, stream=None, timeout=None):
+        """
+        Generate Manim code for a given math topic without blocking the event loop.
+
+        Args:
+            math_topic (str): The mathematical concept to visualize
+            difficulty (str): Difficulty level (beginner, intermediate, advanced)
+            duration (int): Approximate duration of the video in seconds
+            use_cache (bool): Reuse previously generated code for the same request
+            progress_callback (callable): Optional receiver of progress events
+            stream (bool): Consume the completion incrementally and abort malformed code early
+            timeout (float): Seconds before the request is abandoned (defaults to MVG_ASYNC_LLM_TIMEOUT)
+
+        Returns:
+            str: Generated Manim code, or None on failure or timeout
+        """
+        use_cache = use_cache and self.use_code_cache
+        stream = self.stream_llm if stream is None else stream
+        timeout = self.llm_timeout if timeout is None else timeout
+        cache_key = self.code_cache.key_for(math_topic, difficulty, duration, self.model, SYSTEM_PROMPT_VERSION)
+
+        if use_cache:
+            cached_code = await self._in_thread(self.code_cache.get, cache_key)
+            if cached_code:
+                print("⚡ Using cached Manim code")
+                report_progress(progress_callback, "llm_response", 25, "⚡ Reusing previously generated code", cached=True)
+                return cached_code
+
+        report_progress(progress_callback, "llm_request", 5, "🤖 Sending request to AI model...")
+        # Name checks import manim the first time; do that off the loop before the stream checks code
+        if self.check_names:
+            await self._in_thread(manim_namespace)
+        messages = self._build_messages(math_topic, difficulty, duration)
+
+        try:
+            if stream:
+                request = self._astream_completion(messages, progress_callback)
+            else:
+                request = self._acomplete(messages, progress_callback)
+            code = await asyncio.wait_for(request, timeout)
+
+            if use_cache and code and (await self._in_thread(self.validate_code, code))["valid"]:
+                await self._in_thread(
+                    self.code_cache.put, cache_key, code,
+                    topic=math_topic, difficulty=difficulty, duration=duration, model=self.model
+                )
+
+            return code
+
+        except asyncio.TimeoutError:
+            print(f"⏱️ Manim code generation timed out after {timeout:.0f}s")
+            report_progress(progress_callback, "failed", 0, f"❌ AI request timed out after {timeout:.0f}s")
+            return None
+        except GenerationAborted as e:
+            print(f"⛔ Aborted Manim code generation: {e}")
+            report_progress(progress_callback, "failed", 0, f"❌ Generated code rejected early: {e}")
+            return None
+        except Exception as e:
+            print(f"Error generating Manim code: {e}")
+            return None
+
+    async def _acomplete(self, messages, progress_callback=None):
+        """Request a whole completion at once."""
+        response = await self.async_client.chat.completions.create(
+            messages=messages,
+            model=self.model,
+            temperature=0.7,
+            max_tokens=MAX_COMPLETION_TOKENS
+        )
+        return self._completion_text(response, progress_callback)
+
+    async def _astream_completion(self, messages, progress_callback=None):
+        """Stream a completion, validating the code block as soon as it closes (see _stream_completion)."""
+        monitor = CompletionStreamMonitor(self._check_streamed_code, progress_callback)
+
+        response = await self.async_client.chat.completions.create(
+            messages=messages,
+            model=self.model,
+            temperature=0.7,
+            max_tokens=MAX_COMPLETION_TOKENS,
+            stream=True
+        )
+
+        try:
+            async for chunk in response:
+                if chunk.choices and monitor.feed(chunk.choices[0].delta.content):
+                    break
+        finally:
+            # Also runs on cancellation and timeout, releasing the connection immediately
+            await response.close()
+
+        if not monitor.closed:
+            self._check_streamed_code(self.clean_generated_code(monitor.text))
+        return monitor.finish()
+
+    async def aprepare_scene(self, math_topic, difficulty="intermediate", duration=30, use_cache=True,
+                             progress_callback=None, timeout=None, job_id=None):
+        """
+        Generate, clean and save the Manim scene for a topic (see prepare_scene).
+
+        Returns:
+            dict: Scene details (topic, difficulty, duration, code, scene_file, scene_name,
+                output_name, media_dir, cache_key), or None on failure
+        """
+        math_topic = self._compact_topic(math_topic, progress_callback)
+        print(f"Generating Manim code for: {math_topic}")
+
+        manim_code = await self.agenerate_manim_code(
+            math_topic, difficulty, duration, use_cache=use_cache,
+            progress_callback=progress_callback, timeout=timeout
+        )
+
+        cache_key = self.code_cache.key_for(math_topic, difficulty, duration, self.model, SYSTEM_PROMPT_VERSION)
+        scene = await self._in_thread(
+            self._save_scene, math_topic, manim_code, progress_callback, cache_key if use_cache else None, job_id
+        )
+        if scene:
+            scene.update(difficulty=difficulty, duration=duration)
+        return scene
+
+    async def arender_scene(self, scene, quality="medium_quality", use_cache=True, progress_callback=None,
+                            timeout=None, max_repairs=None):
+        """
+        Render a prepared scene with Manim in a subprocess, repairing fixable failures (see render_scene).
+
+        Args:
+            scene (dict): Scene details returned by aprepare_scene(); updated in place if its code is repaired
+            quality (str): Video quality (low_quality, medium_quality, high_quality)
+            use_cache (bool): Reuse a previous render of byte-identical scene code
+            progress_callback (callable): Optional receiver of progress events
+            timeout (float): Seconds before each Manim run is killed (defaults to MVG_ASYNC_RENDER_TIMEOUT)
+            max_repairs (int): Repair attempts after a fixable failure (defaults to MVG_MAX_REPAIR_ATTEMPTS)
+
+        Returns:
+            str: Path to the generated video file (or the scene file if FFmpeg is missing)
+        """
+        timeout = self.render_timeout if timeout is None else timeout
+        max_repairs = self.max_repair_attempts if max_repairs is None else max_repairs
+        attempts = []
+
+        try:
+            while True:
+                plan = await self._in_thread(self._plan_render, scene, quality, use_cache, progress_callback)
+                if plan["cached_video"]:
+                    return plan["cached_video"]
+
+                render_started = time.time()
+                returncode, output = await self._arun_manim(
+                    plan["cmd"], self._count_animations(scene["code"]), progress_callback, timeout
+                )
+                attempt = self._record_attempt(attempts, returncode, output, time.time() - render_started)
+
+                if returncode == 0 or not attempt["fixable"] or len(attempts) > max_repairs:
+                    break
+
+                repaired = await self._arepair_scene(scene, attempt["error"], len(attempts), max_repairs,
+                                                     progress_callback)
+                attempt["repair_seconds"] = time.time() - render_started - attempt["render_seconds"]
+                if repaired is None:
+                    break
+                # Update in place so later renders of this scene (e.g. the final quality) reuse the fix
+                scene.update(repaired)
+
+            return await self._in_thread(
+                self._collect_render, scene, plan, returncode, output, progress_callback, attempts
+            )
+
+        except asyncio.TimeoutError:
+            print(f"⏱️ Manim rendering timed out after {timeout:.0f}s")
+            report_progress(progress_callback, "failed", 0, f"❌ Rendering timed out after {timeout:.0f}s")
+            return None
+        except Exception as e:
+            return self._render_error(scene, e, progress_callback)
+
+    async def _arepair_scene(self, scene, error, attempt, max_repairs, progress_callback=None):
+        """Ask the AI to fix a scene that failed to render (see _repair_scene)."""
+        self._announce_repair(error, attempt, max_repairs, progress_callback)
+
+        try:
+            response = await asyncio.wait_for(
+                self.async_client.chat.completions.create(
+                    messages=self._repair_messages(scene, error),
+                    model=self.model,
+                    temperature=0.2,
+                    max_tokens=MAX_COMPLETION_TOKENS
+                ),
+                self.llm_timeout
+            )
+            code = response.choices[0].message.content.strip()
+        except Exception as e:
+            print(f"Error requesting a repair: {e}")
+            return None
+
+        return await self._in_thread(self._apply_repair, scene, code, progress_callback)
+
+    @staticmethod
+    async def _in_thread(func, *args, **kwargs):
+        """Run blocking work (file copies, SQLite, validation) in the default executor, off the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+    async def _arun_manim(self, cmd, total_animations, progress_callback=None, timeout=None):
+        """
+        Run a Manim render as an asyncio subprocess, turning its log output into progress events.
+
+        The process is killed if the timeout elapses or the calling task is cancelled.
+
+        Returns:
+            tuple: (return code, combined stdout/stderr output)
+
+        Raises:
+            asyncio.TimeoutError: If the render takes longer than timeout seconds
+        """
+        parser = ManimProgressParser(total_animations, progress_callback)
+
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT, cwd=str(Path.cwd())
+        )
+
+        async def drain():
+            pending = b""
+            while True:
+                chunk = await process.stdout.read(4096)
+                if not chunk:
+                    break
+                *lines, pending = LINE_END_RE.split(pending + chunk)
+                for line in lines:
+                    parser.feed(line.decode("utf-8", errors="replace") + "\n")
+            if pending:
+                parser.feed(pending.decode("utf-8", errors="replace"))
+            return await process.wait()
+
+        try:
+            returncode = await asyncio.wait_for(drain(), timeout)
+        except BaseException:
+            # Timeout or cancellation: do not leave Manim running in the background
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+
+        return returncode, parser.output
+
+    async def acreate_video(self, math_topic, difficulty="intermediate", duration=30, quality="medium_quality",
+                            use_cache=True, progress_callback=None, llm_timeout=None, render_timeout=None,
+                            job_id=None):
+        """
+        Create a math visualization video for the given topic (see create_video).
+
+        Args:
+            math_topic (str): The mathematical concept to visualize
+            difficulty (str): Difficulty level
+            duration (int): Target duration in seconds
+            quality (str): Video quality (low_quality, medium_quality, high_quality)
+            use_cache (bool): Reuse previously generated code and rendered videos
+            progress_callback (callable): Optional receiver of progress events
+            llm_timeout (float): Seconds allowed for code generation
+            render_timeout (float): Seconds allowed for rendering
+            job_id (str): Name of the job directory under math_videos/jobs (random if omitted)
+
+        Returns:
+            str: Path to the generated video file
+        """
+        scene = await self.aprepare_scene(math_topic, difficulty, duration, use_cache, progress_callback, llm_timeout,
+                                          job_id)
+        if scene is None:
+            return None
+
+        return await self.arender_scene(scene, quality, use_cache, progress_callback, render_timeout)
+
+    async def acreate_multiple_videos(self, topics_list, difficulty="intermediate", duration=30,
+                                      quality="medium_quality", llm_concurrency=None, render_concurrency=None):
+        """
+        Create multiple videos concurrently on one event loop.
+
+        Code generation and rendering are limited separately, as in create_multiple_videos.
+
+        Returns:
+            list: One result per topic, in input order, with topic, video_path, success and error
+        """
+        llm_slots = asyncio.Semaphore(llm_concurrency or int(os.environ.get("MVG_BATCH_LLM_CONCURRENCY", "4")))
+        render_slots = asyncio.Semaphore(render_concurrency or int(os.environ.get("MVG_BATCH_RENDER_CONCURRENCY", "2")))
+
+        async def create(topic):
+            async with llm_slots:
+                scene = await self.aprepare_scene(topic, difficulty, duration)
+            if scene is None:
+                return {'topic': topic, 'video_path': None, 'success': False, 'error': "Code generation failed"}
+
+            async with render_slots:
+                video_path = await self.arender_scene(scene, quality)
+            return {
+                'topic': topic,
+                'video_path': video_path,
+                'success': video_path is not None,
+                'error': None if video_path else "Rendering failed"
+            }
+
+        return await asyncio.gather(*(create(topic) for topic in topics_list))
@@ -0,0 +1,148 @@
+"""
+Static Validation for Generated Manim Code
+AST checks that run before a render is launched, so broken LLM output fails in
+milliseconds instead of after a Manim subprocess has started.
+"""
+
+import os
+import ast
+import builtins
+import functools
+import importlib
+
+# Top-level modules generated scenes may import
+ALLOWED_IMPORTS = {
+    "manim", "numpy", "math", "cmath", "random", "itertools", "functools", "operator",
+    "fractions", "decimal", "statistics", "collections", "typing", "copy", "string",
+    "enum", "dataclasses", "colour", "scipy", "sympy",
+}
+
+# Builtins that would let generated code escape the import allowlist or touch the host
+BLOCKED_CALLS = {"eval", "exec", "compile", "__import__", "open", "input", "breakpoint", "globals", "vars"}
+
+MODULE_NAMES = {"__name__", "__file__", "__doc__", "__builtins__", "__spec__", "__loader__", "__package__"}
+
+
+def allowed_imports():
+    """Return the import allowlist, extended by the comma-separated MVG_ALLOWED_IMPORTS."""
+    extra = os.environ.get("MVG_ALLOWED_IMPORTS", "")
+    return ALLOWED_IMPORTS | {name.strip() for name in extra.split(",") if name.strip()}
+
+
+@functools.lru_cache(maxsize=1)
+def manim_namespace():
+    """
+    Return the names exported by "from manim import *", or None if manim is not importable.
+
+    Importing manim takes a moment, so the result is cached for the life of the process.
+    """
+    try:
+        manim = importlib.import_module("manim")
+    except Exception:
+        return None
+    names = getattr(manim, "__all__", None) or [name for name in dir(manim) if not name.startswith("_")]
+    return frozenset(names)
+
+
+def _is_scene_base(base):
+    if isinstance(base, ast.Name):
+        return base.id.endswith("Scene")
+    if isinstance(base, ast.Attribute):
+        return base.attr.endswith("Scene")
+    return False
+
+
+def _bound_names(tree):
+    """Collect every name the module binds anywhere (a deliberately coarse, scope-free view)."""
+    bound = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            bound.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            bound.add(node.name)
+        elif isinstance(node, ast.arg):
+            bound.add(node.arg)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                bound.add((alias.asname or alias.name).split(".")[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            bound.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            bound.update(node.names)
+    return bound
+
+
+def validate_scene_code(code, check_names=True):
+    """
+    Statically validate generated Manim scene code.
+
+    Checks that the code parses, defines exactly one Scene subclass with a construct
+    method, imports only allowlisted modules, avoids blocked builtins and (when manim is
+    installed) only uses names that exist. The code is assumed to run with
+    "from manim import *", which clean_generated_code guarantees.
+
+    Args:
+        code (str): Python source of the scene
+        check_names (bool): Flag names that are neither defined, builtin nor exported by manim
+
+    Returns:
+        dict: valid (bool), errors (list of str), warnings (list of str) and scene_name
+            (str, or None when there is not exactly one Scene subclass)
+    """
+    errors = []
+    warnings = []
+
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return {
+            "valid": False,
+            "errors": [f"syntax error on line {e.lineno}: {e.msg}"],
+            "warnings": warnings,
+            "scene_name": None,
+        }
+
+    # Exactly one Scene subclass, and it must implement construct()
+    scenes = [node for node in tree.body if isinstance(node, ast.ClassDef) and any(map(_is_scene_base, node.bases))]
+    scene_name = None
+    if not scenes:
+        errors.append("no Scene subclass in generated code")
+    elif len(scenes) > 1:
+        errors.append(f"expected one Scene subclass, found {len(scenes)}: {', '.join(s.name for s in scenes)}")
+    else:
+        scene_name = scenes[0].name
+        methods = {node.name for node in scenes[0].body if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))}
+        if "construct" not in methods:
+            errors.append(f"scene {scene_name} has no construct() method")
+
+    # Imports and dangerous builtins
+    allowed = allowed_imports()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            modules = [node.module or ""] if not node.level else ["."]
+        else:
+            modules = []
+        for module in modules:
+            if module.split(".")[0] not in allowed:
+                errors.append(f"disallowed import '{module}' on line {node.lineno}")
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in BLOCKED_CALLS:
+            errors.append(f"disallowed call to {node.func.id}() on line {node.lineno}")
+
+    # Names that would raise NameError at render time
+    if check_names:
+        exported = manim_namespace()
+        if exported is None:
+            warnings.append("manim is not importable here; unknown-name check skipped")
+        else:
+            known = _bound_names(tree) | set(dir(builtins)) | MODULE_NAMES | exported
+            unknown = {}
+            for node in ast.walk(tree):
+                if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in known:
+                    unknown.setdefault(node.id, node.lineno)
+            for name, lineno in sorted(unknown.items(), key=lambda item: item[1]):
+                errors.append(f"unknown name '{name}' on line {lineno}")
+
+    return {"valid": not errors, "errors": errors, "warnings": warnings, "scene_name": scene_name}
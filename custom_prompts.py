@@ -84,7 +84,8 @@ def generate_custom_video():
             math_topic=selected_topic,
             difficulty=difficulty,
             duration=duration,
-            quality=quality
+            quality=quality,
+            preview=False
         )
         
         if video_path:
@@ -121,7 +122,8 @@ def quick_custom_prompt():
             math_topic=YOUR_CUSTOM_PROMPT,
             difficulty="intermediate",
             duration=45,
-            quality="medium_quality"
+            quality="medium_quality",
+            preview=False
         )
         
         if video_path:
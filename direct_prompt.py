@@ -39,7 +39,8 @@ def generate_video_from_prompt():
             math_topic=clean_prompt,
             difficulty=DIFFICULTY,
             duration=DURATION,
-            quality=QUALITY
+            quality=QUALITY,
+            preview=False
         )
         
         if video_path:
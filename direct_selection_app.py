@@ -4,16 +4,14 @@ Streamlit-optimized version with real text selection handling
 """
 
 import streamlit as st
-import fitz  # PyMuPDF
-import tempfile
 import os
-import base64
 from pathlib import Path
 import time
 import json
-from PIL import Image
-import io
-from math_video_generator import MathVideoGenerator
+from math_video_generator import get_generator
+from pdf_ingest import open_pdf
+from asset_server import page_image_urls
+from math_text import extract_math_text
 import streamlit.components.v1 as components
 
 # Page configuration
@@ -45,71 +43,30 @@ def initialize_session_state():
     if 'trigger_video_generation' not in st.session_state:
         st.session_state.trigger_video_generation = False
 
-def extract_text_with_coordinates(page):
-    """Extract text with precise coordinates for overlay positioning."""
-    text_instances = []
-    blocks = page.get_text("dict")
-    
-    for block in blocks["blocks"]:
-        if "lines" in block:
-            for line in block["lines"]:
-                for span in line["spans"]:
-                    if span["text"].strip():
-                        text_instances.append({
-                            "text": span["text"],
-                            "bbox": span["bbox"],  # [x0, y0, x1, y1]
-                            "font": span.get("font", "Arial"),
-                            "size": span.get("size", 12),
-                            "flags": span.get("flags", 0)
-                        })
-    
-    return text_instances
-
 def convert_pdf_with_text_overlay(pdf_file):
     """Convert PDF to images with text overlay data."""
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(pdf_file.getvalue())
-            tmp_path = tmp_file.name
+        # Pages and text come from the shared content-hash cache when this PDF was seen before
+        document = open_pdf(pdf_file)
         
-        doc = fitz.open(tmp_path)
+        metadata = {key: document.metadata[key] for key in ('title', 'author', 'page_count', 'file_size')}
         
-        metadata = {
-            'title': doc.metadata.get('title', 'Unknown'),
-            'author': doc.metadata.get('author', 'Unknown'),
-            'page_count': doc.page_count,
-            'file_size': len(pdf_file.getvalue())
-        }
-        
-        pages_data = []
-        page_images = []
-        page_text_data = []
-        
-        for page_num in range(min(doc.page_count, 10)):
-            page = doc[page_num]
-            
-            # Convert to high-quality image
-            mat = fitz.Matrix(1.5, 1.5)
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            img = Image.open(io.BytesIO(img_data))
-            page_images.append(img)
-            
-            # Extract text with coordinates
-            text_instances = extract_text_with_coordinates(page)
-            page_text_data.append(text_instances)
-            
-            # Page info
-            full_text = page.get_text()
-            pages_data.append({
+        def page_info(page_num):
+            page_text = document.page_text(page_num)
+            return {
                 'page_num': page_num + 1,
-                'text': full_text,
-                'word_count': len(full_text.split()) if full_text else 0,
-                'image_size': img.size
-            })
+                'text': page_text['text'],
+                'spans': page_text['spans'],
+                'word_count': page_text['word_count'],
+                'width': page_text['width'],
+                'height': page_text['height'],
+                'image_size': document.image_size(page_num, zoom=1.5)
+            }
         
-        doc.close()
-        os.unlink(tmp_path)
+        # Pages are rendered when first viewed, neighbours in the background
+        pages_data = document.lazy(page_info)
+        page_images = page_image_urls(document, zoom=1.5)
+        page_text_data = document.lazy(document.text_index)
         
         return pages_data, metadata, page_images, page_text_data
     
@@ -120,12 +77,9 @@ def convert_pdf_with_text_overlay(pdf_file):
 def create_selectable_pdf_viewer(page_image, text_instances, page_num):
     """Create a PDF viewer with selectable text overlays."""
     
-    # Convert image to base64
-    img_buffer = io.BytesIO()
-    page_image.save(img_buffer, format='PNG')
-    img_base64 = base64.b64encode(img_buffer.getvalue()).decode()
-    
-    img_width, img_height = page_image.size
+    # The page image is a cached static asset, so the browser fetches it once by URL
+    img_url = page_image['url']
+    img_width, img_height = page_image['size']
     
     # Generate unique component ID
     component_id = f"pdf_viewer_{page_num}_{int(time.time())}"
@@ -299,7 +253,7 @@ def create_selectable_pdf_viewer(page_image, text_instances, page_num):
         </div>
         
         <div class="pdf-container">
-            <img src="data:image/png;base64,{img_base64}" 
+            <img src="{img_url}" 
                  class="pdf-image" 
                  id="pdfImage"
                  draggable="false">
@@ -548,6 +502,29 @@ def create_selectable_pdf_viewer(page_image, text_instances, page_num):
     
     return html_code
 
+def create_region_selector(text_index, page_info):
+    """Select the text inside a rectangle of the page, resolved through the page's text index."""
+    with st.expander("📐 Select Text by Region", expanded=False):
+        col1, col2 = st.columns(2)
+        with col1:
+            left, right = st.slider("↔️ Horizontal range (%)", 0, 100, (0, 100), key=f"region_x_{page_info['page_num']}")
+        with col2:
+            top, bottom = st.slider("↕️ Vertical range (%)", 0, 100, (0, 30), key=f"region_y_{page_info['page_num']}")
+        
+        width, height = page_info['width'], page_info['height']
+        span_indexes = text_index.query_rect(
+            width * left / 100, height * top / 100, width * right / 100, height * bottom / 100
+        )
+        # The index keeps the page's span order, so its hits pick out the spans to read formulas from
+        region_text = extract_math_text([page_info['spans'][i] for i in span_indexes])['text']
+        
+        # No key: the preview must follow the region rather than keep its first value
+        st.text_area("Text in region:", region_text, height=120, disabled=True)
+        if st.button("🎬 Generate Video from Region", type="primary", key=f"region_generate_{page_info['page_num']}",
+                     disabled=not region_text.strip()):
+            if process_selected_text_video(region_text, page_info['page_num']):
+                st.balloons()
+
 def process_selected_text_video(selected_text, page_num):
     """Process video generation from selected text."""
     
@@ -580,32 +557,23 @@ def process_selected_text_video(selected_text, page_num):
         
         try:
             # Initialize generator
-            generator = MathVideoGenerator()
-            
-            # Progress updates
-            status_text.text("🧠 AI analyzing your mathematical content...")
-            progress_bar.progress(25)
-            time.sleep(1)
+            generator = get_generator()
             
-            status_text.text("📝 Generating Manim animation code...")
-            progress_bar.progress(50)
-            time.sleep(1)
-            
-            status_text.text("🎬 Rendering video (this may take 2-4 minutes)...")
-            progress_bar.progress(75)
+            # Progress is driven by the generator's real pipeline stages
+            def update_progress(event):
+                progress_bar.progress(event["progress"])
+                status_text.text(event["message"])
             
             # Generate video
             video_path = generator.create_video(
                 math_topic=selected_text,
                 difficulty="intermediate",
                 duration=60,
-                quality="medium_quality"
+                quality="medium_quality",
+                progress_callback=update_progress,
+                preview=False
             )
             
-            progress_bar.progress(100)
-            status_text.text("✅ Video generation completed successfully!")
-            time.sleep(1)
-            
             # Clear progress
             progress_container.empty()
             
@@ -805,14 +773,14 @@ def main():
                     st.rerun()
             
             with col2:
-                page_options = [f"Page {i+1} ({page['word_count']} words)" 
-                              for i, page in enumerate(st.session_state.pdf_pages)]
+                # Labels must not touch page contents, or every page would be extracted up front
+                page_count = len(st.session_state.pdf_pages)
                 
                 selected_page = st.selectbox(
                     "📖 Current Page:",
                     range(len(st.session_state.pdf_pages)),
                     index=st.session_state.current_page,
-                    format_func=lambda x: page_options[x],
+                    format_func=lambda x: f"Page {x + 1} of {page_count}",
                     key="direct_page_selector"
                 )
                 
@@ -829,19 +797,21 @@ def main():
             if st.session_state.current_page < len(st.session_state.pdf_pages):
                 page_info = st.session_state.pdf_pages[st.session_state.current_page]
                 page_image = st.session_state.page_images[st.session_state.current_page]
-                text_instances = st.session_state.page_text_blocks[st.session_state.current_page]
+                text_index = st.session_state.page_text_blocks[st.session_state.current_page]
                 
                 st.subheader(f"📄 Page {page_info['page_num']} - Direct Text Selection")
                 
-                # Create and display the interactive viewer
+                # Create and display the interactive viewer, one overlay element per line
                 interactive_html = create_selectable_pdf_viewer(
                     page_image, 
-                    text_instances, 
+                    text_index.line_blocks(), 
                     page_info['page_num']
                 )
                 
                 # Display with sufficient height
                 components.html(interactive_html, height=800, scrolling=True)
+                
+                create_region_selector(text_index, page_info)
         
         # Check for pending video generation (from sessionStorage)
         check_generation_js = """
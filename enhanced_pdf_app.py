@@ -4,16 +4,13 @@ Real-time text selection with JavaScript-Streamlit communication
 """
 
 import streamlit as st
-import fitz  # PyMuPDF
-import tempfile
 import os
-import base64
 from pathlib import Path
 import time
 import json
-from PIL import Image
-import io
-from math_video_generator import MathVideoGenerator
+from math_video_generator import get_generator
+from pdf_ingest import open_pdf
+from asset_server import page_image_urls
 import streamlit.components.v1 as components
 
 # Page configuration
@@ -47,93 +44,28 @@ def initialize_session_state():
     if 'trigger_generation' not in st.session_state:
         st.session_state.trigger_generation = False
 
-def extract_text_blocks_with_positions(page):
-    """Extract text blocks with their exact positions for overlay."""
-    blocks = []
-    
-    # Get text blocks with position information
-    text_dict = page.get_text("dict")
-    
-    for block in text_dict["blocks"]:
-        if "lines" in block:
-            for line in block["lines"]:
-                line_text = ""
-                line_bbox = None
-                
-                for span in line["spans"]:
-                    if span["text"].strip():
-                        line_text += span["text"]
-                        if line_bbox is None:
-                            line_bbox = list(span["bbox"])
-                        else:
-                            # Extend bbox to include this span
-                            line_bbox[2] = max(line_bbox[2], span["bbox"][2])
-                            line_bbox[3] = max(line_bbox[3], span["bbox"][3])
-                
-                if line_text.strip() and line_bbox:
-                    blocks.append({
-                        "text": line_text,
-                        "bbox": line_bbox,
-                        "font": span.get("font", "Arial"),
-                        "size": span.get("size", 12)
-                    })
-    
-    return blocks
-
 def convert_pdf_to_interactive_pages(pdf_file):
     """Convert PDF pages to images with text overlay information."""
     try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(pdf_file.getvalue())
-            tmp_path = tmp_file.name
-        
-        # Open PDF with PyMuPDF
-        doc = fitz.open(tmp_path)
-        
-        # Extract metadata
-        metadata = {
-            'title': doc.metadata.get('title', 'Unknown'),
-            'author': doc.metadata.get('author', 'Unknown'),
-            'page_count': doc.page_count,
-            'file_size': len(pdf_file.getvalue())
-        }
+        # Pages and text come from the shared content-hash cache when this PDF was seen before
+        document = open_pdf(pdf_file)
         
-        # Convert pages to images and extract text with positions
-        pages_data = []
-        page_images = []
-        page_text_blocks = []
+        metadata = {key: document.metadata[key] for key in ('title', 'author', 'page_count', 'file_size')}
         
-        for page_num in range(min(doc.page_count, 15)):  # Limit to 15 pages for performance
-            page = doc[page_num]
-            
-            # Convert page to image with higher resolution
-            mat = fitz.Matrix(1.5, 1.5)  # 1.5x zoom for good quality
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            
-            # Convert to PIL Image
-            img = Image.open(io.BytesIO(img_data))
-            page_images.append(img)
-            
-            # Extract text blocks with positions
-            text_blocks = extract_text_blocks_with_positions(page)
-            page_text_blocks.append(text_blocks)
-            
-            # Extract plain text
-            text = page.get_text()
-            
-            page_info = {
+        def page_info(page_num):
+            page_text = document.page_text(page_num)
+            return {
                 'page_num': page_num + 1,
-                'text': text,
-                'word_count': len(text.split()) if text else 0,
-                'char_count': len(text) if text else 0,
-                'image_size': img.size  # (width, height)
+                'text': page_text['text'],
+                'word_count': page_text['word_count'],
+                'char_count': page_text['char_count'],
+                'image_size': document.image_size(page_num, zoom=1.5)  # (width, height)
             }
-            pages_data.append(page_info)
         
-        doc.close()
-        os.unlink(tmp_path)
+        # Pages are rendered when first viewed (1.5x zoom for good quality), neighbours in the background
+        pages_data = document.lazy(page_info)
+        page_images = page_image_urls(document, zoom=1.5)
+        page_text_blocks = document.lazy(lambda page_num: document.text_index(page_num).line_blocks())
         
         return pages_data, metadata, page_images, page_text_blocks
     
@@ -144,13 +76,9 @@ def convert_pdf_to_interactive_pages(pdf_file):
 def create_enhanced_pdf_viewer(page_image, text_blocks, page_num):
     """Create an enhanced PDF viewer with real text selection."""
     
-    # Convert PIL image to base64 for HTML display
-    img_buffer = io.BytesIO()
-    page_image.save(img_buffer, format='PNG')
-    img_str = base64.b64encode(img_buffer.getvalue()).decode()
-    
-    # Get image dimensions
-    img_width, img_height = page_image.size
+    # The page image is a cached static asset, so the browser fetches it once by URL
+    img_url = page_image['url']
+    img_width, img_height = page_image['size']
     
     # Create JavaScript-enabled HTML component
     html_content = f"""
@@ -294,7 +222,7 @@ def create_enhanced_pdf_viewer(page_image, text_blocks, page_num):
     </head>
     <body>
         <div class="pdf-container" id="pdf-container">
-            <img src="data:image/png;base64,{img_str}" 
+            <img src="{img_url}" 
                  class="pdf-image" 
                  id="pdf-image"
                  draggable="false">
@@ -516,33 +444,23 @@ def process_video_from_selection(selected_text, page_num):
         
         try:
             # Initialize generator
-            generator = MathVideoGenerator()
-            
-            # Step-by-step progress
-            status_text.text("🧠 Analyzing mathematical content with AI...")
-            progress_bar.progress(20)
-            time.sleep(0.8)
+            generator = get_generator()
             
-            status_text.text("📝 Generating Manim animation code...")
-            progress_bar.progress(40)
-            time.sleep(0.8)
-            
-            status_text.text("🎬 Rendering high-quality video...")
-            progress_bar.progress(60)
-            time.sleep(0.5)
+            # Progress is driven by the generator's real pipeline stages
+            def update_progress(event):
+                progress_bar.progress(event["progress"])
+                status_text.text(event["message"])
             
             # Generate video
             video_path = generator.create_video(
                 math_topic=selected_text,
                 difficulty="intermediate",
                 duration=60,
-                quality="medium_quality"
+                quality="medium_quality",
+                progress_callback=update_progress,
+                preview=False
             )
             
-            progress_bar.progress(100)
-            status_text.text("✅ Video generation complete!")
-            time.sleep(1)
-            
             # Clear progress
             progress_container.empty()
             
@@ -788,14 +706,14 @@ def main():
                     st.rerun()
             
             with col2:
-                page_options = [f"Page {i+1} ({page['word_count']} words)" 
-                              for i, page in enumerate(st.session_state.pdf_pages)]
+                # Labels must not touch page contents, or every page would be extracted up front
+                page_count = len(st.session_state.pdf_pages)
                 
                 selected_page = st.selectbox(
                     "📖 Select Page:",
                     range(len(st.session_state.pdf_pages)),
                     index=st.session_state.current_page,
-                    format_func=lambda x: page_options[x],
+                    format_func=lambda x: f"Page {x + 1} of {page_count}",
                     key="enhanced_page_selector"
                 )
                 
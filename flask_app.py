@@ -3,53 +3,262 @@ Flask Web API for Math Video Generator
 RESTful API backend for the math video generator.
 """
 
-from flask import Flask, request, jsonify, render_template, send_file
+from flask import Flask, request, jsonify, render_template, send_file, Response
 from flask_cors import CORS
 import os
 import json
-from pathlib import Path
-import threading
 import time
-from math_video_generator import MathVideoGenerator
+import hmac
+import hashlib
+import sqlite3
+from pathlib import Path
+from urllib.parse import quote
+from math_video_generator import get_generator
+from job_queue import JobQueue, WorkerPool, QueueFullError
+from task_store import create_task_store, new_task_id
+from video_catalog import create_video_catalog
 
 app = Flask(__name__)
 CORS(app)
 
-# Global variables for tracking generation status
-generation_status = {}
+# Thread-safe, evicting store for tracking generation status
+task_store = create_task_store()
+
+# Index of rendered videos, filled by the generator as renders complete
+video_catalog = create_video_catalog()
+
+# Video delivery: "x-sendfile" (Apache, lighttpd) or "x-accel-redirect" (nginx) hands the
+# bytes to the front-end server; otherwise Flask streams them with Range support
+MEDIA_OFFLOAD = os.environ.get("MVG_MEDIA_OFFLOAD", "").lower()
+MEDIA_ROOT = Path(os.environ.get("MVG_MEDIA_ROOT", "math_videos")).resolve()
+MEDIA_ACCEL_PREFIX = os.environ.get("MVG_MEDIA_ACCEL_PREFIX", "/protected-media/")
+VIDEO_MAX_AGE = int(os.environ.get("MVG_VIDEO_MAX_AGE", "3600"))
+app.config["USE_X_SENDFILE"] = MEDIA_OFFLOAD == "x-sendfile"
+
+# Queue priorities: anyone may lower their own job, raising it requires MVG_PRIORITY_TOKEN
+# in the X-Priority-Token header
+PRIORITY_TOKEN = os.environ.get("MVG_PRIORITY_TOKEN", "")
+MAX_PRIORITY = 10
 
-def generate_video_async(task_id, topic, difficulty, duration, quality):
-    """Generate video asynchronously and update status."""
+def _video_id(video_path):
+    """Return the catalog ID of a rendered video, or None if it is not cataloged."""
+    video = video_catalog.get_by_path(video_path) if video_path else None
+    return video["id"] if video else None
+
+def _requested_priority(data):
+    """Return the job priority a request may use, clamped and limited for unauthenticated callers."""
     try:
-        generation_status[task_id] = {"status": "generating", "progress": 0, "message": "Initializing..."}
-        
-        generator = MathVideoGenerator()
+        priority = max(-MAX_PRIORITY, min(int(data.get('priority', 0)), MAX_PRIORITY))
+    except (TypeError, ValueError):
+        return 0
+    token = request.headers.get('X-Priority-Token', '')
+    if priority > 0 and not (PRIORITY_TOKEN and hmac.compare_digest(token, PRIORITY_TOKEN)):
+        return 0
+    return priority
+
+def _progress_updater(task_id, status):
+    """Return a progress callback that forwards pipeline events to the status store."""
+    # Forward real pipeline stages (LLM, code written, animation N of M, combining) to the status store
+    def update_progress(event):
+        if event["stage"] in ("completed", "failed", "preview_ready"):
+            return
+        task_store.update(
+            task_id,
+            status=status,
+            stage=event["stage"],
+            progress=event["progress"],
+            message=event["message"]
+        )
+    return update_progress
+
+def generate_video_async(task_id, topic, difficulty, duration, quality, preview=False):
+    """
+    Generate video asynchronously and update status.
+    
+    In preview mode only a low-quality preview is rendered here and the task is left in
+    "preview_ready"; the returned scene is rendered at full quality by a follow-up job.
+    
+    Returns:
+        dict: The rendered scene when a final-quality render is still needed, otherwise None
+    """
+    try:
+        task_store.set(task_id, {"status": "generating", "progress": 0, "message": "Initializing..."})
         
-        # Step 1: Generate code
-        generation_status[task_id] = {"status": "generating", "progress": 20, "message": "Generating Manim code..."}
+        generator = get_generator()
+        update_progress = _progress_updater(task_id, "generating")
         
-        video_path = generator.create_video(topic, difficulty, duration, quality)
+        if preview and quality != "low_quality":
+            scene = generator.prepare_scene(topic, difficulty, duration, progress_callback=update_progress,
+                                            job_id=task_id)
+            video_path = generator.render_preview(scene, progress_callback=update_progress) if scene else None
+            
+            if video_path and video_path.endswith(".mp4"):
+                task_store.set(task_id, {
+                    "status": "preview_ready",
+                    "progress": 100,
+                    "message": "Preview ready! Rendering final quality...",
+                    "preview_path": video_path,
+                    "preview_id": _video_id(video_path)
+                })
+                return scene
+        else:
+            video_path = generator.create_video(topic, difficulty, duration, quality, progress_callback=update_progress,
+                                                job_id=task_id, preview=False)
         
         if video_path:
-            generation_status[task_id] = {
+            task_store.set(task_id, {
                 "status": "completed", 
                 "progress": 100, 
                 "message": "Video generated successfully!",
-                "video_path": video_path
-            }
+                "video_path": video_path,
+                "video_id": _video_id(video_path)
+            })
         else:
-            generation_status[task_id] = {
+            task_store.set(task_id, {
                 "status": "failed", 
                 "progress": 0, 
                 "message": "Failed to generate video"
-            }
+            })
             
     except Exception as e:
-        generation_status[task_id] = {
+        task_store.set(task_id, {
             "status": "failed", 
             "progress": 0, 
             "message": f"Error: {str(e)}"
-        }
+        })
+    return None
+
+def render_final_async(task_id, scene, quality, preview_path):
+    """Render the final quality of a previewed task, keeping the preview if it fails."""
+    preview_id = _video_id(preview_path)
+    try:
+        video_path = get_generator().render_scene(
+            scene, quality, progress_callback=_progress_updater(task_id, "preview_ready")
+        )
+    except Exception as e:
+        print(f"❌ Final render for {task_id} failed: {e}")
+        video_path = None
+    
+    if video_path and video_path.endswith(".mp4"):
+        task_store.set(task_id, {
+            "status": "completed",
+            "progress": 100,
+            "message": "Video generated successfully!",
+            "video_path": video_path,
+            "video_id": _video_id(video_path),
+            "preview_path": preview_path,
+            "preview_id": preview_id
+        })
+    else:
+        task_store.set(task_id, {
+            "status": "completed",
+            "progress": 100,
+            "message": "Final render failed; the preview is available.",
+            "video_path": preview_path,
+            "video_id": preview_id,
+            "preview_path": preview_path,
+            "preview_id": preview_id
+        })
+
+def _queue_final_render(job, scene, status):
+    """Queue the final-quality render of a previewed task behind new requests."""
+    task_id = job["id"]
+    final_id = f"{task_id}_final"
+    if _reuse_final_render(task_id, final_id, status):
+        return
+    try:
+        job_queue.submit(
+            {
+                "phase": "final",
+                "task_id": task_id,
+                "scene": {key: str(value) if isinstance(value, Path) else value for key, value in scene.items()},
+                "quality": job["payload"]["quality"],
+                "preview_path": status["preview_path"]
+            },
+            # Previews of new requests go first; users often stop at the preview
+            priority=job["priority"] - 1,
+            job_id=final_id
+        )
+    except sqlite3.IntegrityError:
+        # Queued by another process between the check and the insert
+        _reuse_final_render(task_id, final_id, status)
+    except QueueFullError:
+        _keep_preview(task_id, status, "Preview ready (render queue full, final quality skipped).")
+
+def _keep_preview(task_id, status, message):
+    """Complete a previewed task with its preview as the video."""
+    task_store.set(task_id, dict(
+        status, status="completed", video_path=status["preview_path"], video_id=status.get("preview_id"),
+        message=message
+    ))
+
+def _reuse_final_render(task_id, final_id, status):
+    """
+    Adopt a final render queued before a crash made recovery run the preview job again.
+
+    Returns:
+        bool: True if the final job already exists (its outcome is restored when it has finished)
+    """
+    final_job = job_queue.get(final_id)
+    if final_job is None:
+        return False
+    if final_job["status"] == "completed" and final_job["result"]:
+        task_store.set(task_id, final_job["result"])
+    elif final_job["status"] == "failed":
+        _keep_preview(task_id, status, "Final render failed; the preview is available.")
+    # Queued or running: the final job reports the task's outcome when it finishes
+    return True
+
+def run_generation_job(job):
+    """Worker handler: render one queued job and return its final status."""
+    payload = job["payload"]
+    
+    if payload.get("phase") == "final":
+        task_id = payload["task_id"]
+        render_final_async(task_id, payload["scene"], payload["quality"], payload["preview_path"])
+    else:
+        task_id = job["id"]
+        scene = generate_video_async(
+            task_id, payload["topic"], payload["difficulty"], payload["duration"], payload["quality"],
+            preview=payload.get("preview", False)
+        )
+        if scene is not None:
+            _queue_final_render(job, scene, task_store.get(task_id) or {})
+    
+    status = task_store.get(task_id) or {}
+    if status.get("status") not in ("completed", "preview_ready"):
+        raise RuntimeError(status.get("message", "Failed to generate video"))
+    return status
+
+# Persistent job queue drained by a bounded pool of render workers. Every process runs a pool,
+# but the queue caps running jobs at MVG_RENDER_WORKERS across all processes sharing it
+RENDER_WORKERS = int(os.environ.get("MVG_RENDER_WORKERS", "2"))
+job_queue = JobQueue(
+    os.environ.get("MVG_JOB_DB", "math_videos/jobs.db"),
+    max_queued=int(os.environ.get("MVG_MAX_QUEUED_JOBS", "100")),
+    max_running=RENDER_WORKERS
+)
+worker_pool = WorkerPool(
+    job_queue,
+    run_generation_job,
+    num_workers=RENDER_WORKERS
+)
+
+def start_workers():
+    """Start the render workers, requeueing interrupted jobs (idempotent)."""
+    if not worker_pool.started:
+        worker_pool.start()
+        video_catalog.prune_missing()
+
+# Start with the app so recovered jobs run without waiting for a request. The debug
+# reloader's watcher process (run as __main__ without WERKZEUG_RUN_MAIN) serves nothing.
+if __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+    start_workers()
+
+@app.before_request
+def restart_workers_after_fork():
+    """Restart the workers in processes forked after startup (gunicorn --preload)."""
+    start_workers()
 
 @app.route('/')
 def index():
@@ -66,64 +275,239 @@ def generate_video():
         duration = int(data.get('duration', 45))
         quality = data.get('quality', 'medium_quality')
         
+        priority = _requested_priority(data)
+        preview = bool(data.get('preview', False))
+        
         if not topic:
             return jsonify({"error": "Topic is required"}), 400
         
-        # Generate unique task ID
-        task_id = f"task_{int(time.time())}"
-        
-        # Start generation in background
-        thread = threading.Thread(
-            target=generate_video_async, 
-            args=(task_id, topic, difficulty, duration, quality)
+        # Queue the job; a render worker picks it up when one is free
+        task_id = job_queue.submit(
+            {"topic": topic, "difficulty": difficulty, "duration": duration, "quality": quality, "preview": preview},
+            priority=priority,
+            job_id=new_task_id()
         )
-        thread.start()
         
-        return jsonify({"task_id": task_id, "status": "started"})
+        return jsonify({
+            "task_id": task_id,
+            "status": "queued",
+            "queue_position": job_queue.position(task_id)
+        })
         
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Statuses after which a task never changes again
+TERMINAL_STATUSES = ("completed", "failed", "not_found")
+
+# Long-poll and Server-Sent Events settings
+MAX_LONG_POLL_SECONDS = 30
+SSE_KEEPALIVE_SECONDS = 15
+SSE_MAX_STREAM_SECONDS = 600
+
+def _task_status(task_id):
+    """Build the status of a task from the task store, falling back to the job queue."""
+    status = task_store.get(task_id)
+    if status:
+        return status
+    
+    # Not started in this process yet (or finished before a restart): fall back to the queue
+    job = job_queue.get(task_id)
+    if job is None:
+        return {"status": "not_found", "message": "Task not found"}
+    
+    if job["status"] == "queued":
+        position = job_queue.position(task_id)
+        return {
+            "status": "queued",
+            "progress": 0,
+            "message": f"Waiting in queue (position {position})",
+            "queue_position": position
+        }
+    if job["status"] == "running":
+        return {"status": "generating", "progress": 0, "message": "Rendering..."}
+    if job["status"] == "completed":
+        # A previewed task finishes with its follow-up final-quality job
+        final = job_queue.get(f"{task_id}_final")
+        if final and final["status"] == "completed":
+            return final["result"]
+        if final and final["status"] == "failed":
+            preview_path = job["result"].get("preview_path")
+            return dict(job["result"], status="completed", video_path=preview_path,
+                        message="Final render failed; the preview is available.")
+        return job["result"]
+    return {"status": "failed", "progress": 0, "message": f"Error: {job['error']}"}
+
+def _status_etag(status):
+    """Return a strong ETag for a status payload."""
+    return hashlib.sha1(json.dumps(status, sort_keys=True).encode("utf-8")).hexdigest()
+
+def _wait_for_status_change(task_id, status, timeout):
+    """Block until the task's status differs from the given one or the timeout elapses."""
+    deadline = time.time() + timeout
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return status
+        # Queued tasks have no store entry yet, so wake up regularly to refresh the queue position
+        task_store.wait_for_change(task_id, status.get("version"), min(remaining, 2.0))
+        latest = _task_status(task_id)
+        if latest != status:
+            return latest
+
 @app.route('/api/status/<task_id>')
 def get_status(task_id):
-    """Get the status of a generation task."""
-    status = generation_status.get(task_id, {"status": "not_found", "message": "Task not found"})
-    return jsonify(status)
+    """
+    Get the status of a generation task.
+    
+    Supports conditional requests: with If-None-Match and ?wait=<seconds> the
+    request is held open until the status changes (long-poll), otherwise an
+    unchanged status returns 304.
+    """
+    status = _task_status(task_id)
+    etag = _status_etag(status)
+    
+    if request.if_none_match.contains(etag):
+        wait = min(request.args.get('wait', 0, type=float), MAX_LONG_POLL_SECONDS)
+        if wait > 0 and status["status"] not in TERMINAL_STATUSES:
+            status = _wait_for_status_change(task_id, status, wait)
+            etag = _status_etag(status)
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers={"ETag": f'"{etag}"'})
+    
+    response = jsonify(status)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+@app.route('/api/progress/<task_id>')
+def stream_progress(task_id):
+    """Push status changes for a task as Server-Sent Events until it finishes."""
+    def events():
+        status = _task_status(task_id)
+        started = time.time()
+        yield "retry: 2000\n\n"
+        yield f"event: status\ndata: {json.dumps(status)}\n\n"
+        
+        while status["status"] not in TERMINAL_STATUSES:
+            if time.time() - started > SSE_MAX_STREAM_SECONDS:
+                # Let the browser reconnect rather than pinning a worker thread indefinitely
+                return
+            
+            latest = _wait_for_status_change(task_id, status, SSE_KEEPALIVE_SECONDS)
+            if latest == status:
+                yield ": keep-alive\n\n"
+                continue
+            
+            status = latest
+            yield f"event: status\ndata: {json.dumps(status)}\n\n"
+    
+    return Response(events(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+def _video_json(video):
+    """Shape a catalog entry for the API."""
+    return {
+        "id": video["id"],
+        "name": video["topic"],
+        "topic": video["topic"],
+        "difficulty": video["difficulty"],
+        "quality": video["quality"],
+        "duration": video["duration"],
+        "path": video["path"],
+        "size": video["size"],
+        "created": video["created_at"],
+        "stream_url": f"/api/videos/{video['id']}/stream",
+        "download_url": f"/api/download/{video['id']}"
+    }
 
 @app.route('/api/videos')
 def list_videos():
-    """List all generated videos."""
-    videos = []
-    media_path = Path("media/videos")
-    
-    if media_path.exists():
-        for folder in media_path.iterdir():
-            if folder.is_dir():
-                for quality_folder in folder.iterdir():
-                    if quality_folder.is_dir():
-                        video_files = list(quality_folder.glob("*.mp4"))
-                        if video_files:
-                            video = video_files[0]
-                            videos.append({
-                                "name": folder.name.replace("_", " ").title(),
-                                "path": str(video),
-                                "size": video.stat().st_size,
-                                "created": video.stat().st_mtime
-                            })
-    
-    return jsonify(videos)
-
-@app.route('/api/download/<path:video_path>')
-def download_video(video_path):
-    """Download a generated video."""
+    """
+    List generated videos from the catalog.
+    
+    Query parameters: page, per_page (at most 100), topic (substring match),
+    difficulty, quality, sort (created_at, updated_at, topic, size, duration,
+    quality, difficulty) and order (asc or desc).
+    """
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(max(1, request.args.get('per_page', 20, type=int)), 100)
+    
     try:
-        file_path = Path(video_path)
-        if file_path.exists() and file_path.suffix == '.mp4':
-            return send_file(file_path, as_attachment=True)
-        else:
-            return jsonify({"error": "Video not found"}), 404
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        videos, total = video_catalog.list(
+            limit=per_page,
+            offset=(page - 1) * per_page,
+            topic=request.args.get('topic'),
+            difficulty=request.args.get('difficulty'),
+            quality=request.args.get('quality'),
+            sort=request.args.get('sort', 'created_at'),
+            descending=request.args.get('order', 'desc').lower() != 'asc'
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify({
+        "videos": [_video_json(video) for video in videos],
+        "total": total,
+        "page": page,
+        "per_page": per_page
+    })
+
+def _send_video(video_id, as_attachment):
+    """
+    Send a cataloged video by ID.
+    
+    Only files recorded in the catalog can be served, so request paths never reach the
+    filesystem. Responses support Range requests and ETag/Last-Modified revalidation,
+    or are handed to the front-end server when MVG_MEDIA_OFFLOAD is set.
+    """
+    video = video_catalog.get(video_id)
+    file_path = Path(video["path"]).resolve() if video else None
+    if not file_path or file_path.suffix != '.mp4' or not file_path.is_file():
+        return jsonify({"error": "Video not found"}), 404
+    
+    if MEDIA_OFFLOAD == "x-accel-redirect":
+        try:
+            relative = file_path.relative_to(MEDIA_ROOT)
+        except ValueError:
+            return jsonify({"error": "Video is outside MVG_MEDIA_ROOT"}), 404
+        response = Response(mimetype="video/mp4")
+        response.headers["X-Accel-Redirect"] = MEDIA_ACCEL_PREFIX.rstrip("/") + "/" + quote(relative.as_posix())
+        response.headers.set("Content-Disposition", "attachment" if as_attachment else "inline",
+                             filename=file_path.name)
+        return response
+    
+    return send_file(
+        file_path,
+        mimetype="video/mp4",
+        as_attachment=as_attachment,
+        download_name=file_path.name,
+        conditional=True,
+        etag=True,
+        max_age=VIDEO_MAX_AGE
+    )
+
+@app.route('/api/videos/<video_id>')
+def get_video(video_id):
+    """Return the catalog entry for one video."""
+    video = video_catalog.get(video_id)
+    if not video:
+        return jsonify({"error": "Video not found"}), 404
+    return jsonify(_video_json(video))
+
+@app.route('/api/videos/<video_id>/stream')
+def stream_video(video_id):
+    """Stream a video inline, with byte-range support for seeking."""
+    return _send_video(video_id, as_attachment=False)
+
+@app.route('/api/download/<video_id>')
+def download_video(video_id):
+    """Download a generated video."""
+    return _send_video(video_id, as_attachment=True)
 
 @app.route('/api/setup')
 def check_setup():
@@ -138,7 +522,7 @@ def check_setup():
             return jsonify({"status": "error", "message": "GITHUB_TOKEN not configured"})
         
         # Test generator initialization
-        MathVideoGenerator()
+        get_generator()
         
         return jsonify({"status": "ok", "message": "Setup complete"})
         
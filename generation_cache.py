@@ -0,0 +1,281 @@
+"""
+Persistent on-disk caches for the Math Video Generator.
+Stores LLM-generated Manim code so repeated topics skip the AI round trip,
+and finished renders so identical scene code never goes through Manim twice.
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+
+
+def normalize_topic(topic):
+    """Normalize a topic string so trivially different spellings share a cache key."""
+    return " ".join(str(topic).split()).casefold()
+
+
+def _remove_file(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def link_or_copy(source, destination):
+    """
+    Atomically place source at destination as a hard link, copying when linking is not possible
+    (another filesystem, or one without hard links).
+
+    Linked files share their bytes, so neither side may be rewritten in place afterwards;
+    replace or unlink a file instead of truncating it.
+    """
+    destination = Path(destination)
+    tmp_path = destination.with_name(f"{destination.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        try:
+            os.link(source, tmp_path)
+        except OSError:
+            shutil.copyfile(source, tmp_path)
+        os.replace(tmp_path, destination)
+    except OSError:
+        _remove_file(tmp_path)
+        raise
+
+
+def make_cache_key(*parts):
+    """Build a stable SHA-256 key from the given parts."""
+    payload = json.dumps([str(part) for part in parts], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CodeCache:
+    """Content-addressed cache of generated Manim code, one JSON file per entry."""
+
+    def __init__(self, cache_dir, max_entries=500, max_age_days=30):
+        """
+        Initialize the code cache.
+
+        Args:
+            cache_dir (str | Path): Directory holding the cache entries
+            max_entries (int): Maximum number of entries kept on disk
+            max_age_days (float): Entries older than this are treated as expired
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 24 * 3600
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key_for(self, topic, difficulty, duration, model, prompt_version):
+        """Return the cache key for a generation request."""
+        return make_cache_key(normalize_topic(topic), difficulty, int(duration), model, prompt_version)
+
+    def _entry_path(self, key):
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key):
+        """
+        Look up cached code.
+
+        Args:
+            key (str): Cache key from key_for()
+
+        Returns:
+            str: Cached code, or None on a miss
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+
+        if entry and time.time() - entry.get("created", 0) > self.max_age:
+            _remove_file(path)
+            entry = None
+
+        with self._lock:
+            if entry:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        return entry["code"] if entry else None
+
+    def put(self, key, code, **metadata):
+        """Store generated code under the given key and evict old entries."""
+        entry = dict(metadata, key=key, code=code, created=time.time())
+        path = self._entry_path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Could not write code cache entry: {e}")
+            _remove_file(tmp_path)
+            return
+
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the oldest ones beyond max_entries."""
+        now = time.time()
+        entries = []
+
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                mtime = path.stat().st_mtime
+            except OSError:
+                continue
+            if now - mtime > self.max_age:
+                _remove_file(path)
+            else:
+                entries.append((mtime, path))
+
+        if len(entries) > self.max_entries:
+            entries.sort()
+            for _, path in entries[:len(entries) - self.max_entries]:
+                _remove_file(path)
+
+    def clear(self):
+        """Remove every cached entry."""
+        for path in self.cache_dir.glob("*.json"):
+            _remove_file(path)
+
+    def stats(self):
+        """Return hit/miss counters and the current entry count."""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+            "entries": sum(1 for _ in self.cache_dir.glob("*.json")),
+        }
+
+
+class RenderCache:
+    """Cache of rendered videos keyed by scene source, scene name and quality, evicted LRU by total size."""
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3):
+        """
+        Initialize the render cache.
+
+        Args:
+            cache_dir (str | Path): Directory holding the cached mp4 files
+            max_bytes (int): Upper bound on the total size of cached videos
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def key_for(self, code, scene_name, quality_flag):
+        """Return the cache key for a render of the given scene source."""
+        return make_cache_key(code, scene_name, quality_flag)
+
+    def _entry_path(self, key):
+        return self.cache_dir / f"{key}.mp4"
+
+    def get(self, key):
+        """
+        Look up a previously rendered video.
+
+        Args:
+            key (str): Cache key from key_for()
+
+        Returns:
+            str: Path to the cached mp4, or None on a miss
+        """
+        path = self._entry_path(key)
+        hit = path.exists() and path.stat().st_size > 0
+
+        if hit:
+            # The file mtime doubles as the LRU timestamp
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        return str(path) if hit else None
+
+    def put(self, key, video_path):
+        """
+        Store a finished render in the cache.
+
+        Args:
+            key (str): Cache key from key_for()
+            video_path (str | Path): Rendered mp4 to cache
+
+        Returns:
+            str: Path to the cached copy, or None if it could not be stored
+        """
+        path = self._entry_path(key)
+
+        try:
+            # Hard-linked where possible so a render is not stored twice
+            link_or_copy(video_path, path)
+        except OSError as e:
+            print(f"⚠️ Could not write render cache entry: {e}")
+            return None
+
+        self.evict()
+        return str(path) if path.exists() else None
+
+    def evict(self):
+        """
+        Remove least recently used videos until the cache fits in max_bytes.
+
+        Only entries the cache holds alone count: one still hard-linked into a job directory
+        frees no disk space when removed, so it is kept until the job's copy is deleted.
+        """
+        entries = []
+        total = 0
+
+        for path in self.cache_dir.glob("*.mp4"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if stat.st_nlink > 1:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            _remove_file(path)
+            total -= size
+
+    def stats(self):
+        """Return hit/miss counters, entry count and total cached bytes."""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        sizes = [path.stat().st_size for path in self.cache_dir.glob("*.mp4")]
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+            "entries": len(sizes),
+            "bytes": sum(sizes),
+        }
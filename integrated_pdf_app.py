@@ -4,16 +4,13 @@ PDF viewer with inline text selection and instant video generation
 """
 
 import streamlit as st
-import fitz  # PyMuPDF
-import tempfile
 import os
-import base64
 from pathlib import Path
 import time
 import json
-from PIL import Image
-import io
-from math_video_generator import MathVideoGenerator
+from math_video_generator import get_generator
+from pdf_ingest import open_pdf
+from asset_server import page_image_urls
 
 # Page configuration
 st.set_page_config(
@@ -148,53 +145,25 @@ def initialize_session_state():
 def convert_pdf_to_images(pdf_file):
     """Convert PDF pages to images for better display."""
     try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(pdf_file.getvalue())
-            tmp_path = tmp_file.name
+        # Pages and text come from the shared content-hash cache when this PDF was seen before
+        document = open_pdf(pdf_file)
         
-        # Open PDF with PyMuPDF
-        doc = fitz.open(tmp_path)
+        metadata = {key: document.metadata[key] for key in ('title', 'author', 'page_count', 'file_size')}
         
-        # Extract metadata
-        metadata = {
-            'title': doc.metadata.get('title', 'Unknown'),
-            'author': doc.metadata.get('author', 'Unknown'),
-            'page_count': doc.page_count,
-            'file_size': len(pdf_file.getvalue())
-        }
-        
-        # Convert pages to images and extract text
-        pages_data = []
-        page_images = []
-        
-        for page_num in range(min(doc.page_count, 50)):  # Limit to 50 pages for performance
-            page = doc[page_num]
-            
-            # Convert page to image
-            mat = fitz.Matrix(2.0, 2.0)  # 2x zoom for better quality
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            
-            # Convert to PIL Image
-            img = Image.open(io.BytesIO(img_data))
-            page_images.append(img)
-            
-            # Extract text with blocks
-            text = page.get_text()
-            blocks = page.get_text("blocks")
-            
-            page_info = {
+        def page_info(page_num):
+            page_text = document.page_text(page_num)
+            return {
                 'page_num': page_num + 1,
-                'text': text,
-                'blocks': blocks,
-                'word_count': len(text.split()) if text else 0,
-                'char_count': len(text) if text else 0
+                'text': page_text['text'],
+                'math_text': document.math_text(page_num)['text'],  # Formulas as LaTeX, for prompts
+                'blocks': page_text['blocks'],
+                'word_count': page_text['word_count'],
+                'char_count': page_text['char_count']
             }
-            pages_data.append(page_info)
         
-        doc.close()
-        os.unlink(tmp_path)
+        # Pages are rendered when first viewed (2x zoom for better quality), neighbours in the background
+        pages_data = document.lazy(page_info)
+        page_images = page_image_urls(document, zoom=2.0)
         
         return pages_data, metadata, page_images
     
@@ -211,8 +180,13 @@ def display_pdf_page_with_text(page_image, page_text, page_num):
     with col1:
         st.subheader(f"📄 Page {page_num}")
         
-        # Display page image
-        st.image(page_image, use_column_width=True, caption=f"Page {page_num}")
+        # Display page image; st.image only accepts absolute URLs, and static assets are same-origin paths
+        st.markdown(f"""
+        <figure style="margin: 0;">
+            <img src="{page_image['url']}" alt="Page {page_num}" style="width: 100%;">
+            <figcaption style="text-align: center; color: #6c757d; font-size: 0.9em;">Page {page_num}</figcaption>
+        </figure>
+        """, unsafe_allow_html=True)
         
     with col2:
         st.subheader("📝 Text Content")
@@ -321,33 +295,24 @@ def process_video_generation(text, difficulty, duration, quality, page_num):
         
         try:
             # Initialize generator
-            generator = MathVideoGenerator()
-            
-            # Progress updates
-            status_text.text("🤖 Analyzing mathematical content...")
-            progress_bar.progress(20)
-            time.sleep(0.5)
+            generator = get_generator()
             
-            status_text.text("📝 Generating Manim animation code...")
-            progress_bar.progress(40)
-            time.sleep(0.5)
-            
-            status_text.text("🎬 Rendering video (this may take 2-5 minutes)...")
-            progress_bar.progress(60)
+            # Progress is driven by the generator's real pipeline stages
+            def update_progress(event):
+                progress_bar.progress(event["progress"])
+                status_text.text(event["message"])
             
             # Generate video
             video_path = generator.create_video(
                 math_topic=text,
                 difficulty=difficulty,
                 duration=duration,
-                quality=quality
+                quality=quality,
+                progress_callback=update_progress,
+                preview=False
             )
             
-            progress_bar.progress(100)
-            status_text.text("✅ Video generation complete!")
-            
             # Clear progress indicators
-            time.sleep(1)
             progress_bar.empty()
             status_text.empty()
             
@@ -467,14 +432,14 @@ def main():
                     st.rerun()
             
             with col2:
-                page_options = [f"Page {i+1} ({page['word_count']} words)" 
-                              for i, page in enumerate(st.session_state.pdf_pages)]
+                # Labels must not touch page contents, or every page would be extracted up front
+                page_count = len(st.session_state.pdf_pages)
                 
                 selected_page = st.selectbox(
                     "Select Page:",
                     range(len(st.session_state.pdf_pages)),
                     index=st.session_state.current_page,
-                    format_func=lambda x: page_options[x],
+                    format_func=lambda x: f"Page {x + 1} of {page_count}",
                     key="page_selector"
                 )
                 
@@ -495,7 +460,7 @@ def main():
                 # Display page with text selection
                 selected_text = display_pdf_page_with_text(
                     page_image, 
-                    page_info['text'], 
+                    page_info['math_text'], 
                     page_info['page_num']
                 )
                 
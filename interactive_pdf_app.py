@@ -4,16 +4,13 @@ PDF viewer with direct text selection and floating action popups
 """
 
 import streamlit as st
-import fitz  # PyMuPDF
-import tempfile
 import os
-import base64
 from pathlib import Path
 import time
 import json
-from PIL import Image
-import io
-from math_video_generator import MathVideoGenerator
+from math_video_generator import get_generator
+from pdf_ingest import open_pdf
+from asset_server import page_image_urls
 import streamlit.components.v1 as components
 
 # Page configuration
@@ -226,83 +223,29 @@ def initialize_session_state():
     if 'generation_in_progress' not in st.session_state:
         st.session_state.generation_in_progress = False
 
-def extract_text_blocks_with_positions(page):
-    """Extract text blocks with their exact positions for overlay."""
-    blocks = []
-    
-    # Get text blocks with position information
-    text_dict = page.get_text("dict")
-    
-    for block in text_dict["blocks"]:
-        if "lines" in block:
-            for line in block["lines"]:
-                for span in line["spans"]:
-                    if span["text"].strip():
-                        bbox = span["bbox"]  # [x0, y0, x1, y1]
-                        blocks.append({
-                            "text": span["text"],
-                            "bbox": bbox,
-                            "font": span["font"],
-                            "size": span["size"],
-                            "flags": span["flags"]
-                        })
-    
-    return blocks
-
 def convert_pdf_to_interactive_pages(pdf_file):
     """Convert PDF pages to images with text overlay information."""
     try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(pdf_file.getvalue())
-            tmp_path = tmp_file.name
-        
-        # Open PDF with PyMuPDF
-        doc = fitz.open(tmp_path)
-        
-        # Extract metadata
-        metadata = {
-            'title': doc.metadata.get('title', 'Unknown'),
-            'author': doc.metadata.get('author', 'Unknown'),
-            'page_count': doc.page_count,
-            'file_size': len(pdf_file.getvalue())
-        }
+        # Pages and text come from the shared content-hash cache when this PDF was seen before
+        document = open_pdf(pdf_file)
         
-        # Convert pages to images and extract text with positions
-        pages_data = []
-        page_images = []
-        page_text_blocks = []
+        metadata = {key: document.metadata[key] for key in ('title', 'author', 'page_count', 'file_size')}
         
-        for page_num in range(min(doc.page_count, 20)):  # Limit to 20 pages for performance
-            page = doc[page_num]
-            
-            # Convert page to image with higher resolution
-            mat = fitz.Matrix(2.0, 2.0)  # 2x zoom for better quality
-            pix = page.get_pixmap(matrix=mat)
-            img_data = pix.tobytes("png")
-            
-            # Convert to PIL Image
-            img = Image.open(io.BytesIO(img_data))
-            page_images.append(img)
-            
-            # Extract text blocks with positions
-            text_blocks = extract_text_blocks_with_positions(page)
-            page_text_blocks.append(text_blocks)
-            
-            # Extract plain text
-            text = page.get_text()
-            
-            page_info = {
+        def page_info(page_num):
+            page_text = document.page_text(page_num)
+            return {
                 'page_num': page_num + 1,
-                'text': text,
-                'word_count': len(text.split()) if text else 0,
-                'char_count': len(text) if text else 0,
-                'image_size': img.size  # (width, height)
+                'text': page_text['text'],
+                'word_count': page_text['word_count'],
+                'char_count': page_text['char_count'],
+                'image_size': document.image_size(page_num, zoom=2.0)  # (width, height)
             }
-            pages_data.append(page_info)
         
-        doc.close()
-        os.unlink(tmp_path)
+        # Pages are rendered when first viewed (2x zoom for better quality), neighbours in the background
+        pages_data = document.lazy(page_info)
+        page_images = page_image_urls(document, zoom=2.0)
+        # One overlay element per line rather than per span keeps dense math pages light
+        page_text_blocks = document.lazy(lambda page_num: document.text_index(page_num).line_blocks())
         
         return pages_data, metadata, page_images, page_text_blocks
     
@@ -313,13 +256,9 @@ def convert_pdf_to_interactive_pages(pdf_file):
 def create_interactive_pdf_viewer(page_image, text_blocks, page_num):
     """Create an interactive PDF viewer with selectable text overlay."""
     
-    # Convert PIL image to base64 for HTML display
-    img_buffer = io.BytesIO()
-    page_image.save(img_buffer, format='PNG')
-    img_str = base64.b64encode(img_buffer.getvalue()).decode()
-    
-    # Get image dimensions
-    img_width, img_height = page_image.size
+    # The page image is a cached static asset, so the browser fetches it once by URL
+    img_url = page_image['url']
+    img_width, img_height = page_image['size']
     
     # Create text overlay HTML
     text_overlay_html = ""
@@ -349,7 +288,7 @@ def create_interactive_pdf_viewer(page_image, text_blocks, page_num):
     interactive_html = f"""
     <div class="pdf-viewer-container">
         <div class="pdf-page-container" id="page-{page_num}">
-            <img src="data:image/png;base64,{img_str}" 
+            <img src="{img_url}" 
                  class="pdf-page-image" 
                  id="pdf-image-{page_num}"
                  style="width: 100%; max-width: 800px;">
@@ -465,32 +404,23 @@ def process_video_generation_interactive(text, page_num):
         
         try:
             # Initialize generator
-            generator = MathVideoGenerator()
+            generator = get_generator()
             
-            # Progress updates
-            status_text.text("🧠 AI analyzing mathematical content...")
-            progress_bar.progress(25)
-            time.sleep(1)
-            
-            status_text.text("📝 Generating Manim animation code...")
-            progress_bar.progress(50)
-            time.sleep(1)
-            
-            status_text.text("🎬 Rendering video (2-5 minutes)...")
-            progress_bar.progress(75)
+            # Progress is driven by the generator's real pipeline stages
+            def update_progress(event):
+                progress_bar.progress(event["progress"])
+                status_text.text(event["message"])
             
             # Generate video with default settings
             video_path = generator.create_video(
                 math_topic=text,
                 difficulty="intermediate",
                 duration=60,
-                quality="medium_quality"
+                quality="medium_quality",
+                progress_callback=update_progress,
+                preview=False
             )
             
-            progress_bar.progress(100)
-            status_text.text("✅ Video generation complete!")
-            time.sleep(1)
-            
             # Clear progress indicators
             progress_placeholder.empty()
             
@@ -638,14 +568,14 @@ def main():
                     st.rerun()
             
             with col2:
-                page_options = [f"Page {i+1} ({page['word_count']} words)" 
-                              for i, page in enumerate(st.session_state.pdf_pages)]
+                # Labels must not touch page contents, or every page would be extracted up front
+                page_count = len(st.session_state.pdf_pages)
                 
                 selected_page = st.selectbox(
                     "Select Page:",
                     range(len(st.session_state.pdf_pages)),
                     index=st.session_state.current_page,
-                    format_func=lambda x: page_options[x],
+                    format_func=lambda x: f"Page {x + 1} of {page_count}",
                     key="page_selector"
                 )
                 
@@ -0,0 +1,385 @@
+"""
+Persistent Job Queue for Math Video Generator
+SQLite-backed job queue with a bounded pool of render workers.
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+def _boot_id():
+    """Return an ID that changes on every reboot (Linux), or "" where there is none."""
+    try:
+        return Path("/proc/sys/kernel/random/boot_id").read_text().strip()
+    except OSError:
+        return ""
+
+
+def _process_alive(pid):
+    """Return whether a local process exists; unknown (treated as alive) on Windows."""
+    if os.name == "nt":
+        # os.kill() would terminate the process there; heartbeats decide instead
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # EPERM: the process exists but belongs to someone else
+        return True
+    return True
+
+
+# Identifies the process that claims a job, so a restart can tell its jobs were orphaned
+PROCESS_OWNER = f"{socket.gethostname()}:{_boot_id()}:{os.getpid()}"
+
+
+def owner_is_gone(owner):
+    """
+    Return whether the process that claimed a job has certainly exited.
+
+    Owners on other hosts cannot be checked and count as alive; their jobs are only
+    recovered once their heartbeats go stale.
+    """
+    if not owner:
+        return False
+    host, boot_id, pid = owner.rsplit(":", 2)
+    current_host, current_boot_id, current_pid = PROCESS_OWNER.rsplit(":", 2)
+    if host != current_host:
+        return False
+    if boot_id != current_boot_id:
+        return True
+    return pid != current_pid and not _process_alive(int(pid))
+
+
+class JobQueue:
+    """Bounded FIFO/priority job queue persisted in SQLite so queued and running work survives restarts."""
+
+    def __init__(self, db_path, max_queued=100, stale_after=120, max_running=None):
+        """
+        Initialize the job queue.
+
+        Args:
+            db_path (str | Path): SQLite database file
+            max_queued (int): Maximum number of jobs waiting to run
+            stale_after (float): Seconds without a heartbeat after which a running job is requeued
+            max_running (int): Maximum number of jobs running at once across every process
+                sharing the database, or None for no limit
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_queued = max_queued
+        self.max_running = max_running
+        self.stale_after = stale_after
+        self._new_job = threading.Event()
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id TEXT UNIQUE NOT NULL,
+                    payload TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    heartbeat_at REAL,
+                    finished_at REAL,
+                    owner TEXT
+                )
+            """)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "owner" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, priority, seq)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_job(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def submit(self, payload, priority=0, job_id=None):
+        """
+        Add a job to the queue.
+
+        Args:
+            payload (dict): JSON-serializable job arguments
+            priority (int): Higher priorities run first; equal priorities run FIFO
+            job_id (str): Optional caller-chosen ID
+
+        Returns:
+            str: The job ID
+
+        Raises:
+            QueueFullError: If max_queued jobs are already waiting
+        """
+        job_id = job_id or uuid.uuid4().hex
+
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+                if queued >= self.max_queued:
+                    raise QueueFullError(f"Job queue is full ({queued} jobs waiting)")
+                conn.execute(
+                    "INSERT INTO jobs (id, payload, priority, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                    (job_id, json.dumps(payload), int(priority), time.time())
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        self._new_job.set()
+        return job_id
+
+    def claim(self):
+        """
+        Atomically take the next queued job and mark it running.
+
+        Returns:
+            dict: The claimed job, or None if the queue is empty or max_running jobs are running
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self.max_running:
+                    # Counted inside the write transaction, so processes cannot overshoot together
+                    running = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'running'").fetchone()[0]
+                    if running >= self.max_running:
+                        conn.execute("COMMIT")
+                        return None
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' ORDER BY priority DESC, seq ASC LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                now = time.time()
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ?, heartbeat_at = ?, owner = ?, "
+                    "attempts = attempts + 1 WHERE seq = ?",
+                    (now, now, PROCESS_OWNER, row["seq"])
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        job = self._row_to_job(row)
+        job["status"] = "running"
+        return job
+
+    def heartbeat(self, job_ids):
+        """Mark running jobs as still alive."""
+        if not job_ids:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running'",
+                [(time.time(), job_id) for job_id in job_ids]
+            )
+
+    def complete(self, job_id, result=None):
+        """Mark a job as completed with an optional JSON-serializable result."""
+        self._finish(job_id, "completed", result=result)
+
+    def fail(self, job_id, error):
+        """Mark a job as failed with an error message."""
+        self._finish(job_id, "failed", error=str(error))
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+            )
+
+    def recover(self):
+        """
+        Requeue running jobs whose process has exited (a restart or a crashed worker) or
+        whose heartbeats stopped more than stale_after seconds ago.
+
+        Returns:
+            int: Number of jobs requeued
+        """
+        stale_before = time.time() - self.stale_after
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id, owner, heartbeat_at FROM jobs WHERE status = 'running'").fetchall()
+            orphaned = [
+                (row["id"],) for row in rows
+                if row["heartbeat_at"] is None or row["heartbeat_at"] < stale_before or owner_is_gone(row["owner"])
+            ]
+            # The status check skips jobs that finished since they were read
+            cursor = conn.executemany(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, heartbeat_at = NULL, owner = NULL "
+                "WHERE id = ? AND status = 'running'",
+                orphaned
+            )
+            recovered = cursor.rowcount if orphaned else 0
+
+        if recovered:
+            self._new_job.set()
+        return recovered
+
+    def get(self, job_id):
+        """Return a job by ID, or None if it does not exist."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row)
+
+    def position(self, job_id):
+        """
+        Return the 1-based position of a queued job, or None if it is not waiting.
+
+        Args:
+            job_id (str): The job ID
+
+        Returns:
+            int: Number of jobs that will run before this one, plus one
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT priority, seq FROM jobs WHERE id = ? AND status = 'queued'", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            ahead = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND "
+                "(priority > ? OR (priority = ? AND seq < ?))",
+                (row["priority"], row["priority"], row["seq"])
+            ).fetchone()[0]
+        return ahead + 1
+
+    def counts(self):
+        """Return the number of jobs in each status."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def wait_for_job(self, timeout):
+        """Block until a job may be available or the timeout elapses."""
+        if self._new_job.wait(timeout):
+            self._new_job.clear()
+
+
+class WorkerPool:
+    """Fixed-size pool of threads that pull jobs from a JobQueue and run them through a handler."""
+
+    def __init__(self, job_queue, handler, num_workers=2, poll_interval=2.0, heartbeat_interval=15.0):
+        """
+        Initialize the worker pool.
+
+        Args:
+            job_queue (JobQueue): Queue to pull jobs from
+            handler (callable): Called with each job dict; its return value is stored as the job result
+            num_workers (int): Number of concurrent workers
+            poll_interval (float): Seconds between polls when the queue is empty
+            heartbeat_interval (float): Seconds between heartbeats for running jobs
+        """
+        self.job_queue = job_queue
+        self.handler = handler
+        self.num_workers = max(1, int(num_workers))
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self._threads = []
+        self._pid = None
+        self._running_jobs = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self):
+        """Requeue stale jobs and start the worker threads (idempotent, and again after a fork)."""
+        with self._lock:
+            if self.started:
+                return
+            # Threads do not survive fork(), e.g. gunicorn --preload starting workers in the master
+            self._threads = []
+            self._running_jobs = set()
+            self._pid = os.getpid()
+            recovered = self.job_queue.recover()
+            if recovered:
+                print(f"♻️ Requeued {recovered} interrupted job(s)")
+
+            for i in range(self.num_workers):
+                thread = threading.Thread(target=self._worker_loop, name=f"render-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+            thread = threading.Thread(target=self._heartbeat_loop, name="render-heartbeat", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Ask the workers to exit after their current job."""
+        self._stop.set()
+
+    @property
+    def started(self):
+        return bool(self._threads) and self._pid == os.getpid()
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                job = self.job_queue.claim()
+            except sqlite3.Error as e:
+                print(f"⚠️ Could not claim job: {e}")
+                job = None
+
+            if job is None:
+                self.job_queue.wait_for_job(self.poll_interval)
+                continue
+
+            with self._lock:
+                self._running_jobs.add(job["id"])
+
+            try:
+                result = self.handler(job)
+                self.job_queue.complete(job["id"], result)
+            except Exception as e:
+                print(f"❌ Job {job['id']} failed: {e}")
+                self.job_queue.fail(job["id"], e)
+            finally:
+                with self._lock:
+                    self._running_jobs.discard(job["id"])
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            with self._lock:
+                job_ids = list(self._running_jobs)
+            try:
+                self.job_queue.heartbeat(job_ids)
+                # Other processes sharing the queue (e.g. gunicorn workers) may have crashed mid-job
+                recovered = self.job_queue.recover()
+                if recovered:
+                    print(f"♻️ Requeued {recovered} orphaned job(s)")
+            except sqlite3.Error as e:
+                print(f"⚠️ Heartbeat failed: {e}")
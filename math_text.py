@@ -0,0 +1,220 @@
+"""
+Math-Aware Text Extraction for PDF Pages
+Finds formulas in a page's text spans by font, glyphs and layout and rewrites them as approximate
+LaTeX, so prompts carry "$x^{2} + \\alpha$" instead of the character soup plain extraction yields.
+"""
+
+import re
+
+# Bump when the output changes so cached pages are extracted again
+MATH_TEXT_VERSION = 2
+
+# Fonts that only typeset math: TeX's Computer Modern / AMS / Latin Modern math fonts,
+# Symbol, STIX and anything else with "Math" in its name (Cambria Math, XITS Math, ...)
+MATH_FONT_RE = re.compile(
+    r"^(CMMI|CMSY|CMEX|CMBSY|CMMIB|MSAM|MSBM|EUFM|EUSM|EUEX|RSFS|LMMathItalic|LMMathSymbols|"
+    r"LMMathExtension|Symbol|STIX)|Math",
+    re.IGNORECASE
+)
+
+# Unicode glyphs with a LaTeX spelling; any of them marks a span as math
+GLYPH_LATEX = {
+    # Greek
+    "α": r"\alpha", "β": r"\beta", "γ": r"\gamma", "δ": r"\delta", "ε": r"\epsilon",
+    "ϵ": r"\epsilon", "ζ": r"\zeta", "η": r"\eta", "θ": r"\theta", "ϑ": r"\vartheta",
+    "ι": r"\iota", "κ": r"\kappa", "λ": r"\lambda", "μ": r"\mu", "ν": r"\nu", "ξ": r"\xi",
+    "π": r"\pi", "ϖ": r"\varpi", "ρ": r"\rho", "ϱ": r"\varrho", "σ": r"\sigma", "ς": r"\varsigma",
+    "τ": r"\tau", "υ": r"\upsilon", "φ": r"\phi", "ϕ": r"\phi", "χ": r"\chi", "ψ": r"\psi",
+    "ω": r"\omega", "Γ": r"\Gamma", "Δ": r"\Delta", "Θ": r"\Theta", "Λ": r"\Lambda", "Ξ": r"\Xi",
+    "Π": r"\Pi", "Σ": r"\Sigma", "Υ": r"\Upsilon", "Φ": r"\Phi", "Ψ": r"\Psi", "Ω": r"\Omega",
+    # Large operators and calculus
+    "∑": r"\sum", "∏": r"\prod", "∫": r"\int", "∬": r"\iint", "∮": r"\oint", "√": r"\sqrt",
+    "∂": r"\partial", "∇": r"\nabla", "∞": r"\infty",
+    # Binary operators
+    "±": r"\pm", "∓": r"\mp", "×": r"\times", "÷": r"\div", "·": r"\cdot", "⋅": r"\cdot",
+    "∘": r"\circ", "∗": "*", "−": "-", "⊕": r"\oplus", "⊗": r"\otimes",
+    # Relations
+    "≤": r"\leq", "≥": r"\geq", "≠": r"\neq", "≈": r"\approx", "≡": r"\equiv", "∼": r"\sim",
+    "≃": r"\simeq", "≅": r"\cong", "∝": r"\propto", "≪": r"\ll", "≫": r"\gg",
+    "→": r"\to", "←": r"\leftarrow", "↔": r"\leftrightarrow", "⇒": r"\Rightarrow",
+    "⇐": r"\Leftarrow", "⇔": r"\Leftrightarrow", "↦": r"\mapsto",
+    # Sets and logic
+    "∈": r"\in", "∉": r"\notin", "∋": r"\ni", "⊂": r"\subset", "⊃": r"\supset",
+    "⊆": r"\subseteq", "⊇": r"\supseteq", "∪": r"\cup", "∩": r"\cap", "∅": r"\emptyset",
+    "∀": r"\forall", "∃": r"\exists", "¬": r"\neg", "∧": r"\wedge", "∨": r"\vee",
+    "ℝ": r"\mathbb{R}", "ℕ": r"\mathbb{N}", "ℤ": r"\mathbb{Z}", "ℚ": r"\mathbb{Q}", "ℂ": r"\mathbb{C}",
+    # Delimiters and dots
+    "⟨": r"\langle", "⟩": r"\rangle", "⌊": r"\lfloor", "⌋": r"\rfloor", "⌈": r"\lceil",
+    "⌉": r"\rceil", "…": r"\ldots", "⋯": r"\cdots", "′": "'", "″": "''",
+}
+
+# PyMuPDF span flag for superscripts
+SUPERSCRIPT_FLAG = 1
+
+# A span this much smaller than its line's body text, and shifted off its centre, is a script
+SCRIPT_SIZE_RATIO = 0.85
+# A line whose visible characters are mostly math is typeset as a display formula
+DISPLAY_MATH_SHARE = 0.6
+
+TRAILING_WORD_RE = re.compile(r"\S+$")
+COMMAND_END_RE = re.compile(r"\\[A-Za-z]+$")
+
+
+def is_math_font(font):
+    """Return whether a PDF font name (with or without its ABCDEF+ subset prefix) is a math font."""
+    return bool(MATH_FONT_RE.search(font.split("+", 1)[-1]))
+
+
+def join_latex(parts):
+    """Concatenate LaTeX fragments, spacing a command from a following letter ("\\alpha x", not "\\alphax")."""
+    joined = ""
+    for part in parts:
+        if part[:1].isalpha() and COMMAND_END_RE.search(joined):
+            joined += " "
+        joined += part
+    return joined
+
+
+def to_latex(text):
+    """Spell the math glyphs of text as LaTeX commands, keeping everything else."""
+    return join_latex(GLYPH_LATEX.get(char, char) for char in text)
+
+
+def _script_kind(span, body_size, body_middle):
+    """Return "^" for a superscript span, "_" for a subscript, or None."""
+    if span["flags"] & SUPERSCRIPT_FLAG and span["size"] < body_size:
+        return "^"
+    if span["size"] >= body_size * SCRIPT_SIZE_RATIO:
+        return None
+    _, y0, _, y1 = span["bbox"]
+    middle = (y0 + y1) / 2
+    if middle < body_middle - body_size * 0.15:
+        return "^"
+    if middle > body_middle + body_size * 0.1:
+        return "_"
+    return None
+
+
+def _is_math_span(span):
+    if is_math_font(span["font"]):
+        return True
+    visible = [char for char in span["text"] if not char.isspace()]
+    return bool(visible) and sum(char in GLYPH_LATEX for char in visible) * 2 >= len(visible)
+
+
+def _split_lines(spans):
+    """Group spans (in reading order) into lists sharing a line number."""
+    lines = []
+    for span in spans:
+        if lines and lines[-1][0]["line"] == span["line"]:
+            lines[-1].append(span)
+        else:
+            lines.append([span])
+    return lines
+
+
+def _convert_line(line_spans):
+    """
+    Rewrite one line, wrapping its math in $...$ (or $$...$$ when the whole line is a formula).
+
+    Returns:
+        tuple: (text, regions) where regions are dicts with latex, bbox and display
+    """
+    # The body text of the line is its most common font size
+    weights = {}
+    for span in line_spans:
+        weights[span["size"]] = weights.get(span["size"], 0) + len(span["text"].strip())
+    body_size = max(weights, key=weights.get)
+    body_spans = [span for span in line_spans if span["size"] == body_size]
+    body_middle = sum((span["bbox"][1] + span["bbox"][3]) / 2 for span in body_spans) / len(body_spans)
+
+    # Tag each span as text or math; scripts are math even in a text font ("mc" + "2")
+    pieces = []
+    for span in line_spans:
+        script = _script_kind(span, body_size, body_middle)
+        if script:
+            pieces.append((True, f"{script}{{{to_latex(span['text'].strip())}}}", span["bbox"]))
+        elif _is_math_span(span):
+            pieces.append((True, to_latex(span["text"]), span["bbox"]))
+        else:
+            pieces.append((False, span["text"], span["bbox"]))
+
+    # Measured on the PDF glyphs, not on their longer LaTeX spellings
+    math_chars = sum(len(span["text"].strip()) for span, (is_math, _, _) in zip(line_spans, pieces) if is_math)
+    all_chars = sum(weights.values())
+    if math_chars and math_chars >= all_chars * DISPLAY_MATH_SHARE:
+        latex = join_latex(text if is_math else to_latex(text) for is_math, text, _ in pieces).strip()
+        bbox = _union(bbox for _, _, bbox in pieces)
+        return f"$${latex}$$", [{"latex": latex, "bbox": bbox, "display": True}]
+
+    output = []
+    # Box of the text span each output piece came from (None for formulas)
+    output_boxes = []
+    regions = []
+    index = 0
+    while index < len(pieces):
+        is_math, text, bbox = pieces[index]
+        if not is_math:
+            output.append(text)
+            output_boxes.append(bbox)
+            index += 1
+            continue
+
+        run = []
+        boxes = []
+        while index < len(pieces) and pieces[index][0]:
+            run.append(pieces[index][1])
+            boxes.append(pieces[index][2])
+            index += 1
+        latex = join_latex(run)
+
+        # A script belongs to the word before it: "E = mc" + "^{2}" becomes "$mc^{2}$"
+        if latex[:1] in "^_" and output:
+            base = TRAILING_WORD_RE.search(output[-1])
+            if base:
+                output[-1] = output[-1][:base.start()]
+                latex = base.group() + latex
+                if output_boxes[-1]:
+                    boxes.append(output_boxes[-1])
+
+        leading = latex[:len(latex) - len(latex.lstrip())]
+        trailing = latex[len(latex.rstrip()):]
+        latex = latex.strip()
+        if not latex:
+            output.append(leading + trailing)
+            output_boxes.append(None)
+            continue
+        output.append(f"{leading}${latex}${trailing}")
+        output_boxes.append(None)
+        regions.append({"latex": latex, "bbox": _union(boxes), "display": False})
+
+    return "".join(output), regions
+
+
+def _union(boxes):
+    boxes = list(boxes)
+    return [min(box[0] for box in boxes), min(box[1] for box in boxes),
+            max(box[2] for box in boxes), max(box[3] for box in boxes)]
+
+
+def extract_math_text(spans):
+    """
+    Rebuild text from pdf_ingest spans with its formulas as approximate LaTeX.
+
+    Args:
+        spans (list): Span dicts (text, bbox, font, size, flags, line) in reading order
+
+    Returns:
+        dict: version, text (one line per PDF line, math in $...$ or $$...$$) and regions
+            (latex, bbox, display and line of every formula found)
+    """
+    lines = []
+    regions = []
+    for line_spans in _split_lines(spans):
+        text, line_regions = _convert_line(line_spans)
+        lines.append(text)
+        for region in line_regions:
+            region["line"] = line_spans[0]["line"]
+        regions.extend(line_regions)
+
+    return {"version": MATH_TEXT_VERSION, "text": "\n".join(lines), "regions": regions}
@@ -1,14 +1,393 @@
 import os
 import re
+import time
+import uuid
+import shutil
+import sqlite3
+import hashlib
 import tempfile
+import threading
 import subprocess
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import httpx
 from openai import OpenAI
 from dotenv import load_dotenv
+from generation_cache import CodeCache, RenderCache, link_or_copy
+from code_validator import validate_scene_code
+from video_catalog import create_video_catalog
+from prompt_builder import compact_prompt
 
 # Load environment variables
 load_dotenv()
 
+# Bump whenever SYSTEM_PROMPT changes so cached code from the old prompt is not reused
+SYSTEM_PROMPT_VERSION = "1"
+
+SYSTEM_PROMPT = """You are an expert in mathematical visualization and Manim (Mathematical Animation Engine).
+        
+        Your task is to generate complete, executable Manim code that creates educational math videos.
+        
+        Guidelines:
+        1. Create a class that inherits from Scene
+        2. Use proper Manim imports and syntax
+        3. Include clear mathematical explanations as text animations
+        4. Use appropriate colors, scaling, and positioning
+        5. Add smooth transitions and animations
+        6. Target duration: approximately {duration} seconds
+        7. Difficulty level: {difficulty}
+        8. Make the visualization engaging and educational
+        9. Include step-by-step explanations
+        10. Use proper mathematical notation with MathTex when needed
+        
+        Return ONLY the Python code without any markdown formatting or explanations."""
+
+# Manim log lines used to derive real render progress
+ANIMATION_PROGRESS_RE = re.compile(r'Animation\s+(\d+)\s*:.*?(\d+)%\|')
+ANIMATION_DONE_RE = re.compile(r'Animation\s+(\d+)\s*:\s*Partial movie file written')
+COMBINING_RE = re.compile(r'Combining to Movie file')
+
+# Streaming LLM output: scene header and fenced code block detection
+SCENE_CLASS_RE = re.compile(r'class\s+(\w+)\s*\(\s*\w*Scene\s*\)\s*:')
+CODE_FENCE_RE = re.compile(r'```[^\n]*\n(.*?)```', re.DOTALL)
+
+# Manim quality flags and the video folders Manim names after them
+QUALITY_FLAGS = {"low_quality": "l", "medium_quality": "m", "high_quality": "h"}
+QUALITY_FOLDERS = {"l": "480p15", "m": "720p30", "h": "1080p60"}
+QUALITY_BY_FOLDER = {QUALITY_FOLDERS[flag]: quality for quality, flag in QUALITY_FLAGS.items()}
+
+# Every scene is written and rendered inside its own job directory
+SCENE_FILE_NAME = "generated_scene.py"
+
+# Maximum completion length requested from the model
+MAX_COMPLETION_TOKENS = 2000
+
+REPAIR_SYSTEM_PROMPT = """You are an expert in Manim (Mathematical Animation Engine).
+        You fix Manim scenes that failed to render. Change only what is needed to fix the error,
+        keep the scene class name and the content of the animation.
+        
+        Return ONLY the complete corrected Python code without any markdown formatting or explanations."""
+
+REPAIR_PROMPT = """This Manim scene failed to render.
+
+Error:
+{error}
+
+Code:
+```python
+{code}
+```"""
+
+# Render failures worth a repair attempt: errors raised by the scene code itself
+FIXABLE_RENDER_ERROR_RE = re.compile(
+    r'\b(NameError|AttributeError|TypeError|ValueError|IndexError|KeyError|ZeroDivisionError|'
+    r'SyntaxError|IndentationError|UnboundLocalError|AssertionError|RecursionError|ImportError)\b|'
+    r'LaTeX|latex error'
+)
+# Environment problems a code change cannot fix
+UNFIXABLE_RENDER_ERROR_RE = re.compile(
+    r"No module named '?manim|ffmpeg.*not found|not found.*ffmpeg|No space left|MemoryError|"
+    r"Permission denied|KeyboardInterrupt|is not recognized as|Check your LaTeX installation|"
+    r"No such file or directory: '?(latex|xelatex|dvisvgm|ffmpeg)|TimeoutExpired|timed out",
+    re.IGNORECASE
+)
+ANSI_ESCAPE_RE = re.compile(r'\x1b\[[0-9;?]*[A-Za-z]')
+
+class GenerationAborted(Exception):
+    """Raised when a streamed completion is rejected before it finishes."""
+
+def report_progress(progress_callback, stage, progress, message, **details):
+    """
+    Send a progress event to an optional callback.
+    
+    Args:
+        progress_callback (callable): Receives a dict with stage, progress (0-100), message and details
+        stage (str): Pipeline stage name
+        progress (int): Overall progress percentage
+        message (str): Human-readable status message
+    """
+    if progress_callback is None:
+        return
+    try:
+        progress_callback(dict(details, stage=stage, progress=int(progress), message=message))
+    except Exception as e:
+        print(f"⚠️ Progress callback failed: {e}")
+
+def extract_render_error(output, max_lines=40, max_chars=3000):
+    """
+    Pull the relevant traceback out of Manim's log output.
+    
+    Args:
+        output (str): Combined Manim stdout/stderr
+        max_lines (int): Maximum number of lines kept
+        max_chars (int): Maximum length of the excerpt
+    
+    Returns:
+        str: The last traceback (or the tail of the log if there is none), without
+            colour codes, rich box drawing or progress bars
+    """
+    lines = []
+    for line in ANSI_ESCAPE_RE.sub("", output).splitlines():
+        line = line.strip(" \t│╭╮╰╯─")
+        if line and not ANIMATION_PROGRESS_RE.search(line):
+            lines.append(line)
+    
+    starts = [i for i, line in enumerate(lines) if "Traceback" in line]
+    excerpt = lines[starts[-1]:] if starts else lines
+    return "\n".join(excerpt[-max_lines:])[-max_chars:]
+
+def is_fixable_render_failure(output):
+    """Return True if a failed render looks like a bug in the scene code rather than the environment."""
+    if UNFIXABLE_RENDER_ERROR_RE.search(output):
+        return False
+    return bool(FIXABLE_RENDER_ERROR_RE.search(output))
+
+def find_rendered_videos(output_dir="math_videos"):
+    """
+    List rendered videos on disk, newest first.
+    
+    Looks in the job directories under output_dir and in Manim's default media/videos
+    folder used by older versions. This walks the directory tree, so it is only used to
+    fill the video catalog for the first time.
+    
+    Returns:
+        list: Dicts with name, path, quality, size and created (mtime)
+    """
+    patterns = [(Path(output_dir) / "jobs", "*/media/videos/*/*/*.mp4"), (Path("media") / "videos", "*/*/*.mp4")]
+    videos = []
+    for root, pattern in patterns:
+        if not root.exists():
+            continue
+        for video in root.glob(pattern):
+            if "partial_movie_files" in video.parts:
+                continue
+            stat = video.stat()
+            videos.append({
+                "name": video.stem.replace("_", " ").title(),
+                "path": str(video),
+                "quality": video.parent.name,
+                "size": stat.st_size,
+                "created": stat.st_mtime
+            })
+    return sorted(videos, key=lambda video: video["created"], reverse=True)
+
+def write_manim_config(config_path, cache_dir):
+    """
+    Write a Manim config file that points the LaTeX and text caches at a shared directory.
+
+    Jobs render with their own --media_dir, which would otherwise give each one empty Tex/ and
+    texts/ folders and recompile every MathTex and Text from scratch.
+
+    Args:
+        config_path (str | Path): manim.cfg to write
+        cache_dir (str | Path): Directory shared by every job's Tex/ and texts/ caches
+
+    Returns:
+        Path: The config file
+    """
+    config_path = Path(config_path)
+    cache_dir = Path(cache_dir).resolve()
+    config_path.parent.mkdir(parents=True, exist_ok=True)
+    content = (
+        "[CLI]\n"
+        f"tex_dir = {(cache_dir / 'Tex').as_posix()}\n"
+        f"text_dir = {(cache_dir / 'texts').as_posix()}\n"
+    )
+    try:
+        if config_path.read_text(encoding="utf-8") == content:
+            return config_path
+    except OSError:
+        pass
+    tmp_path = config_path.with_name(f"{config_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_text(content, encoding="utf-8")
+    os.replace(tmp_path, config_path)
+    return config_path
+
+class CompletionStreamMonitor:
+    """Follows one streamed completion: latency metrics, scene class detection and early validation."""
+    
+    def __init__(self, check_code, progress_callback=None):
+        """
+        Initialize the monitor.
+        
+        Args:
+            check_code (callable): Raises GenerationAborted for a closed code block that cannot render
+            progress_callback (callable): Optional receiver of progress events
+        """
+        self.check_code = check_code
+        self.progress_callback = progress_callback
+        self.started = time.time()
+        self.first_token_at = None
+        self.tokens = 0
+        self.text = ""
+        self.scene_name = None
+        self.closed = False
+    
+    def feed(self, delta):
+        """
+        Add a streamed chunk of text.
+        
+        Returns:
+            bool: True once the code block has closed and passed the check (stop reading)
+        
+        Raises:
+            GenerationAborted: If the closed code block has no Scene class or does not parse
+        """
+        if not delta:
+            return False
+        
+        if self.first_token_at is None:
+            self.first_token_at = time.time()
+            ttft = self.first_token_at - self.started
+            report_progress(self.progress_callback, "llm_streaming", 8, f"📝 First token after {ttft:.1f}s",
+                            time_to_first_token=ttft)
+        
+        # Each streamed chunk carries roughly one token
+        self.tokens += 1
+        self.text += delta
+        progress = 10 + 15 * self.tokens / MAX_COMPLETION_TOKENS
+        
+        if self.scene_name is None:
+            scene_match = SCENE_CLASS_RE.search(self.text)
+            if scene_match:
+                self.scene_name = scene_match.group(1)
+                report_progress(self.progress_callback, "llm_streaming", progress,
+                                f"🧩 Detected scene class {self.scene_name}", scene_name=self.scene_name)
+        
+        if self.tokens % 50 == 0:
+            rate = self.tokens / max(time.time() - self.first_token_at, 1e-6)
+            report_progress(self.progress_callback, "llm_streaming", progress,
+                            f"📝 Received {self.tokens} tokens ({rate:.0f} tokens/s)",
+                            tokens=self.tokens, tokens_per_second=rate)
+        
+        # Stop as soon as the code block closes; anything after it is prose we would discard
+        fence_match = CODE_FENCE_RE.search(self.text)
+        if fence_match:
+            self.check_code(fence_match.group(1))
+            self.text = fence_match.group(0)
+            self.closed = True
+        return self.closed
+    
+    def finish(self):
+        """Report the latency metrics and return the collected completion text."""
+        elapsed = time.time() - self.started
+        ttft = (self.first_token_at - self.started) if self.first_token_at else elapsed
+        generation_time = max(elapsed - ttft, 1e-6)
+        print(f"⏱️ LLM: first token {ttft:.1f}s, {self.tokens} tokens in {elapsed:.1f}s "
+              f"({self.tokens / generation_time:.0f} tokens/s)")
+        report_progress(self.progress_callback, "llm_response", 25, f"📝 Received {self.tokens} tokens from AI",
+                        tokens=self.tokens, time_to_first_token=ttft,
+                        tokens_per_second=self.tokens / generation_time)
+        return self.text.strip()
+
+class ManimProgressParser:
+    """Turns Manim log lines into rendering progress events and keeps the full output."""
+    
+    def __init__(self, total_animations, progress_callback=None):
+        """
+        Initialize the parser and report the start of rendering.
+        
+        Args:
+            total_animations (int): Expected number of animations, used to scale progress
+            progress_callback (callable): Optional receiver of progress events
+        """
+        self.total_animations = total_animations
+        self.progress_callback = progress_callback
+        self.output_lines = []
+        self.last_reported = None
+        report_progress(progress_callback, "rendering", 30, "🎬 Rendering video with Manim...",
+                        animation=0, total_animations=total_animations)
+    
+    @property
+    def output(self):
+        """Combined Manim output seen so far."""
+        return "".join(self.output_lines)
+    
+    def feed(self, line):
+        """Record one line of Manim output and report progress if it advanced."""
+        self.output_lines.append(line)
+        
+        if COMBINING_RE.search(line):
+            report_progress(self.progress_callback, "combining", 92, "🎞️ Combining animations into final video")
+            return
+        
+        done_match = ANIMATION_DONE_RE.search(line)
+        progress_match = ANIMATION_PROGRESS_RE.search(line)
+        if done_match:
+            animation, fraction = int(done_match.group(1)) + 1, 0.0
+        elif progress_match:
+            animation, fraction = int(progress_match.group(1)), int(progress_match.group(2)) / 100
+        else:
+            return
+        
+        # Loops in the scene can play more animations than the static estimate
+        total = self.total_animations = max(self.total_animations, animation + (1 if fraction else 0))
+        completed = min(animation + fraction, total)
+        # Never move backwards when the animation estimate grows
+        progress = max(30 + 60 * completed / total, self.last_reported or 0)
+        
+        if self.last_reported is None or int(progress) != int(self.last_reported):
+            self.last_reported = progress
+            current = min(animation + 1, total)
+            report_progress(self.progress_callback, "rendering", progress,
+                            f"🎬 Rendering animation {current} of {total}",
+                            animation=current, total_animations=total)
+
+# Process-wide OpenAI clients and generator, shared so every request reuses pooled keep-alive connections
+_shared_lock = threading.Lock()
+_shared_clients = {}
+_shared_generator = None
+_ffmpeg_found = None
+
+def get_openai_client(endpoint, token):
+    """
+    Return the process-wide OpenAI client for an endpoint and token.
+    
+    The client keeps a pool of keep-alive connections, so repeated requests skip
+    the TCP/TLS handshake. Tune it with MVG_OPENAI_TIMEOUT (seconds),
+    MVG_OPENAI_MAX_RETRIES and MVG_OPENAI_MAX_CONNECTIONS.
+    """
+    with _shared_lock:
+        client = _shared_clients.get((endpoint, token))
+        if client is None:
+            timeout = float(os.environ.get("MVG_OPENAI_TIMEOUT", "120"))
+            max_connections = int(os.environ.get("MVG_OPENAI_MAX_CONNECTIONS", "20"))
+            http_client = httpx.Client(
+                timeout=httpx.Timeout(timeout, connect=10.0),
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                    keepalive_expiry=120
+                )
+            )
+            client = OpenAI(
+                base_url=endpoint,
+                api_key=token,
+                timeout=timeout,
+                max_retries=int(os.environ.get("MVG_OPENAI_MAX_RETRIES", "2")),
+                http_client=http_client,
+            )
+            _shared_clients[(endpoint, token)] = client
+        return client
+
+def get_generator():
+    """
+    Return the process-wide MathVideoGenerator, creating it on first use.
+    
+    Raises:
+        ValueError: If GITHUB_TOKEN is not configured
+    """
+    global _shared_generator
+    with _shared_lock:
+        generator = _shared_generator
+    if generator is None:
+        generator = MathVideoGenerator()
+        with _shared_lock:
+            if _shared_generator is None:
+                _shared_generator = generator
+            generator = _shared_generator
+    return generator
+
 class MathVideoGenerator:
     def __init__(self):
         """Initialize the Math Video Generator with GitHub AI integration."""
@@ -19,20 +398,72 @@ class MathVideoGenerator:
         self.endpoint = "https://models.github.ai/inference"
         self.model = "openai/gpt-4o"  # Using GPT-4o which is available in GitHub Models
         
-        self.client = OpenAI(
-            base_url=self.endpoint,
-            api_key=self.token,
-        )
+        self.client = get_openai_client(self.endpoint, self.token)
         
         # Create output directory
         self.output_dir = Path("math_videos")
         self.output_dir.mkdir(exist_ok=True)
         
+        # Cache of generated code keyed by topic, settings, model and prompt version
+        self.code_cache = CodeCache(
+            os.environ.get("MVG_CODE_CACHE_DIR", str(self.output_dir / ".cache" / "code")),
+            max_entries=int(os.environ.get("MVG_CODE_CACHE_MAX_ENTRIES", "500")),
+            max_age_days=float(os.environ.get("MVG_CODE_CACHE_MAX_AGE_DAYS", "30")),
+        )
+        self.use_code_cache = os.environ.get("MVG_DISABLE_CODE_CACHE", "").lower() not in ("1", "true", "yes")
+        
+        # Flag names that neither the scene nor manim defines (needs manim importable in this process)
+        self.check_names = os.environ.get("MVG_VALIDATE_NAMES", "1").lower() not in ("0", "false", "no")
+        
+        # Failed renders caused by the scene code are sent back to the AI this many times
+        self.max_repair_attempts = int(os.environ.get("MVG_MAX_REPAIR_ATTEMPTS", "2"))
+        
+        # Two-phase rendering: a fast 480p15 preview first, the requested quality in the background
+        self.preview_by_default = os.environ.get("MVG_PREVIEW_RENDER", "").lower() in ("1", "true", "yes")
+        self._final_render_pool = ThreadPoolExecutor(
+            max_workers=int(os.environ.get("MVG_FINAL_RENDER_WORKERS", "1")),
+            thread_name_prefix="final-render"
+        )
+        
+        # Stream completions so malformed code is rejected before the full response arrives
+        self.stream_llm = os.environ.get("MVG_STREAM_LLM", "1").lower() not in ("0", "false", "no")
+        
+        # Cache of finished renders keyed by cleaned code, scene name and quality
+        self.render_cache = RenderCache(
+            os.environ.get("MVG_RENDER_CACHE_DIR", str(self.output_dir / ".cache" / "renders")),
+            max_bytes=int(float(os.environ.get("MVG_RENDER_CACHE_MAX_MB", "2048")) * 1024 * 1024),
+        )
+        
+        # LaTeX and text glyphs compiled by Manim are shared by every job instead of per media_dir
+        self.manim_config = write_manim_config(
+            self.output_dir / ".cache" / "manim.cfg",
+            os.environ.get("MVG_MANIM_CACHE_DIR", str(self.output_dir / ".cache" / "manim"))
+        )
+        
+        # Index of finished videos, filled as renders complete
+        self.catalog = create_video_catalog()
+        if len(self.catalog) == 0:
+            self._backfill_catalog()
+        
         # Setup FFmpeg path for Manim
         self._setup_ffmpeg_path()
     
+    def _backfill_catalog(self):
+        """Add videos rendered before the catalog existed (one directory scan, on first start only)."""
+        try:
+            for video in find_rendered_videos(self.output_dir):
+                self.catalog.add(video["path"], topic=video["name"], quality=QUALITY_BY_FOLDER.get(video["quality"]))
+        except (OSError, sqlite3.Error) as e:
+            print(f"⚠️ Could not import existing videos into the catalog: {e}")
+    
     def _setup_ffmpeg_path(self):
         """Setup FFmpeg path for Manim to work properly."""
+        global _ffmpeg_found
+        
+        # PATH changes persist for the whole process, so probe only once
+        if _ffmpeg_found is not None:
+            return _ffmpeg_found
+        
         # Common FFmpeg installation paths on Windows
         ffmpeg_paths = [
             "C:\\ffmpeg\\bin",
@@ -63,9 +494,11 @@ class MathVideoGenerator:
             print("   2. Extract to C:\\ffmpeg")
             print("   3. Or install via: winget install Gyan.FFmpeg")
         
+        _ffmpeg_found = ffmpeg_found
         return ffmpeg_found
     
-    def generate_manim_code(self, math_topic, difficulty="intermediate", duration=30):
+    def generate_manim_code(self, math_topic, difficulty="intermediate", duration=30, use_cache=True,
+                            progress_callback=None, stream=None):
         """
         Generate Manim code for a given math topic using GitHub AI.
         
@@ -73,27 +506,71 @@ class MathVideoGenerator:
             math_topic (str): The mathematical concept to visualize
             difficulty (str): Difficulty level (beginner, intermediate, advanced)
             duration (int): Approximate duration of the video in seconds
+            use_cache (bool): Reuse previously generated code for the same request
+            progress_callback (callable): Optional receiver of progress events
+            stream (bool): Consume the completion incrementally and abort malformed code early
+                (defaults to MVG_STREAM_LLM, on unless disabled)
         
         Returns:
             str: Generated Manim code
         """
-        system_prompt = f"""You are an expert in mathematical visualization and Manim (Mathematical Animation Engine).
+        use_cache = use_cache and self.use_code_cache
+        stream = self.stream_llm if stream is None else stream
+        cache_key = self.code_cache.key_for(math_topic, difficulty, duration, self.model, SYSTEM_PROMPT_VERSION)
         
-        Your task is to generate complete, executable Manim code that creates educational math videos.
+        if use_cache:
+            cached_code = self.code_cache.get(cache_key)
+            if cached_code:
+                print("⚡ Using cached Manim code")
+                report_progress(progress_callback, "llm_response", 25, "⚡ Reusing previously generated code", cached=True)
+                return cached_code
         
-        Guidelines:
-        1. Create a class that inherits from Scene
-        2. Use proper Manim imports and syntax
-        3. Include clear mathematical explanations as text animations
-        4. Use appropriate colors, scaling, and positioning
-        5. Add smooth transitions and animations
-        6. Target duration: approximately {duration} seconds
-        7. Difficulty level: {difficulty}
-        8. Make the visualization engaging and educational
-        9. Include step-by-step explanations
-        10. Use proper mathematical notation with MathTex when needed
+        report_progress(progress_callback, "llm_request", 5, "🤖 Sending request to AI model...")
+        messages = self._build_messages(math_topic, difficulty, duration)
         
-        Return ONLY the Python code without any markdown formatting or explanations."""
+        try:
+            if stream:
+                code = self._stream_completion(messages, progress_callback)
+            else:
+                response = self.client.chat.completions.create(
+                    messages=messages,
+                    model=self.model,
+                    temperature=0.7,
+                    max_tokens=MAX_COMPLETION_TOKENS
+                )
+                
+                code = self._completion_text(response, progress_callback)
+            
+            if use_cache and code and self.validate_code(code)["valid"]:
+                self.code_cache.put(
+                    cache_key, code,
+                    topic=math_topic, difficulty=difficulty, duration=duration, model=self.model
+                )
+            
+            return code
+        
+        except GenerationAborted as e:
+            print(f"⛔ Aborted Manim code generation: {e}")
+            report_progress(progress_callback, "failed", 0, f"❌ Generated code rejected early: {e}")
+            return None
+        except Exception as e:
+            print(f"Error generating Manim code: {e}")
+            return None
+    
+    @staticmethod
+    def _completion_text(response, progress_callback=None):
+        """Return the text of a non-streamed completion and report its token count."""
+        tokens = response.usage.completion_tokens if getattr(response, "usage", None) else None
+        report_progress(
+            progress_callback, "llm_response", 25,
+            f"📝 Received {tokens} tokens from AI" if tokens else "📝 Received response from AI",
+            tokens=tokens
+        )
+        return response.choices[0].message.content.strip()
+    
+    def _build_messages(self, math_topic, difficulty, duration):
+        """Build the chat messages requesting a Manim scene for a topic."""
+        system_prompt = SYSTEM_PROMPT.format(duration=duration, difficulty=difficulty)
         
         user_prompt = f"""Create a Manim animation that explains and visualizes: {math_topic}
         
@@ -104,22 +581,63 @@ class MathVideoGenerator:
         - End with a summary or key takeaway
         - Be suitable for {difficulty} level students"""
         
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+    
+    def _stream_completion(self, messages, progress_callback=None):
+        """
+        Stream a completion, reporting latency metrics and validating the code block as soon as it closes.
+        
+        Args:
+            messages (list): Chat messages to send
+            progress_callback (callable): Optional receiver of progress events
+        
+        Returns:
+            str: The first complete code block, or the whole completion if it has no fences
+        
+        Raises:
+            GenerationAborted: If the closed code block has no Scene class or does not parse
+        """
+        monitor = CompletionStreamMonitor(self._check_streamed_code, progress_callback)
+        
+        response = self.client.chat.completions.create(
+            messages=messages,
+            model=self.model,
+            temperature=0.7,
+            max_tokens=MAX_COMPLETION_TOKENS,
+            stream=True
+        )
+        
         try:
-            response = self.client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                model=self.model,
-                temperature=0.7,
-                max_tokens=2000
-            )
-            
-            return response.choices[0].message.content.strip()
+            for chunk in response:
+                if chunk.choices and monitor.feed(chunk.choices[0].delta.content):
+                    break
+        finally:
+            response.close()
         
-        except Exception as e:
-            print(f"Error generating Manim code: {e}")
-            return None
+        if not monitor.closed:
+            self._check_streamed_code(self.clean_generated_code(monitor.text))
+        return monitor.finish()
+    
+    def _check_streamed_code(self, code):
+        """Reject a completed code block that cannot possibly render."""
+        validation = self.validate_code(code)
+        if not validation["valid"]:
+            raise GenerationAborted("; ".join(validation["errors"]))
+    
+    def validate_code(self, code):
+        """
+        Statically validate generated code before anything is rendered.
+        
+        Args:
+            code (str): Generated Manim code, with or without markdown fences
+        
+        Returns:
+            dict: valid, errors, warnings and scene_name (see code_validator.validate_scene_code)
+        """
+        return validate_scene_code(self.clean_generated_code(code), check_names=self.check_names)
     
     def clean_generated_code(self, code):
         """Clean and validate the generated Manim code."""
@@ -132,7 +650,8 @@ class MathVideoGenerator:
         
         return code
     
-    def create_video(self, math_topic, difficulty="intermediate", duration=30, quality="medium_quality"):
+    def create_video(self, math_topic, difficulty="intermediate", duration=30, quality="medium_quality", use_cache=True,
+                     progress_callback=None, preview=None, job_id=None):
         """
         Create a math visualization video for the given topic.
         
@@ -141,134 +660,602 @@ class MathVideoGenerator:
             difficulty (str): Difficulty level
             duration (int): Target duration in seconds
             quality (str): Video quality (low_quality, medium_quality, high_quality)
+            use_cache (bool): Reuse previously generated code and rendered videos
+            progress_callback (callable): Optional receiver of progress events. Each event is a dict
+                with "stage", "progress" (0-100) and "message"; stages are prompt_compacted, llm_request, llm_streaming,
+                llm_response, code_written, rendering, combining, repairing, preview_ready, completed
+                and failed.
+            preview (bool): Render and return a fast low-quality preview first, then render the
+                requested quality in the background; its "completed" event carries video_path and
+                preview_path (defaults to MVG_PREVIEW_RENDER, off unless enabled)
+            job_id (str): Name of the job directory under math_videos/jobs (random if omitted)
+        
+        Returns:
+            str: Path to the generated video file (the preview in preview mode)
+        """
+        preview = self.preview_by_default if preview is None else preview
+        
+        scene = self.prepare_scene(math_topic, difficulty, duration, use_cache, progress_callback, job_id)
+        if scene is None:
+            return None
+        
+        if not preview or quality == "low_quality":
+            return self.render_scene(scene, quality, use_cache, progress_callback)
+        
+        preview_path = self.render_preview(scene, use_cache, progress_callback)
+        if preview_path is None or not preview_path.endswith(".mp4"):
+            # No video could be rendered at all (e.g. FFmpeg missing), so a final render would fail too
+            if preview_path:
+                report_progress(progress_callback, "completed", 100, "⚠️ Preview could not be rendered",
+                                video_path=preview_path)
+            return preview_path
+        
+        self.render_final_in_background(scene, quality, use_cache, progress_callback, preview_path)
+        return preview_path
+    
+    def render_preview(self, scene, use_cache=True, progress_callback=None):
+        """
+        Render a fast 480p15 preview of a prepared scene.
+        
+        Events are tagged phase="preview", and the render's completion is reported as a
+        preview_ready event carrying preview_path instead of completed.
+        
+        Args:
+            scene (dict): Scene details returned by prepare_scene(); updated in place if its code is repaired
+            use_cache (bool): Reuse a previous render of byte-identical scene code
+            progress_callback (callable): Optional receiver of progress events
+        
+        Returns:
+            str: Path to the preview video, or None on failure
+        """
+        def forward(event):
+            if event["stage"] == "completed":
+                event = dict(event, stage="preview_ready", message="👀 Preview ready",
+                             preview_path=event.get("video_path"))
+            progress_callback(dict(event, phase="preview"))
+        
+        return self.render_scene(scene, "low_quality", use_cache, forward if progress_callback else None)
+    
+    def render_final_in_background(self, scene, quality, use_cache=True, progress_callback=None, preview_path=None):
+        """
+        Queue the final-quality render of a scene on the background render pool.
+        
+        Events are tagged phase="final" and carry preview_path; the completed event
+        carries the final video_path.
+        
+        Args:
+            scene (dict): Scene details, as rendered for the preview
+            quality (str): Final video quality
+            use_cache (bool): Reuse a previous render of byte-identical scene code
+            progress_callback (callable): Optional receiver of progress events
+            preview_path (str): Preview already shown to the user
+        
+        Returns:
+            concurrent.futures.Future: Resolves to the final video path (or None on failure)
+        """
+        def forward(event):
+            progress_callback(dict(event, phase="final", preview_path=preview_path))
+        
+        print(f"🎞️ Preview ready; rendering {quality} in the background")
+        return self._final_render_pool.submit(
+            self.render_scene, scene, quality, use_cache, forward if progress_callback else None
+        )
+    
+    def prepare_scene(self, math_topic, difficulty="intermediate", duration=30, use_cache=True, progress_callback=None,
+                      job_id=None):
+        """
+        Generate, clean and save the Manim scene for a topic (everything before rendering).
+        
+        Args:
+            math_topic (str): The mathematical concept to visualize
+            difficulty (str): Difficulty level
+            duration (int): Target duration in seconds
+            use_cache (bool): Reuse previously generated code for the same request
+            progress_callback (callable): Optional receiver of progress events
+            job_id (str): Name of the job directory under math_videos/jobs (random if omitted)
         
         Returns:
-            str: Path to the generated video file
+            dict: Scene details (topic, difficulty, duration, code, scene_file, scene_name,
+                output_name, media_dir, cache_key), or None on failure
         """
+        math_topic = self._compact_topic(math_topic, progress_callback)
         print(f"Generating Manim code for: {math_topic}")
         
         # Generate Manim code using AI
-        manim_code = self.generate_manim_code(math_topic, difficulty, duration)
+        manim_code = self.generate_manim_code(
+            math_topic, difficulty, duration, use_cache=use_cache, progress_callback=progress_callback
+        )
+        
+        cache_key = self.code_cache.key_for(math_topic, difficulty, duration, self.model, SYSTEM_PROMPT_VERSION)
+        scene = self._save_scene(math_topic, manim_code, progress_callback, cache_key if use_cache else None, job_id)
+        if scene:
+            scene.update(difficulty=difficulty, duration=duration)
+        return scene
+    
+    @staticmethod
+    def _compact_topic(math_topic, progress_callback=None):
+        """
+        Clean a topic and fit it into the prompt token budget (see prompt_builder.compact_prompt).
         
+        Whole-page PDF selections otherwise reach the model, the code cache key and the output
+        name verbatim.
+        
+        Returns:
+            str: The compacted topic
+        """
+        prompt = compact_prompt(math_topic)
+        if prompt["tokens_saved"]:
+            print(f"✂️ Compacted topic from {prompt['original_tokens']} to {prompt['tokens']} tokens "
+                  f"({prompt['tokenizer']})")
+            report_progress(
+                progress_callback, "prompt_compacted", 2,
+                f"✂️ Trimmed selection to {prompt['tokens']} tokens (saved {prompt['tokens_saved']})",
+                tokens=prompt["tokens"], original_tokens=prompt["original_tokens"],
+                tokens_saved=prompt["tokens_saved"], truncated=prompt["truncated"]
+            )
+        return prompt["text"]
+    
+    def _save_scene(self, math_topic, manim_code, progress_callback=None, cache_key=None, job_id=None):
+        """
+        Clean generated code and write it to the scene file for a topic.
+        
+        Args:
+            math_topic (str): The mathematical concept being visualized
+            manim_code (str): Generated Manim code (None if generation failed)
+            progress_callback (callable): Optional receiver of progress events
+            cache_key (str): Code cache entry to overwrite if the code is later repaired
+            job_id (str): Name of the job directory under math_videos/jobs (random if omitted)
+        
+        Returns:
+            dict: Scene details (topic, code, scene_file, scene_name, output_name, media_dir,
+                cache_key), or None on failure
+        """
         if not manim_code:
             print("Failed to generate Manim code")
+            report_progress(progress_callback, "failed", 0, "❌ Failed to generate Manim code")
             return None
         
         # Clean the generated code
         manim_code = self.clean_generated_code(manim_code)
         
-        # Create a temporary Python file with shortened name
-        safe_topic_name = re.sub(r'[^\w\s-]', '', math_topic).strip()
-        safe_topic_name = re.sub(r'[-\s]+', '_', safe_topic_name)
+        # Fail fast on code that cannot render instead of discovering it in a Manim subprocess
+        validation = self.validate_code(manim_code)
+        for warning in validation["warnings"]:
+            print(f"⚠️ {warning}")
+        if not validation["valid"]:
+            print("Generated code failed validation:")
+            for error in validation["errors"]:
+                print(f"   - {error}")
+            report_progress(progress_callback, "failed", 0,
+                            f"❌ Generated code failed validation: {'; '.join(validation['errors'])}",
+                            errors=validation["errors"], code=manim_code)
+            return None
         
-        # Limit the filename length to avoid Windows path limits
-        if len(safe_topic_name) > 50:
-            safe_topic_name = safe_topic_name[:50]
+        # Name the video after the topic, shortened to stay within Windows path limits
+        safe_topic_name = re.sub(r'[^\w\s-]', '', math_topic).strip()
+        safe_topic_name = re.sub(r'[-\s]+', '_', safe_topic_name)[:50] or "video"
         
-        temp_file = self.output_dir / f"{safe_topic_name}_scene.py"
+        # Each job gets its own directory, so similar topics and concurrent renders never collide
+        job_id = re.sub(r'[^\w-]', '', job_id or "") or uuid.uuid4().hex[:12]
+        work_dir = self.output_dir / "jobs" / job_id
+        temp_file = work_dir / SCENE_FILE_NAME
         
         try:
+            work_dir.mkdir(parents=True, exist_ok=True)
             # Write the generated code to file
             with open(temp_file, 'w', encoding='utf-8') as f:
                 f.write(manim_code)
-            
-            print(f"Manim code saved to: {temp_file}")
-            print("Generated code preview:")
-            print("-" * 50)
-            print(manim_code[:500] + "..." if len(manim_code) > 500 else manim_code)
-            print("-" * 50)
-            
-            # Extract scene class name from the code
-            scene_match = re.search(r'class\s+(\w+)\s*\(Scene\)', manim_code)
-            if not scene_match:
-                print("No Scene class found in generated code")
-                return None
-            
-            scene_name = scene_match.group(1)
-            
-            # Run Manim to generate the video
-            print(f"Rendering video with Manim...")
-            
-            # Map quality settings to Manim quality flags
-            quality_map = {
-                "low_quality": "l",
-                "medium_quality": "m", 
-                "high_quality": "h"
-            }
-            
-            cmd = [
-                ".venv/Scripts/python.exe", "-m", "manim", "render",
-                str(temp_file), scene_name,
-                "--quality", quality_map.get(quality, "m"),
-                "--output_file", f"{safe_topic_name}_video"
-            ]
-            
-            # Run from the project root directory, not the output directory
-            result = subprocess.run(cmd, capture_output=True, text=True, cwd=str(Path.cwd()))
-            
-            if result.returncode == 0:
-                print("Video generated successfully!")
-                
-                # Find the generated video file
-                # Manim creates videos in media/videos/[scene_file_name]/[quality]/
-                scene_file_stem = temp_file.stem
-                quality_folder = {"l": "480p15", "m": "720p30", "h": "1080p60"}[quality_map.get(quality, "m")]
-                media_dir = Path("media") / "videos" / scene_file_stem / quality_folder
+        except OSError as e:
+            print(f"❌ Could not save scene file: {e}")
+            report_progress(progress_callback, "failed", 0, f"❌ Could not save scene file: {e}")
+            return None
+        
+        print(f"Manim code saved to: {temp_file}")
+        print("Generated code preview:")
+        print("-" * 50)
+        print(manim_code[:500] + "..." if len(manim_code) > 500 else manim_code)
+        print("-" * 50)
+        report_progress(
+            progress_callback, "code_written", 30, "💾 Manim code saved",
+            scene_file=str(temp_file), code=manim_code
+        )
+        
+        return {
+            "topic": math_topic,
+            "code": manim_code,
+            "scene_file": temp_file,
+            "scene_name": validation["scene_name"],
+            "output_name": safe_topic_name,
+            "media_dir": work_dir / "media",
+            "cache_key": cache_key,
+        }
+    
+    def render_scene(self, scene, quality="medium_quality", use_cache=True, progress_callback=None,
+                     max_repairs=None):
+        """
+        Render a prepared scene with Manim, asking the AI to repair code that fails to render.
+        
+        Args:
+            scene (dict): Scene details returned by prepare_scene(); updated in place if its code is repaired
+            quality (str): Video quality (low_quality, medium_quality, high_quality)
+            use_cache (bool): Reuse a previous render of byte-identical scene code
+            progress_callback (callable): Optional receiver of progress events
+            max_repairs (int): Repair attempts after a fixable failure (defaults to MVG_MAX_REPAIR_ATTEMPTS)
+        
+        Returns:
+            str: Path to the generated video file (or the scene file if FFmpeg is missing)
+        """
+        max_repairs = self.max_repair_attempts if max_repairs is None else max_repairs
+        attempts = []
+        
+        try:
+            while True:
+                plan = self._plan_render(scene, quality, use_cache, progress_callback)
+                if plan["cached_video"]:
+                    return plan["cached_video"]
                 
-                if media_dir.exists():
-                    video_files = list(media_dir.glob("*.mp4"))
-                    if video_files:
-                        video_path = video_files[0]
-                        print(f"Video saved to: {video_path}")
-                        return str(video_path)
+                # Run from the project root directory, not the output directory
+                render_started = time.time()
+                returncode, output = self._run_manim(plan["cmd"], self._count_animations(scene["code"]), progress_callback)
+                attempt = self._record_attempt(attempts, returncode, output, time.time() - render_started)
                 
-                # Alternative: look in the main output directory
-                video_files = list(self.output_dir.glob("*.mp4"))
-                if video_files:
-                    video_path = video_files[-1]  # Get the most recent
-                    print(f"Video saved to: {video_path}")
-                    return str(video_path)
+                if returncode == 0 or not attempt["fixable"] or len(attempts) > max_repairs:
+                    break
                 
-                print("Video file not found in expected location")
-                return None
-            else:
-                print(f"Manim rendering failed:")
-                print(f"STDOUT: {result.stdout}")
-                print(f"STDERR: {result.stderr}")
-                return None
+                repaired = self._repair_scene(scene, attempt["error"], len(attempts), max_repairs, progress_callback)
+                attempt["repair_seconds"] = time.time() - render_started - attempt["render_seconds"]
+                if repaired is None:
+                    break
+                # Update in place so later renders of this scene (e.g. the final quality) reuse the fix
+                scene.update(repaired)
+            
+            return self._collect_render(scene, plan, returncode, output, progress_callback, attempts)
+        
+        except Exception as e:
+            return self._render_error(scene, e, progress_callback)
+    
+    @staticmethod
+    def _record_attempt(attempts, returncode, output, render_seconds):
+        """Append the metrics of one render attempt and return them."""
+        failed = returncode != 0
+        attempt = {
+            "attempt": len(attempts) + 1,
+            "success": not failed,
+            "render_seconds": render_seconds,
+            "repair_seconds": 0.0,
+            "error": extract_render_error(output) if failed else None,
+            "fixable": failed and is_fixable_render_failure(output),
+        }
+        attempts.append(attempt)
+        return attempt
+    
+    @staticmethod
+    def _announce_repair(error, attempt, max_repairs, progress_callback=None):
+        """Log and report the start of a repair attempt."""
+        summary = error.strip().splitlines()[-1] if error.strip() else "unknown error"
+        print(f"🔧 Render failed ({summary}); repair attempt {attempt} of {max_repairs}")
+        report_progress(progress_callback, "repairing", 30,
+                        f"🔧 Render failed ({summary[:120]}), asking AI for a fix (attempt {attempt} of {max_repairs})",
+                        attempt=attempt, max_attempts=max_repairs, error=error)
+    
+    def _repair_messages(self, scene, error):
+        """Build the chat messages asking the AI to fix a scene that failed to render."""
+        return [
+            {"role": "system", "content": REPAIR_SYSTEM_PROMPT},
+            {"role": "user", "content": REPAIR_PROMPT.format(error=error, code=scene["code"])}
+        ]
+    
+    def _repair_scene(self, scene, error, attempt, max_repairs, progress_callback=None):
+        """
+        Send a failed scene and its traceback to the AI and save the validated fix.
+        
+        Returns:
+            dict: The repaired scene, or None if no usable fix came back
+        """
+        self._announce_repair(error, attempt, max_repairs, progress_callback)
         
-        except FileNotFoundError as e:
-            if "ffmpeg" in str(e).lower() or "WinError 2" in str(e):
+        try:
+            response = self.client.chat.completions.create(
+                messages=self._repair_messages(scene, error),
+                model=self.model,
+                temperature=0.2,
+                max_tokens=MAX_COMPLETION_TOKENS
+            )
+            code = response.choices[0].message.content.strip()
+        except Exception as e:
+            print(f"Error requesting a repair: {e}")
+            return None
+        
+        return self._apply_repair(scene, code, progress_callback)
+    
+    def _apply_repair(self, scene, code, progress_callback=None):
+        """Validate repaired code and write it over the scene file; returns the new scene or None."""
+        code = self.clean_generated_code(code)
+        validation = self.validate_code(code)
+        if not validation["valid"]:
+            print(f"Repaired code failed validation: {'; '.join(validation['errors'])}")
+            return None
+        
+        try:
+            with open(scene["scene_file"], 'w', encoding='utf-8') as f:
+                f.write(code)
+        except OSError as e:
+            print(f"❌ Could not save repaired scene file: {e}")
+            return None
+        
+        report_progress(progress_callback, "code_written", 30, "💾 Repaired Manim code saved",
+                        scene_file=str(scene["scene_file"]), code=code, repaired=True)
+        return dict(scene, code=code, scene_name=validation["scene_name"], repaired=True)
+    
+    def _plan_render(self, scene, quality, use_cache=True, progress_callback=None):
+        """
+        Work out how to render a scene, reusing a cached render when one exists.
+        
+        Returns:
+            dict: quality_flag, render_key, cached_video (path or None), the Manim cmd and
+                the video_path it will write
+        """
+        quality_flag = QUALITY_FLAGS.get(quality, "m")
+        quality = quality if quality in QUALITY_FLAGS else "medium_quality"
+        
+        # Manim writes to <media_dir>/videos/<scene file stem>/<quality folder>/<output_file>.mp4
+        scene_file = Path(scene["scene_file"])
+        media_dir = Path(scene["media_dir"])
+        video_path = media_dir / "videos" / scene_file.stem / QUALITY_FOLDERS[quality_flag] / f"{scene['output_name']}.mp4"
+        
+        # Skip Manim entirely if this exact scene was already rendered at this quality
+        render_key = self.render_cache.key_for(scene["code"], scene["scene_name"], quality_flag)
+        cached_video = self.render_cache.get(render_key) if use_cache else None
+        if cached_video:
+            print(f"⚡ Using cached render: {cached_video}")
+            # Link into the job directory so the video outlives cache eviction and gets a catalog ID
+            try:
+                video_path.parent.mkdir(parents=True, exist_ok=True)
+                link_or_copy(cached_video, video_path)
+                cached_video = str(video_path)
+                self._catalog_video(scene, quality, video_path)
+            except OSError as e:
+                print(f"⚠️ Could not copy cached render into the job directory: {e}")
+            report_progress(progress_callback, "completed", 100, "⚡ Reusing previously rendered video",
+                            video_path=cached_video, cached=True)
+        else:
+            print(f"Rendering video with Manim...")
+            # The previous output may be hard-linked into the render cache; unlink it so Manim
+            # writes a new file instead of truncating the cached one
+            try:
+                video_path.unlink()
+            except OSError:
+                pass
+        
+        cmd = [
+            ".venv/Scripts/python.exe", "-m", "manim", "render",
+            str(scene_file), scene["scene_name"],
+            "--quality", quality_flag,
+            "--media_dir", str(media_dir),
+            "--config_file", str(self.manim_config),
+            "--output_file", scene["output_name"]
+        ]
+        
+        return {
+            "quality": quality,
+            "quality_flag": quality_flag,
+            "render_key": render_key,
+            "cached_video": cached_video,
+            "cmd": cmd,
+            "video_path": video_path
+        }
+    
+    def _collect_render(self, scene, plan, returncode, output, progress_callback=None, attempts=None):
+        """
+        Check the video a finished Manim run produced and add it to the render cache.
+        
+        Args:
+            attempts (list): Per-attempt metrics from the repair loop, reported with the result
+        
+        Returns:
+            str: Path to the generated video file, or None if rendering failed
+        """
+        attempts = attempts or []
+        if len(attempts) > 1:
+            print("🔧 Render attempts: " + ", ".join(
+                f"#{a['attempt']} {'ok' if a['success'] else 'failed'} "
+                f"({a['render_seconds']:.1f}s render, {a['repair_seconds']:.1f}s repair)" for a in attempts
+            ))
+        
+        if returncode != 0:
+            print(f"Manim rendering failed:")
+            print(f"OUTPUT: {output}")
+            report_progress(progress_callback, "failed", 0, f"❌ Manim rendering failed: {extract_render_error(output)[-500:]}",
+                            attempts=attempts)
+            return None
+        
+        print("Video generated successfully!")
+        
+        # A repaired scene replaces the broken code so the next request for this topic renders first time
+        if scene.get("repaired") and scene.get("cache_key"):
+            self.code_cache.put(scene["cache_key"], scene["code"], repaired=True)
+        
+        video_path = plan["video_path"]
+        if not video_path.is_file():
+            print(f"Video file not found at {video_path}")
+            report_progress(progress_callback, "failed", 0, "❌ Video file not found after rendering")
+            return None
+        
+        # Only the combined movie is kept; the per-animation pieces can be large
+        shutil.rmtree(video_path.parent / "partial_movie_files", ignore_errors=True)
+        
+        print(f"Video saved to: {video_path}")
+        self.render_cache.put(plan["render_key"], video_path)
+        self._catalog_video(scene, plan["quality"], video_path, attempts)
+        report_progress(progress_callback, "completed", 100, "✅ Video generation complete!",
+                        video_path=str(video_path), attempts=attempts)
+        return str(video_path)
+    
+    def _catalog_video(self, scene, quality, video_path, attempts=()):
+        """Record a finished render in the video catalog."""
+        try:
+            self.catalog.add(
+                video_path,
+                topic=scene.get("topic"),
+                difficulty=scene.get("difficulty"),
+                quality=quality,
+                duration=scene.get("duration"),
+                code_hash=hashlib.sha256(scene["code"].encode("utf-8")).hexdigest(),
+                scene_name=scene["scene_name"],
+                job_id=Path(scene["scene_file"]).parent.name,
+                render_seconds=sum(attempt["render_seconds"] for attempt in attempts) or None
+            )
+        except (OSError, sqlite3.Error) as e:
+            print(f"⚠️ Could not add video to the catalog: {e}")
+    
+    def _render_error(self, scene, error, progress_callback=None):
+        """
+        Handle an exception raised while rendering a scene.
+        
+        Returns:
+            str: The scene file path when the code itself is usable, otherwise None
+        """
+        temp_file = Path(scene["scene_file"])
+        
+        if isinstance(error, FileNotFoundError):
+            if "ffmpeg" in str(error).lower() or "WinError 2" in str(error):
                 print("❌ FFmpeg not found error!")
                 print("🎬 The Manim code was generated successfully, but video rendering failed.")
                 print(f"📁 Scene file saved to: {temp_file}")
                 print("\n💡 To render the video manually:")
                 print(f"   1. Install FFmpeg: winget install Gyan.FFmpeg")
-                print(f"   2. Run: manim render {temp_file.name} {scene_name} --quality m")
+                print(f"   2. Run: manim render {temp_file.name} {scene['scene_name']} --quality m")
+                report_progress(progress_callback, "completed", 100,
+                                "⚠️ Video rendering failed (FFmpeg not found), but scene code was generated!",
+                                video_path=str(temp_file))
                 return str(temp_file)  # Return the scene file path instead
             else:
-                print(f"❌ File not found error: {e}")
+                print(f"❌ File not found error: {error}")
+                report_progress(progress_callback, "failed", 0, f"❌ File not found error: {error}")
                 return None
-        except Exception as e:
-            print(f"❌ Error creating video: {e}")
-            print(f"📁 Scene file saved to: {temp_file}")
-            return str(temp_file)  # Return the scene file path instead
+        
+        print(f"❌ Error creating video: {error}")
+        print(f"📁 Scene file saved to: {temp_file}")
+        report_progress(progress_callback, "completed", 100, f"⚠️ Error creating video: {error}",
+                        video_path=str(temp_file))
+        return str(temp_file)  # Return the scene file path instead
+    
+    @staticmethod
+    def _count_animations(code):
+        """Estimate how many animations a scene renders (each play/wait call is one)."""
+        return max(1, len(re.findall(r'self\.(?:play|wait)\s*\(', code)))
     
-    def create_multiple_videos(self, topics_list, difficulty="intermediate"):
-        """Create multiple videos from a list of topics."""
-        results = []
+    def _run_manim(self, cmd, total_animations, progress_callback=None):
+        """
+        Run a Manim render, turning its log output into progress events.
+        
+        Args:
+            cmd (list): Command line to execute
+            total_animations (int): Expected number of animations, used to scale progress
+            progress_callback (callable): Optional receiver of progress events
+        
+        Returns:
+            tuple: (return code, combined stdout/stderr output)
+        """
+        parser = ManimProgressParser(total_animations, progress_callback)
+        
+        process = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            text=True, encoding="utf-8", errors="replace", cwd=str(Path.cwd())
+        )
+        
+        # Universal newlines split Manim's carriage-return progress bars into separate lines
+        for line in process.stdout:
+            parser.feed(line)
+        
+        process.wait()
+        return process.returncode, parser.output
+    
+    def create_multiple_videos(self, topics_list, difficulty="intermediate", duration=30, quality="medium_quality",
+                               llm_concurrency=None, render_concurrency=None):
+        """
+        Create multiple videos from a list of topics.
         
-        for topic in topics_list:
+        Code generation and rendering run as a pipeline: while one topic renders, code for
+        the following topics is already being generated. Each stage has its own
+        concurrency limit (MVG_BATCH_LLM_CONCURRENCY / MVG_BATCH_RENDER_CONCURRENCY).
+        
+        Args:
+            topics_list (list): Topics to visualize
+            difficulty (str): Difficulty level for every video
+            duration (int): Target duration in seconds
+            quality (str): Video quality for every video
+            llm_concurrency (int): Maximum simultaneous LLM requests
+            render_concurrency (int): Maximum simultaneous Manim renders
+        
+        Returns:
+            list: One result per topic, in input order, with topic, video_path, success,
+                error and timings (llm_seconds, render_wait_seconds, render_seconds, total_seconds)
+        """
+        llm_concurrency = llm_concurrency or int(os.environ.get("MVG_BATCH_LLM_CONCURRENCY", "4"))
+        render_concurrency = render_concurrency or int(os.environ.get("MVG_BATCH_RENDER_CONCURRENCY", "2"))
+        
+        batch_started = time.time()
+        results = [None] * len(topics_list)
+        
+        def record(index, video_path=None, error=None, **timings):
+            timings["total_seconds"] = time.time() - batch_started
+            results[index] = {
+                'topic': topics_list[index],
+                'video_path': video_path,
+                'success': video_path is not None,
+                'error': error,
+                'timings': timings
+            }
+        
+        def render(index, scene, llm_seconds, ready_at):
+            render_started = time.time()
+            try:
+                video_path = self.render_scene(scene, quality)
+                error = None if video_path else "Rendering failed"
+            except Exception as e:
+                video_path, error = None, str(e)
+            record(index, video_path, error,
+                   llm_seconds=llm_seconds,
+                   render_wait_seconds=render_started - ready_at,
+                   render_seconds=time.time() - render_started)
+        
+        def generate(index, topic, render_pool):
             print(f"\n{'='*60}")
             print(f"Processing: {topic}")
             print(f"{'='*60}")
             
-            video_path = self.create_video(topic, difficulty)
-            results.append({
-                'topic': topic,
-                'video_path': video_path,
-                'success': video_path is not None
-            })
+            llm_started = time.time()
+            try:
+                scene = self.prepare_scene(topic, difficulty, duration)
+            except Exception as e:
+                scene, error = None, str(e)
+            else:
+                error = None if scene else "Code generation failed"
+            llm_seconds = time.time() - llm_started
+            
+            if scene is None:
+                record(index, None, error, llm_seconds=llm_seconds)
+                return None
+            
+            # Hand off to the render stage; this LLM slot is free for the next topic immediately
+            return render_pool.submit(render, index, scene, llm_seconds, time.time())
+        
+        with ThreadPoolExecutor(max_workers=render_concurrency, thread_name_prefix="batch-render") as render_pool, \
+                ThreadPoolExecutor(max_workers=llm_concurrency, thread_name_prefix="batch-llm") as llm_pool:
+            llm_futures = [llm_pool.submit(generate, i, topic, render_pool) for i, topic in enumerate(topics_list)]
+            for llm_future in llm_futures:
+                render_future = llm_future.result()
+                if render_future is not None:
+                    render_future.result()
+        
+        wall_seconds = time.time() - batch_started
+        stage_seconds = sum(
+            result['timings'].get('llm_seconds', 0) + result['timings'].get('render_seconds', 0)
+            for result in results
+        )
+        print(f"\n⏱️ Batch of {len(results)} finished in {wall_seconds:.1f}s "
+              f"(sequential stages would take {stage_seconds:.1f}s)")
         
         return results
 
@@ -302,7 +1289,7 @@ def main():
                 topic = input("Enter math topic to visualize: ").strip()
                 if topic:
                     difficulty = input("Enter difficulty (beginner/intermediate/advanced) [intermediate]: ").strip() or "intermediate"
-                    video_path = generator.create_video(topic, difficulty)
+                    video_path = generator.create_video(topic, difficulty, preview=False)
                     if video_path:
                         print(f"\n✅ Video created successfully: {video_path}")
                     else:
@@ -321,6 +1308,9 @@ def main():
                     print(f"{status}: {result['topic']}")
                     if result['video_path']:
                         print(f"   Path: {result['video_path']}")
+                    timings = result['timings']
+                    print(f"   Timings: LLM {timings.get('llm_seconds', 0):.1f}s, "
+                          f"render {timings.get('render_seconds', 0):.1f}s")
             
             elif choice == "3":
                 print("Goodbye!")
@@ -68,7 +68,8 @@ def main():
             math_topic=topic,
             difficulty=difficulty,
             duration=duration,
-            quality=quality
+            quality=quality,
+            preview=False
         )
         
         if video_path:
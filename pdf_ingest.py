@@ -0,0 +1,617 @@
+"""
+PDF Ingestion for the Math Video Generator Apps
+Opens uploaded PDFs and caches rasterized pages and extracted text on disk by content hash,
+so re-uploading or re-processing a document skips PyMuPDF entirely.
+"""
+
+import io
+import os
+import math
+import json
+import shutil
+import weakref
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+from text_index import PageTextIndex
+from math_text import MATH_TEXT_VERSION, extract_math_text
+
+# Zoom the apps rasterize pages at unless they ask for another
+DEFAULT_ZOOM = 1.5
+
+# Decoded pages kept in memory across all open documents, and neighbours rendered ahead of the reader
+PAGE_MEMORY_BYTES = int(os.environ.get("MVG_PDF_PAGE_MEMORY_MB", "256")) * 1024 * 1024
+PREFETCH_PAGES = int(os.environ.get("MVG_PDF_PREFETCH_PAGES", "2"))
+
+# Uploads larger than this are spooled to disk once and opened from the file instead of memory
+SPOOL_THRESHOLD_BYTES = int(os.environ.get("MVG_PDF_SPOOL_MB", "32")) * 1024 * 1024
+
+# A single thread: PyMuPDF documents are not thread-safe, so page work is serialized anyway
+_prefetch_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-prefetch")
+
+# Bulk rendering runs in worker processes, each with its own copy of the document
+RENDER_WORKERS = int(os.environ.get("MVG_PDF_WORKERS", "0")) or os.cpu_count() or 1
+# Below this many uncached pages, starting processes costs more than it saves
+PARALLEL_MIN_PAGES = 8
+
+
+def pdf_digest(data):
+    """Return the SHA-256 content hash identifying a PDF."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _remove_file(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+class PageCache:
+    """On-disk cache of page images and text, one directory per PDF, evicted LRU by total size."""
+
+    def __init__(self, cache_dir, max_bytes=1024 ** 3):
+        """
+        Initialize the page cache.
+
+        Args:
+            cache_dir (str | Path): Directory holding one subdirectory per PDF content hash
+            max_bytes (int): Upper bound on the total size of cached pages
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Documents open in this process; their directories (and spooled source.pdf) are never evicted
+        self._live = weakref.WeakSet()
+
+    def document_dir(self, digest):
+        return self.cache_dir / digest
+
+    def image_path(self, digest, page_index, zoom):
+        return self.document_dir(digest) / f"page-{page_index + 1:05d}@{round(zoom * 100)}.png"
+
+    def text_path(self, digest, page_index):
+        return self.document_dir(digest) / f"text-{page_index + 1:05d}.json"
+
+    def index_path(self, digest, page_index):
+        return self.document_dir(digest) / f"index-{page_index + 1:05d}.npz"
+
+    def math_path(self, digest, page_index):
+        return self.document_dir(digest) / f"math-{page_index + 1:05d}.json"
+
+    def source_path(self, digest):
+        return self.document_dir(digest) / "source.pdf"
+
+    def metadata_path(self, digest):
+        return self.document_dir(digest) / "metadata.json"
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def read_bytes(self, path):
+        """Return the cached bytes at path, or None on a miss."""
+        try:
+            data = Path(path).read_bytes()
+        except OSError:
+            data = None
+        self._count(data is not None)
+        return data
+
+    def read_json(self, path):
+        """Return the cached JSON value at path, or None on a miss."""
+        data = self.read_bytes(path)
+        try:
+            return json.loads(data) if data is not None else None
+        except ValueError:
+            return None
+
+    def write_bytes(self, path, data):
+        """Atomically store bytes at path; failures only cost a later cache miss."""
+        path = Path(path)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Could not write PDF page cache entry: {e}")
+            _remove_file(tmp_path)
+
+    def write_json(self, path, value):
+        self.write_bytes(path, json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+    def touch(self, digest):
+        """Mark a document as recently used; the directory mtime is the LRU timestamp."""
+        try:
+            os.utime(self.document_dir(digest), None)
+        except OSError:
+            pass
+
+    def register(self, document):
+        """Protect an open document's directory from eviction for as long as the document exists."""
+        with self._lock:
+            self._live.add(document)
+
+    def evict(self):
+        """Remove least recently used documents until the cache fits in max_bytes, sparing open ones."""
+        with self._lock:
+            live = {document.digest for document in self._live}
+        entries = []
+        total = 0
+
+        for path in self.cache_dir.iterdir():
+            if not path.is_dir():
+                continue
+            try:
+                size = sum(f.stat().st_size for f in path.iterdir())
+                entries.append((path.stat().st_mtime, size, path))
+            except OSError:
+                continue
+            total += size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path.name in live:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def stats(self):
+        """Return hit/miss counters, cached document count and total cached bytes."""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        documents = [path for path in self.cache_dir.iterdir() if path.is_dir()]
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+            "documents": len(documents),
+            "bytes": sum(f.stat().st_size for path in documents for f in path.iterdir()),
+        }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_page_cache():
+    """
+    Return the process-wide page cache.
+
+    Configured by MVG_PDF_CACHE_DIR (default math_videos/.cache/pdf) and
+    MVG_PDF_CACHE_MAX_MB (default 1024).
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = PageCache(
+                os.environ.get("MVG_PDF_CACHE_DIR", os.path.join("math_videos", ".cache", "pdf")),
+                max_bytes=int(os.environ.get("MVG_PDF_CACHE_MAX_MB", "1024")) * 1024 * 1024
+            )
+        return _default_cache
+
+
+def extract_page_text(page):
+    """
+    Extract everything the apps need from one page's text layer.
+
+    Returns:
+        dict: text, blocks (PyMuPDF "blocks" tuples as lists), spans (non-blank spans with
+            text, bbox, font, size, flags and the index of their line), width and height
+    """
+    text = page.get_text()
+    spans = []
+    line_index = 0
+    for block in page.get_text("dict")["blocks"]:
+        for line in block.get("lines", ()):
+            for span in line["spans"]:
+                if span["text"].strip():
+                    spans.append({
+                        "text": span["text"],
+                        "bbox": list(span["bbox"]),
+                        "font": span.get("font", "Arial"),
+                        "size": span.get("size", 12),
+                        "flags": span.get("flags", 0),
+                        "line": line_index
+                    })
+            line_index += 1
+
+    return {
+        "text": text,
+        "blocks": [list(block) for block in page.get_text("blocks")],
+        "spans": spans,
+        "width": page.rect.width,
+        "height": page.rect.height
+    }
+
+
+# Per-process state of bulk-render workers
+_worker_doc = None
+_worker_cache = None
+
+
+def _open_source(source):
+    """Open a PDF from a file path or from in-memory bytes."""
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def _init_render_worker(source, cache_dir):
+    """Open the document once per worker process."""
+    global _worker_doc, _worker_cache
+    _worker_doc = _open_source(source)
+    _worker_cache = PageCache(cache_dir)
+
+
+def _render_in_worker(digest, page_index, zoom, with_text):
+    """Render one page into the shared on-disk cache and return its index."""
+    page = _worker_doc[page_index]
+    if zoom:
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+        _worker_cache.write_bytes(_worker_cache.image_path(digest, page_index, zoom), pix.tobytes("png"))
+    if with_text:
+        page_text = extract_page_text(page)
+        _worker_cache.write_json(_worker_cache.text_path(digest, page_index), page_text)
+        _worker_cache.write_json(_worker_cache.math_path(digest, page_index), extract_math_text(page_text["spans"]))
+    return page_index
+
+
+class PageMemory:
+    """Process-wide LRU of decoded pages, text and indexes, bounded by their approximate size in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key):
+        """Return the value for key, marking it recently used, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, size):
+        """Keep a value, dropping the least recently used entries beyond the budget."""
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, dropped) = self._entries.popitem(last=False)
+                self._bytes -= dropped
+
+
+# Shared by every PdfDocument, keyed by (digest, kind, page[, zoom]), so the bound holds
+# however many sessions keep documents open
+_page_memory = PageMemory(PAGE_MEMORY_BYTES)
+
+
+class PageSequence:
+    """Read-only sequence of per-page values, each produced on first access."""
+
+    def __init__(self, length, load, on_access=None):
+        self._length = length
+        self._load = load
+        self._on_access = on_access
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, page_index):
+        if page_index < 0:
+            page_index += self._length
+        if not 0 <= page_index < self._length:
+            raise IndexError("page index out of range")
+        value = self._load(page_index)
+        if self._on_access:
+            self._on_access(page_index)
+        return value
+
+
+class PdfDocument:
+    """An uploaded PDF whose pages are rasterized and text-extracted on demand, through the page cache."""
+
+    def __init__(self, data=None, name=None, cache=None, path=None, digest=None):
+        """
+        Initialize the document.
+
+        Args:
+            data (bytes): PDF file contents, for documents held in memory
+            name (str): Original file name, for display
+            cache (PageCache): Page cache, defaults to get_page_cache()
+            path (str | Path): PDF file to open instead of data, for spooled uploads
+            digest (str): Content hash, when the caller has already computed it
+        """
+        self.data = data
+        self.path = str(path) if path else None
+        self.name = name
+        self.digest = digest or pdf_digest(data if data is not None else Path(path).read_bytes())
+        self.cache = cache or get_page_cache()
+        self._doc = None
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self.cache.register(self)
+
+        if self.path:
+            # Hold the spooled file open from the start, so no later cache cleanup can pull it away
+            with self._lock:
+                self._open()
+
+        metadata_path = self.cache.metadata_path(self.digest)
+        self.metadata = self.cache.read_json(metadata_path)
+        if self.metadata is None:
+            with self._lock:
+                info = self._open().metadata or {}
+                self.metadata = {
+                    'title': info.get('title') or 'Unknown',
+                    'author': info.get('author') or 'Unknown',
+                    'subject': info.get('subject') or 'Unknown',
+                    'page_count': self._open().page_count,
+                    'file_size': len(data) if data is not None else os.path.getsize(self.path)
+                }
+            self.cache.write_json(metadata_path, self.metadata)
+            self.cache.evict()
+        self.cache.touch(self.digest)
+
+    @property
+    def page_count(self):
+        return self.metadata['page_count']
+
+    def _open(self):
+        # Opened only on a cache miss; callers hold self._lock since fitz documents are not thread-safe
+        if self._doc is None:
+            self._doc = _open_source(self.path or self.data)
+        return self._doc
+
+    def _remember(self, key, value, size):
+        """Keep a decoded page in the process-wide in-memory LRU."""
+        _page_memory.put((self.digest,) + key, value, size)
+
+    def _recall(self, key):
+        return _page_memory.get((self.digest,) + key)
+
+    def page_png(self, page_index, zoom=DEFAULT_ZOOM):
+        """Return the page rasterized at the given zoom as PNG bytes."""
+        path = self.cache.image_path(self.digest, page_index, zoom)
+        png = self.cache.read_bytes(path)
+        if png is None:
+            with self._lock:
+                pix = self._open()[page_index].get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+                png = pix.tobytes("png")
+            self.cache.write_bytes(path, png)
+        return png
+
+    def page_image(self, page_index, zoom=DEFAULT_ZOOM):
+        """Return the page rasterized at the given zoom as a decoded PIL image."""
+        key = ("image", page_index, zoom)
+        image = self._recall(key)
+        if image is None:
+            image = Image.open(io.BytesIO(self.page_png(page_index, zoom)))
+            image.load()
+            self._remember(key, image, image.size[0] * image.size[1] * len(image.getbands()))
+        return image
+
+    def image_size(self, page_index, zoom=DEFAULT_ZOOM):
+        """Return the (width, height) page_image() will have, without rasterizing the page."""
+        page = self.page_text(page_index)
+        return math.ceil(page["width"] * zoom), math.ceil(page["height"] * zoom)
+
+    def page_text(self, page_index):
+        """
+        Return the text layer of a page.
+
+        Returns:
+            dict: page_num, text, blocks, spans, width, height, word_count and char_count
+        """
+        key = ("text", page_index)
+        page = self._recall(key)
+        if page is None:
+            path = self.cache.text_path(self.digest, page_index)
+            page = self.cache.read_json(path)
+            if page is None:
+                with self._lock:
+                    page = extract_page_text(self._open()[page_index])
+                self.cache.write_json(path, page)
+
+            text = page["text"]
+            page.update(
+                page_num=page_index + 1,
+                word_count=len(text.split()) if text else 0,
+                char_count=len(text) if text else 0
+            )
+            self._remember(key, page, len(text) * 2 + len(page["spans"]) * 200)
+        return page
+
+    def text_index(self, page_index):
+        """Return the spatial text index of a page, built once and cached next to its text."""
+        key = ("index", page_index)
+        index = self._recall(key)
+        if index is None:
+            path = self.cache.index_path(self.digest, page_index)
+            data = self.cache.read_bytes(path)
+            if data is not None:
+                index = PageTextIndex.from_bytes(data)
+            else:
+                index = PageTextIndex.from_spans(self.page_text(page_index)["spans"])
+                self.cache.write_bytes(path, index.to_bytes())
+            self._remember(key, index, index.boxes.nbytes * 2 + len(index.text) * 4)
+        return index
+
+    def math_text(self, page_index):
+        """
+        Return the page text with its formulas rewritten as approximate LaTeX.
+
+        Returns:
+            dict: text (math in $...$ and $$...$$) and regions (latex, bbox, display, line)
+        """
+        key = ("math", page_index)
+        page = self._recall(key)
+        if page is None:
+            path = self.cache.math_path(self.digest, page_index)
+            page = self.cache.read_json(path)
+            if page is None or page.get("version") != MATH_TEXT_VERSION:
+                page = extract_math_text(self.page_text(page_index)["spans"])
+                self.cache.write_json(path, page)
+            self._remember(key, page, len(page["text"]) * 2 + len(page["regions"]) * 200)
+        return page
+
+    def prefetch(self, page_index, zoom=DEFAULT_ZOOM, warm=None):
+        """
+        Prepare the pages around page_index in the background so paging through stays instant.
+
+        Args:
+            page_index (int): Page being viewed
+            zoom (float): Zoom the neighbours are rendered at
+            warm (callable): Work to do per neighbouring page index, defaults to decoding
+                its text and image into memory
+        """
+        neighbours = [page_index + offset for offset in range(1, PREFETCH_PAGES + 1)] + [page_index - 1]
+        for neighbour in neighbours:
+            key = ("image", neighbour, zoom)
+            if not 0 <= neighbour < self.page_count:
+                continue
+            with self._pending_lock:
+                if (self.digest,) + key in _page_memory or key in self._pending:
+                    continue
+                self._pending.add(key)
+            _prefetch_pool.submit(self._prefetch_page, neighbour, zoom, key, warm)
+
+    def _prefetch_page(self, page_index, zoom, key, warm=None):
+        try:
+            if warm:
+                warm(page_index)
+            else:
+                self.page_text(page_index)
+                self.page_image(page_index, zoom)
+        except Exception as e:
+            print(f"⚠️ Could not prefetch page {page_index + 1}: {e}")
+        finally:
+            with self._pending_lock:
+                self._pending.discard(key)
+
+    def render_pages(self, zoom=DEFAULT_ZOOM, with_text=True, workers=None):
+        """
+        Render every page into the cache, across worker processes for large documents.
+
+        Each worker opens the document itself and renders pages independently, so pages
+        stream back as they finish instead of after the whole document.
+
+        Args:
+            zoom (float): Zoom to rasterize at, or None to extract text only
+            with_text (bool): Also extract each page's text layer and its math
+            workers (int): Worker processes, defaults to MVG_PDF_WORKERS or the CPU count
+
+        Yields:
+            int: Index of each page once it is cached, cached pages first
+        """
+        missing = []
+        for page_index in range(self.page_count):
+            image_cached = not zoom or self.cache.image_path(self.digest, page_index, zoom).exists()
+            text_cached = not with_text or self.cache.text_path(self.digest, page_index).exists()
+            if image_cached and text_cached:
+                yield page_index
+            else:
+                missing.append(page_index)
+
+        workers = min(workers or RENDER_WORKERS, len(missing))
+        if workers <= 1 or len(missing) < PARALLEL_MIN_PAGES:
+            for page_index in missing:
+                if zoom:
+                    self.page_png(page_index, zoom)
+                if with_text:
+                    self.math_text(page_index)
+                yield page_index
+            return
+
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_render_worker,
+            # Spooled documents are reopened by path rather than pickling their bytes to every worker
+            initargs=(self.path or self.data, str(self.cache.cache_dir))
+        )
+        futures = []
+        try:
+            for page_index in missing:
+                futures.append(pool.submit(_render_in_worker, self.digest, page_index, zoom, with_text))
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            # Stop promptly if the caller abandons the generator (cancel_futures needs Python 3.9)
+            for future in futures:
+                future.cancel()
+            pool.shutdown(wait=False)
+
+    def images(self, zoom=DEFAULT_ZOOM):
+        """Return every page as a lazily rendered image sequence that prefetches neighbours on access."""
+        return PageSequence(
+            self.page_count,
+            lambda page_index: self.page_image(page_index, zoom),
+            on_access=lambda page_index: self.prefetch(page_index, zoom)
+        )
+
+    def lazy(self, load):
+        """Return a sequence of load(page_index) for every page, computed when each page is accessed."""
+        return PageSequence(self.page_count, load)
+
+    def close(self):
+        """Release the PyMuPDF document, if it was opened."""
+        with self._lock:
+            if self._doc is not None:
+                self._doc.close()
+                self._doc = None
+
+
+def open_pdf(pdf_file, cache=None):
+    """
+    Open a Streamlit upload (or any BytesIO-like object) for ingestion without temp files.
+
+    The upload is hashed through a zero-copy view of its buffer. Small documents are then
+    opened from a single in-memory copy. Uploads above MVG_PDF_SPOOL_MB (default 32) are
+    written once to source.pdf in their page cache directory and opened from there, so
+    re-uploading them copies nothing. The directory is not evicted while the document is open.
+
+    Returns:
+        PdfDocument: The document, backed by the shared page cache
+    """
+    cache = cache or get_page_cache()
+    name = getattr(pdf_file, "name", None)
+    buffer = pdf_file.getbuffer() if hasattr(pdf_file, "getbuffer") else memoryview(pdf_file.getvalue())
+    try:
+        digest = pdf_digest(buffer)
+        if buffer.nbytes > SPOOL_THRESHOLD_BYTES:
+            source = cache.source_path(digest)
+            if not source.exists():
+                cache.write_bytes(source, buffer)
+            if source.exists():
+                return PdfDocument(name=name, cache=cache, path=source, digest=digest)
+        return PdfDocument(bytes(buffer), name=name, cache=cache, digest=digest)
+    finally:
+        # An exported view keeps the upload's BytesIO from being resized or closed
+        buffer.release()
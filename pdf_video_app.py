@@ -4,14 +4,13 @@ Interactive PDF viewer with text selection and instant video generation
 """
 
 import streamlit as st
-import pdfplumber
 import PyPDF2
-import tempfile
 import os
-import base64
 from pathlib import Path
 import time
-from math_video_generator import MathVideoGenerator
+from math_video_generator import get_generator
+from pdf_ingest import open_pdf
+from asset_server import publish_pdf
 
 # Page configuration
 st.set_page_config(
@@ -77,8 +76,6 @@ st.markdown("""
 
 def initialize_session_state():
     """Initialize session state variables."""
-    if 'pdf_text' not in st.session_state:
-        st.session_state.pdf_text = ""
     if 'selected_text' not in st.session_state:
         st.session_state.selected_text = ""
     if 'generated_videos' not in st.session_state:
@@ -91,25 +88,9 @@ def initialize_session_state():
 def extract_text_from_pdf(pdf_file):
     """Extract text from uploaded PDF file."""
     try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(pdf_file.getvalue())
-            tmp_path = tmp_file.name
-        
-        # Extract text using pdfplumber (better for complex layouts)
-        pages_text = []
-        with pdfplumber.open(tmp_path) as pdf:
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    pages_text.append(text)
-                else:
-                    pages_text.append("")
-        
-        # Clean up temporary file
-        os.unlink(tmp_path)
-        
-        return pages_text
+        # Formulas come back as LaTeX instead of flattened glyphs; pages are extracted when first viewed
+        document = open_pdf(pdf_file)
+        return document.lazy(lambda page_num: document.math_text(page_num)['text'])
     
     except Exception as e:
         st.error(f"Error extracting text from PDF: {str(e)}")
@@ -118,10 +99,10 @@ def extract_text_from_pdf(pdf_file):
 def create_pdf_viewer(pdf_file):
     """Create a simple PDF viewer with text extraction."""
     try:
-        # Display PDF in an iframe
-        base64_pdf = base64.b64encode(pdf_file.getvalue()).decode('utf-8')
+        # Published once per upload (the URL is kept in the session); the browser fetches byte ranges as it pages
+        pdf_url = publish_pdf(pdf_file, published=st.session_state.setdefault('published_pdfs', {}))
         pdf_display = f'''
-        <iframe src="data:application/pdf;base64,{base64_pdf}" 
+        <iframe src="{pdf_url}" 
                 width="100%" height="600px" type="application/pdf">
         </iframe>
         '''
@@ -222,8 +203,8 @@ def main():
                 with st.spinner("Extracting text from PDF..."):
                     pages_text = extract_text_from_pdf(uploaded_file)
                     if pages_text:
+                        # Kept lazy: joining every page here would extract the whole document up front
                         st.session_state.pdf_pages = pages_text
-                        st.session_state.pdf_text = "\n\n".join(pages_text)
                         st.success(f"✅ Extracted text from {len(pages_text)} pages!")
             
             # Page navigation if text is extracted
@@ -286,7 +267,7 @@ def main():
             if st.button("🎥 Generate Video", type="primary", key="generate_video"):
                 try:
                     # Initialize video generator
-                    generator = MathVideoGenerator()
+                    generator = get_generator()
                     
                     # Add to processing queue
                     video_info = {
@@ -312,18 +293,21 @@ def main():
                     progress_bar = st.progress(0)
                     status_text = st.empty()
                     
-                    # Generate video
-                    status_text.text("🤖 AI generating Manim code...")
-                    progress_bar.progress(25)
+                    # Progress is driven by the generator's real pipeline stages
+                    def update_progress(event):
+                        progress_bar.progress(event["progress"])
+                        status_text.text(event["message"])
                     
+                    # Generate video
                     video_path = generator.create_video(
                         math_topic=final_text,
                         difficulty=difficulty,
                         duration=duration,
-                        quality=quality
+                        quality=quality,
+                        progress_callback=update_progress,
+                        preview=False
                     )
                     
-                    progress_bar.progress(100)
                     processing_placeholder.empty()
                     
                     if video_path and os.path.exists(video_path):
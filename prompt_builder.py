@@ -0,0 +1,174 @@
+"""
+Prompt Compaction for the Math Video Generator
+Cleans selected PDF text (whitespace, hyphenation, page numbers, repeated headers and footers)
+and fits it into a token budget, so whole-page selections do not inflate prompt cost and latency.
+"""
+
+import os
+import re
+import math
+
+try:
+    import tiktoken
+except ImportError:  # Token counts fall back to an estimate
+    tiktoken = None
+
+# Largest topic, in tokens, sent to the model; MVG_PROMPT_TOKEN_BUDGET overrides it
+PROMPT_TOKEN_BUDGET = int(os.environ.get("MVG_PROMPT_TOKEN_BUDGET", "500"))
+# tiktoken encoding used to count tokens when tiktoken is installed
+TOKENIZER_ENCODING = os.environ.get("MVG_TOKENIZER_ENCODING", "o200k_base")
+
+OMISSION = "…"
+
+HYPHENATED_BREAK_RE = re.compile(r"([a-z])-\n([a-z])")
+HORIZONTAL_SPACE_RE = re.compile(r"[ \t\f\v\u00a0\u2000-\u200a\u202f\u3000]+")
+PAGE_NUMBER_RE = re.compile(r"^(page\s+)?\d{1,4}(\s*(of|/)\s*\d{1,4})?$|^[-–—]\s*\d{1,4}\s*[-–—]$", re.IGNORECASE)
+ESTIMATE_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+# Lines worth keeping first when the topic has to be cut down
+KEY_LINE_RE = re.compile(r"\b(definition|theorem|lemma|corollary|proposition|formula|example|proof)\b", re.IGNORECASE)
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    """Return the tiktoken encoding, loaded on first use, or None to estimate instead."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        if tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+            except Exception as e:
+                # Encodings are downloaded on first use, which fails offline
+                print(f"⚠️ Could not load tokenizer {TOKENIZER_ENCODING}, estimating tokens instead: {e}")
+    return _encoding
+
+
+def count_tokens(text):
+    """Count the tokens of text with tiktoken, or estimate them (about four characters per word piece)."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return sum(math.ceil(len(piece) / 4) for piece in ESTIMATE_TOKEN_RE.findall(text))
+
+
+def truncate_tokens(text, max_tokens):
+    """Cut text to at most max_tokens tokens, at a word boundary when the cut lands inside a word."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        cut = encoding.decode(tokens[:max_tokens])
+    else:
+        if count_tokens(text) <= max_tokens:
+            return text
+        cut = text
+        while cut and count_tokens(cut) > max_tokens:
+            cut = cut[:min(len(cut) * max_tokens // count_tokens(cut), len(cut) - 1)]
+    head, space, _ = cut.rpartition(" ")
+    return head if space and head else cut
+
+
+def clean_text(text):
+    """
+    Normalize extracted PDF text without changing its content.
+
+    Joins words hyphenated across lines, collapses runs of spaces, drops blank lines, and in
+    multi-line selections drops page-number lines and keeps only the first copy of repeated
+    multi-word lines (running headers and footers). Lines holding LaTeX are never deduplicated.
+    A topic that would be left empty (such as "12" or "1/2") is only whitespace-collapsed.
+    """
+    text = HYPHENATED_BREAK_RE.sub(r"\1\2", text.replace("\r\n", "\n").replace("\r", "\n"))
+    collapsed = [HORIZONTAL_SPACE_RE.sub(" ", line).strip() for line in text.split("\n")]
+    collapsed = [line for line in collapsed if line]
+    if len(collapsed) <= 1:
+        return collapsed[0] if collapsed else ""
+
+    lines = []
+    seen = set()
+    for line in collapsed:
+        if PAGE_NUMBER_RE.match(line):
+            continue
+        if "$" not in line and " " in line:
+            key = line.lower()
+            if key in seen:
+                continue
+            seen.add(key)
+        lines.append(line)
+    return "\n".join(lines or collapsed)
+
+
+def _line_priority(index, line, line_count):
+    """Rank lines for an extractive summary: formulas, then key statements, then earlier lines."""
+    score = 0.0
+    if "$" in line:
+        score += 2
+    if KEY_LINE_RE.search(line):
+        score += 1
+    return score - index / line_count
+
+
+def _summarize(lines, budget):
+    """Keep the highest-priority lines that fit the budget, in their original order."""
+    costs = [count_tokens(line) + 1 for line in lines]
+    ranked = sorted(range(len(lines)), key=lambda i: _line_priority(i, lines[i], len(lines)), reverse=True)
+
+    # Every gap left by dropped lines costs an omission marker, so reserve room for a few
+    spent = count_tokens(OMISSION) * 4
+    kept = set()
+    for index in ranked:
+        if spent + costs[index] <= budget:
+            kept.add(index)
+            spent += costs[index]
+
+    output = []
+    for index, line in enumerate(lines):
+        if index in kept:
+            output.append(line)
+        elif not output or output[-1] != OMISSION:
+            output.append(OMISSION)
+    return "\n".join(output)
+
+
+def compact_prompt(text, token_budget=None):
+    """
+    Clean a topic and fit it into a token budget.
+
+    Text over the budget after cleaning is summarized extractively: lines with formulas,
+    definitions and theorems are kept first, the rest in reading order, and gaps are marked
+    with "…". A single line longer than the whole budget is truncated.
+
+    Args:
+        text (str): Topic or selected PDF text
+        token_budget (int): Token limit, defaults to MVG_PROMPT_TOKEN_BUDGET (500)
+
+    Returns:
+        dict: text, tokens, original_tokens, tokens_saved, truncated (whether content was
+            dropped, not just cleaned) and tokenizer ("tiktoken" or "estimate")
+    """
+    budget = token_budget or PROMPT_TOKEN_BUDGET
+    original_tokens = count_tokens(text)
+    compacted = clean_text(text)
+    truncated = False
+
+    if count_tokens(compacted) > budget:
+        truncated = True
+        lines = compacted.split("\n")
+        summary = _summarize(lines, budget) if len(lines) > 1 else ""
+        if not summary.replace(OMISSION, "").strip():
+            summary = truncate_tokens(compacted, budget - count_tokens(OMISSION)) + OMISSION
+        compacted = truncate_tokens(summary, budget)
+
+    tokens = count_tokens(compacted)
+    return {
+        "text": compacted,
+        "tokens": tokens,
+        "original_tokens": original_tokens,
+        "tokens_saved": max(original_tokens - tokens, 0),
+        "truncated": truncated,
+        "tokenizer": "tiktoken" if _get_encoding() is not None else "estimate"
+    }
@@ -24,7 +24,8 @@ def quick_demo():
             math_topic=topic,
             difficulty="beginner",
             duration=20,
-            quality="medium_quality"
+            quality="medium_quality",
+            preview=False
         )
         
         if video_path:
@@ -7,8 +7,8 @@ import streamlit as st
 import os
 import time
 from pathlib import Path
-import subprocess
-from math_video_generator import MathVideoGenerator
+from math_video_generator import get_generator
+from video_catalog import create_video_catalog
 
 # Page configuration
 st.set_page_config(
@@ -77,7 +77,7 @@ def check_setup():
             return False, "❌ GITHUB_TOKEN not found in .env file."
         
         # Try to initialize the generator
-        MathVideoGenerator()
+        get_generator()
         return True, "✅ Setup complete! Ready to generate videos."
         
     except Exception as e:
@@ -87,86 +87,32 @@ def generate_video_with_progress(topic, difficulty, duration, quality):
     """Generate video with progress tracking."""
     try:
         # Initialize generator
-        generator = MathVideoGenerator()
+        generator = get_generator()
         
         # Create progress placeholders
         progress_bar = st.progress(0)
         status_text = st.empty()
         
-        # Step 1: Generate code
-        status_text.text("🤖 Generating Manim code with AI...")
-        progress_bar.progress(20)
-        
-        manim_code = generator.generate_manim_code(topic, difficulty, duration)
-        if not manim_code:
-            return None, "Failed to generate Manim code"
-        
-        progress_bar.progress(40)
-        status_text.text("💾 Saving generated code...")
-        
-        # Clean and save code
-        manim_code = generator.clean_generated_code(manim_code)
-        
-        # Create filename
-        import re
-        safe_topic_name = re.sub(r'[^\w\s-]', '', topic).strip()
-        safe_topic_name = re.sub(r'[-\s]+', '_', safe_topic_name)
-        if len(safe_topic_name) > 50:
-            safe_topic_name = safe_topic_name[:50]
-        
-        temp_file = Path("math_videos") / f"{safe_topic_name}_scene.py"
-        temp_file.parent.mkdir(exist_ok=True)
-        
-        with open(temp_file, 'w', encoding='utf-8') as f:
-            f.write(manim_code)
-        
-        progress_bar.progress(60)
-        status_text.text("🎬 Rendering video with Manim...")
-        
-        # Extract scene class name
-        scene_match = re.search(r'class\s+(\w+)\s*\(Scene\)', manim_code)
-        if not scene_match:
-            return None, "No Scene class found in generated code"
-        
-        scene_name = scene_match.group(1)
-        
-        # Render video
-        quality_map = {"low_quality": "l", "medium_quality": "m", "high_quality": "h"}
-        
-        cmd = [
-            ".venv/Scripts/python.exe", "-m", "manim", "render",
-            str(temp_file), scene_name,
-            "--quality", quality_map.get(quality, "m"),
-            "--output_file", f"{safe_topic_name}_video"
-        ]
-        
-        try:
-            result = subprocess.run(cmd, capture_output=True, text=True, cwd=str(Path.cwd()))
-        except FileNotFoundError as e:
-            # FFmpeg not found - return the scene file instead
-            progress_bar.progress(100)
-            status_text.text("⚠️ Video rendering failed (FFmpeg not found), but scene code was generated!")
-            return str(temp_file), manim_code
-        
-        progress_bar.progress(90)
-        status_text.text("🔍 Locating generated video...")
+        # Progress, generated code and failure reasons all arrive as pipeline events
+        outcome = {}
+        
+        def update_progress(event):
+            progress_bar.progress(event["progress"])
+            status_text.text(event["message"])
+            if "code" in event:
+                outcome["code"] = event["code"]
+            if event["stage"] == "failed":
+                outcome["error"] = event["message"]
+        
+        video_path = generator.create_video(
+            topic, difficulty, duration, quality,
+            progress_callback=update_progress,
+            preview=False
+        )
         
-        if result.returncode == 0:
-            # Find the video file
-            scene_file_stem = temp_file.stem
-            quality_folder = {"l": "480p15", "m": "720p30", "h": "1080p60"}[quality_map.get(quality, "m")]
-            media_dir = Path("media") / "videos" / scene_file_stem / quality_folder
-            
-            if media_dir.exists():
-                video_files = list(media_dir.glob("*.mp4"))
-                if video_files:
-                    progress_bar.progress(100)
-                    status_text.text("✅ Video generated successfully!")
-                    return str(video_files[0]), manim_code
-            
-            return None, "Video file not found after rendering"
-        else:
-            return None, f"Manim rendering failed: {result.stderr}"
+        if video_path:
+            return video_path, outcome.get("code", "")
+        return None, outcome.get("error", "Failed to generate video")
             
     except Exception as e:
         return None, f"Error: {str(e)}"
@@ -316,31 +262,19 @@ def main():
         st.subheader("📊 Recent Videos")
         
         # List recent videos
-        media_path = Path("media/videos")
-        if media_path.exists():
-            video_folders = [d for d in media_path.iterdir() if d.is_dir()]
-            
-            if video_folders:
-                for folder in sorted(video_folders, key=lambda x: x.stat().st_mtime, reverse=True)[:5]:
-                    # Find video files in the folder
-                    for quality_folder in folder.iterdir():
-                        if quality_folder.is_dir():
-                            videos = list(quality_folder.glob("*.mp4"))
-                            if videos:
-                                video = videos[0]
-                                # Clean up the folder name for display
-                                display_name = folder.name.replace("_", " ").title()
-                                if len(display_name) > 30:
-                                    display_name = display_name[:30] + "..."
-                                
-                                st.write(f"🎬 {display_name}")
-                                if st.button(f"📁 Open", key=f"open_{folder.name}"):
-                                    import subprocess
-                                    subprocess.run(['explorer', str(quality_folder)], check=False)
-                                st.markdown("---")
-                                break
-            else:
-                st.info("No videos generated yet.")
+        recent_videos, _ = create_video_catalog().list(limit=5)
+        if recent_videos:
+            for video in recent_videos:
+                # Shorten the topic name for display
+                display_name = video["topic"] or "Untitled"
+                if len(display_name) > 30:
+                    display_name = display_name[:30] + "..."
+                
+                st.write(f"🎬 {display_name}")
+                if st.button(f"📁 Open", key=f"open_{video['path']}"):
+                    import subprocess
+                    subprocess.run(['explorer', str(Path(video["path"]).parent)], check=False)
+                st.markdown("---")
         else:
             st.info("No videos generated yet.")
 
@@ -0,0 +1,252 @@
+"""
+Task Status Store for Math Video Generator
+Thread-safe, evicting storage for generation task status, in memory or in SQLite.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from contextlib import contextmanager
+
+FINISHED_STATUSES = ("completed", "failed")
+
+
+def new_task_id():
+    """Return a collision-free task ID."""
+    return f"task_{uuid.uuid4().hex}"
+
+
+class TaskStore:
+    """In-memory task status store with atomic updates, TTL eviction of finished tasks and a size bound."""
+
+    def __init__(self, ttl=3600, max_tasks=1000):
+        """
+        Initialize the task store.
+
+        Args:
+            ttl (float): Seconds a finished task is kept after its last update
+            max_tasks (int): Maximum number of tasks held at once
+        """
+        self.ttl = ttl
+        self.max_tasks = max_tasks
+        self._tasks = OrderedDict()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def set(self, task_id, status):
+        """Replace the status of a task."""
+        with self._lock:
+            self._store_locked(task_id, dict(status))
+
+    def update(self, task_id, **fields):
+        """Atomically merge fields into a task's status, creating it if needed."""
+        with self._lock:
+            self._store_locked(task_id, dict(self._tasks.get(task_id, {}), **fields))
+
+    def _store_locked(self, task_id, entry):
+        previous = self._tasks.get(task_id)
+        entry["updated_at"] = time.time()
+        entry["version"] = (previous["version"] if previous else 0) + 1
+        self._tasks[task_id] = entry
+        self._tasks.move_to_end(task_id)
+        self._evict_locked()
+        self._changed.notify_all()
+
+    def wait_for_change(self, task_id, version, timeout):
+        """
+        Block until a task's version differs from the given one.
+
+        Args:
+            task_id (str): The task ID
+            version (int): Last version seen by the caller (None if the task was unknown)
+            timeout (float): Maximum seconds to wait
+
+        Returns:
+            dict: The current status, or None if the task is unknown
+        """
+        with self._changed:
+            self._changed.wait_for(
+                lambda: (self._tasks.get(task_id) or {}).get("version") != version,
+                timeout
+            )
+        return self.get(task_id)
+
+    def get(self, task_id):
+        """Return a copy of a task's status, or None if it is unknown or expired."""
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            if entry is None or self._expired(entry, time.time()):
+                return None
+            return dict(entry)
+
+    def delete(self, task_id):
+        """Forget a task."""
+        with self._lock:
+            self._tasks.pop(task_id, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._tasks)
+
+    def _expired(self, entry, now):
+        return entry.get("status") in FINISHED_STATUSES and now - entry["updated_at"] > self.ttl
+
+    def _evict_locked(self):
+        now = time.time()
+        for task_id in [t for t, entry in self._tasks.items() if self._expired(entry, now)]:
+            del self._tasks[task_id]
+
+        # Still over budget: drop the least recently updated tasks, finished ones first
+        overflow = len(self._tasks) - self.max_tasks
+        if overflow > 0:
+            finished = [t for t, entry in self._tasks.items() if entry.get("status") in FINISHED_STATUSES]
+            for task_id in finished[:overflow]:
+                del self._tasks[task_id]
+            while len(self._tasks) > self.max_tasks:
+                self._tasks.popitem(last=False)
+
+
+class SQLiteTaskStore:
+    """SQLite-backed task status store shared by every worker process using the same database file."""
+
+    def __init__(self, db_path, ttl=3600, max_tasks=10000):
+        """
+        Initialize the SQLite task store.
+
+        Args:
+            db_path (str | Path): SQLite database file
+            ttl (float): Seconds a finished task is kept after its last update
+            max_tasks (int): Maximum number of tasks kept in the table
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_tasks = max_tasks
+        self._writes = 0
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id TEXT PRIMARY KEY,
+                    status TEXT,
+                    data TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_updated ON tasks (updated_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def set(self, task_id, status):
+        """Replace the status of a task."""
+        self._write(task_id, lambda previous: dict(status))
+
+    def update(self, task_id, **fields):
+        """Atomically merge fields into a task's status, creating it if needed."""
+        self._write(task_id, lambda previous: dict(previous, **fields))
+
+    def _write(self, task_id, build_entry):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT data FROM tasks WHERE id = ?", (task_id,)).fetchone()
+                previous = json.loads(row[0]) if row else {}
+                entry = build_entry(previous)
+                entry["updated_at"] = time.time()
+                entry["version"] = previous.get("version", 0) + 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO tasks (id, status, data, updated_at) VALUES (?, ?, ?, ?)",
+                    (task_id, entry.get("status"), json.dumps(entry), entry["updated_at"])
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        self._maybe_evict()
+
+    def wait_for_change(self, task_id, version, timeout, poll_interval=0.5):
+        """
+        Block until a task's version differs from the given one.
+
+        Other processes may be writing, so this polls the database.
+
+        Args:
+            task_id (str): The task ID
+            version (int): Last version seen by the caller (None if the task was unknown)
+            timeout (float): Maximum seconds to wait
+            poll_interval (float): Seconds between database checks
+
+        Returns:
+            dict: The current status, or None if the task is unknown
+        """
+        deadline = time.time() + timeout
+        while True:
+            status = self.get(task_id)
+            remaining = deadline - time.time()
+            if (status or {}).get("version") != version or remaining <= 0:
+                return status
+            time.sleep(min(poll_interval, remaining))
+
+    def get(self, task_id):
+        """Return a task's status, or None if it is unknown or expired."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT status, data, updated_at FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        if row is None:
+            return None
+        status, data, updated_at = row
+        if status in FINISHED_STATUSES and time.time() - updated_at > self.ttl:
+            return None
+        return json.loads(data)
+
+    def delete(self, task_id):
+        """Forget a task."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    def _maybe_evict(self):
+        # Evicting on every write would turn each status update into a table scan
+        self._writes += 1
+        if self._writes % 50 == 0:
+            self.evict()
+
+    def evict(self):
+        """Delete expired finished tasks, then the oldest tasks beyond max_tasks."""
+        placeholders = ", ".join("?" for _ in FINISHED_STATUSES)
+        with self._connect() as conn:
+            conn.execute(
+                f"DELETE FROM tasks WHERE status IN ({placeholders}) AND updated_at < ?",
+                (*FINISHED_STATUSES, time.time() - self.ttl)
+            )
+            conn.execute(
+                "DELETE FROM tasks WHERE id IN (SELECT id FROM tasks ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_tasks,)
+            )
+
+
+def create_task_store():
+    """
+    Create the task store selected by the environment.
+
+    MVG_TASK_STORE=sqlite shares status between processes through MVG_TASK_DB;
+    anything else keeps status in memory.
+    """
+    ttl = float(os.environ.get("MVG_TASK_TTL", "3600"))
+    if os.environ.get("MVG_TASK_STORE", "memory").lower() == "sqlite":
+        return SQLiteTaskStore(os.environ.get("MVG_TASK_DB", "math_videos/tasks.db"), ttl=ttl)
+    return TaskStore(ttl=ttl, max_tasks=int(os.environ.get("MVG_MAX_TASKS", "1000")))
@@ -0,0 +1,47 @@
+"""
+Tests for Range header parsing in the asset server.
+"""
+
+import pytest
+
+# asset_server publishes PDFs through pdf_ingest, which needs PyMuPDF and Pillow
+pytest.importorskip("fitz")
+pytest.importorskip("PIL")
+
+from asset_server import parse_byte_range  # noqa: E402
+
+
+def test_explicit_ranges():
+    assert parse_byte_range("bytes=0-99", 1000) == (0, 99)
+    assert parse_byte_range("bytes=500-", 1000) == (500, 999)
+
+
+def test_end_is_clamped_to_the_file():
+    assert parse_byte_range("bytes=900-5000", 1000) == (900, 999)
+
+
+def test_suffix_ranges():
+    assert parse_byte_range("bytes=-100", 1000) == (900, 999)
+    assert parse_byte_range("bytes=-5000", 1000) == (0, 999)
+    assert parse_byte_range("bytes=-0", 1000) is None
+
+
+def test_unsatisfiable_ranges():
+    assert parse_byte_range("bytes=1000-", 1000) is None
+    assert parse_byte_range("bytes=50-10", 1000) is None
+
+
+def test_ignored_ranges_cover_the_whole_file():
+    assert parse_byte_range("bytes=0-1,5-9", 1000) == (0, 999)
+    assert parse_byte_range("items=0-1", 1000) == (0, 999)
+    assert parse_byte_range("bytes=-", 1000) == (0, 999)
+
+
+def test_static_urls_carry_a_version(tmp_path):
+    from asset_server import AssetStore, StaticAssets
+
+    store = AssetStore(tmp_path)
+    name = store.name_for("webp", "digest", 0, 1.5)
+    url = StaticAssets(store, "/app/static/mvg-assets/").url_for(name)
+    # Streamlit only caches static files long-term when the URL has a "v" argument
+    assert url == f"/app/static/mvg-assets/{name}?v={name[:-len('.webp')]}"
@@ -0,0 +1,71 @@
+"""
+Tests for the asyncio API: blocking work runs in the executor, off the event loop.
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("dotenv")
+
+import async_generator  # noqa: E402
+from async_generator import AsyncMathVideoGenerator  # noqa: E402
+from generation_cache import CodeCache  # noqa: E402
+
+
+def _generator(tmp_path, check_names):
+    """A generator without clients; the completion itself is stubbed."""
+    generator = AsyncMathVideoGenerator.__new__(AsyncMathVideoGenerator)
+    generator.model = "test-model"
+    generator.code_cache = CodeCache(tmp_path)
+    generator.use_code_cache = False
+    generator.stream_llm = False
+    generator.llm_timeout = 5
+    generator.check_names = check_names
+
+    async def complete(messages, progress_callback=None):
+        return "code"
+
+    generator._acomplete = complete
+    return generator
+
+
+def test_manim_is_not_imported_without_name_checks(tmp_path, monkeypatch):
+    monkeypatch.setattr(async_generator, "manim_namespace", lambda: pytest.fail("manim imported"))
+    generator = _generator(tmp_path, check_names=False)
+    assert asyncio.run(generator.agenerate_manim_code("circles")) == "code"
+
+
+def test_manim_is_imported_off_the_event_loop(tmp_path, monkeypatch):
+    loop_threads = []
+    monkeypatch.setattr(async_generator, "manim_namespace", lambda: loop_threads.append(threading.get_ident()))
+    generator = _generator(tmp_path, check_names=True)
+    assert asyncio.run(generator.agenerate_manim_code("circles")) == "code"
+    assert loop_threads and loop_threads[0] != threading.get_ident()
+
+
+def test_render_planning_and_collection_run_in_the_executor(tmp_path):
+    generator = _generator(tmp_path, check_names=False)
+    generator.render_timeout = 10
+    generator.max_repair_attempts = 0
+    calls = {}
+
+    def record(name, result):
+        def call(*args, **kwargs):
+            calls[name] = threading.get_ident()
+            return result
+        return call
+
+    async def run_manim(cmd, total_animations, progress_callback=None, timeout=None):
+        return 0, ""
+
+    generator._plan_render = record("plan", {"cached_video": None, "cmd": []})
+    generator._collect_render = record("collect", "video.mp4")
+    generator._count_animations = lambda code: 1
+    generator._arun_manim = run_manim
+
+    assert asyncio.run(generator.arender_scene({"code": ""})) == "video.mp4"
+    assert set(calls) == {"plan", "collect"}
+    assert threading.get_ident() not in calls.values()
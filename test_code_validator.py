@@ -0,0 +1,66 @@
+"""
+Tests for static validation of generated Manim scene code.
+"""
+
+import code_validator
+from code_validator import validate_scene_code
+
+SCENE = """from manim import *
+import numpy as np
+
+class TangentLine(Scene):
+    def construct(self):
+        circle = Circle(radius=np.pi)
+        self.play(Create(circle))
+"""
+
+
+def _errors(code, **kwargs):
+    return validate_scene_code(code, check_names=False, **kwargs)["errors"]
+
+
+def test_accepts_a_valid_scene():
+    result = validate_scene_code(SCENE, check_names=False)
+    assert result["valid"]
+    assert result["scene_name"] == "TangentLine"
+
+
+def test_reports_syntax_errors_with_line_numbers():
+    result = validate_scene_code("class A(Scene):\n    def construct(self)\n        pass\n")
+    assert not result["valid"]
+    assert result["errors"][0].startswith("syntax error on line 2")
+
+
+def test_requires_exactly_one_scene_with_construct():
+    assert _errors("x = 1\n") == ["no Scene subclass in generated code"]
+    assert "expected one Scene subclass" in _errors(SCENE + "\nclass Other(MovingCameraScene):\n    pass\n")[0]
+    assert _errors("class A(Scene):\n    def setup(self):\n        pass\n") == ["scene A has no construct() method"]
+
+
+def test_rejects_disallowed_imports_and_calls():
+    errors = _errors(SCENE.replace("import numpy as np", "import os\nfrom subprocess import run") +
+                     "        open('/etc/passwd')\n")
+    assert "disallowed import 'os' on line 2" in errors
+    assert "disallowed import 'subprocess' on line 3" in errors
+    assert any(error.startswith("disallowed call to open()") for error in errors)
+
+
+def test_allowlist_can_be_extended(monkeypatch):
+    code = SCENE.replace("import numpy as np", "import numpy as np\nimport networkx")
+    assert _errors(code)
+    monkeypatch.setenv("MVG_ALLOWED_IMPORTS", "networkx, other")
+    assert _errors(code) == []
+
+
+def test_flags_unknown_names(monkeypatch):
+    monkeypatch.setattr(code_validator, "manim_namespace", lambda: frozenset({"Scene", "Circle", "Create"}))
+    result = validate_scene_code(SCENE.replace("Create(circle)", "Craete(circle)"))
+    assert result["errors"] == ["unknown name 'Craete' on line 7"]
+    assert validate_scene_code(SCENE)["valid"]
+
+
+def test_skips_name_check_without_manim(monkeypatch):
+    monkeypatch.setattr(code_validator, "manim_namespace", lambda: None)
+    result = validate_scene_code(SCENE.replace("Circle", "Circel"))
+    assert result["valid"]
+    assert result["warnings"]
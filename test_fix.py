@@ -13,7 +13,8 @@ def test_fixed_generator():
             math_topic="Simple linear equations y = mx + b",
             difficulty="beginner",
             duration=20,
-            quality="medium_quality"
+            quality="medium_quality",
+            preview=False
         )
         
         if video_path:
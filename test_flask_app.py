@@ -0,0 +1,202 @@
+"""
+Tests for the Flask web API, run against temporary databases with the render workers stopped.
+"""
+
+import time
+import importlib
+import threading
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_cors")
+pytest.importorskip("openai")
+
+from job_queue import JobQueue  # noqa: E402
+from task_store import TaskStore  # noqa: E402
+from video_catalog import VideoCatalog  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def flask_app(tmp_path_factory):
+    data_dir = tmp_path_factory.mktemp("flask_app")
+    patch = pytest.MonkeyPatch()
+    patch.setenv("MVG_JOB_DB", str(data_dir / "jobs.db"))
+    patch.setenv("MVG_CATALOG_DB", str(data_dir / "catalog.db"))
+    patch.setenv("MVG_TASK_STORE", "memory")
+    module = importlib.import_module("flask_app")
+    module.worker_pool.stop()
+    yield module
+    patch.undo()
+
+
+@pytest.fixture
+def app_module(flask_app, tmp_path, monkeypatch):
+    """The app with a fresh job queue, task store and catalog per test, and nothing draining the queue."""
+    monkeypatch.setattr(flask_app, "job_queue", JobQueue(tmp_path / "jobs.db"))
+    monkeypatch.setattr(flask_app, "task_store", TaskStore())
+    monkeypatch.setattr(flask_app, "video_catalog", VideoCatalog(tmp_path / "catalog.db"))
+    monkeypatch.setattr(flask_app, "MEDIA_ROOT", (tmp_path / "media").resolve())
+    return flask_app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+def _catalog_video(app_module, tmp_path, name="circle.mp4", data=b"0123456789" * 100, **fields):
+    path = tmp_path / "media" / "jobs" / "job_1" / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return app_module.video_catalog.add(path, **fields)
+
+
+def _previewed_task(app_module, task_id="task_1"):
+    job = {"id": task_id, "priority": 0, "payload": {"quality": "medium_quality"}}
+    status = {"status": "preview_ready", "preview_path": "preview.mp4", "preview_id": "p1"}
+    app_module.task_store.set(task_id, status)
+    return job, {"scene_name": "Demo"}, status
+
+
+def test_queues_one_final_render(app_module):
+    job, scene, status = _previewed_task(app_module)
+    app_module._queue_final_render(job, scene, status)
+
+    final = app_module.job_queue.get("task_1_final")
+    assert final["status"] == "queued"
+    assert final["priority"] == -1
+    assert final["payload"]["preview_path"] == "preview.mp4"
+
+
+def test_rerun_preview_reuses_a_queued_final_render(app_module):
+    # A crash after queueing the final render makes recovery run the preview job again
+    job, scene, status = _previewed_task(app_module)
+    app_module._queue_final_render(job, scene, status)
+    app_module._queue_final_render(job, scene, status)
+
+    assert app_module.job_queue.counts() == {"queued": 1}
+    assert app_module.task_store.get("task_1")["status"] == "preview_ready"
+
+
+def test_rerun_preview_restores_a_finished_final_render(app_module):
+    job, scene, status = _previewed_task(app_module)
+    app_module._queue_final_render(job, scene, status)
+    final_status = {"status": "completed", "video_path": "final.mp4", "video_id": "f1"}
+    app_module.job_queue.claim()
+    app_module.job_queue.complete("task_1_final", final_status)
+
+    app_module._queue_final_render(job, scene, status)
+    assert app_module.task_store.get("task_1")["video_path"] == "final.mp4"
+
+
+def test_rerun_preview_keeps_the_preview_when_the_final_render_failed(app_module):
+    job, scene, status = _previewed_task(app_module)
+    app_module._queue_final_render(job, scene, status)
+    app_module.job_queue.claim()
+    app_module.job_queue.fail("task_1_final", "boom")
+
+    app_module._queue_final_render(job, scene, status)
+    restored = app_module.task_store.get("task_1")
+    assert restored["status"] == "completed"
+    assert restored["video_path"] == "preview.mp4"
+
+
+def test_lists_cataloged_videos_with_filters(app_module, client, tmp_path):
+    _catalog_video(app_module, tmp_path, "a.mp4", topic="Unit circle", quality="low_quality")
+    _catalog_video(app_module, tmp_path, "b.mp4", topic="Fourier series", quality="high_quality")
+
+    data = client.get("/api/videos?quality=high_quality").get_json()
+    assert data["total"] == 1
+    assert data["videos"][0]["topic"] == "Fourier series"
+    assert data["videos"][0]["stream_url"] == f"/api/videos/{data['videos'][0]['id']}/stream"
+
+    names = [video["topic"] for video in client.get("/api/videos?sort=topic&order=asc").get_json()["videos"]]
+    assert names == ["Fourier series", "Unit circle"]
+    assert client.get("/api/videos?sort=path").status_code == 400
+
+
+def test_unknown_video_ids_are_not_found(client):
+    assert client.get("/api/videos/missing").status_code == 404
+    assert client.get("/api/videos/missing/stream").status_code == 404
+    assert client.get("/api/download/missing").status_code == 404
+
+
+def test_video_ids_never_reach_the_filesystem(app_module, client, tmp_path):
+    (tmp_path / "secret.mp4").write_bytes(b"secret")
+    for video_id in ("..%2F..%2Fsecret.mp4", "..", "secret.mp4", str(tmp_path / "secret.mp4")):
+        assert client.get(f"/api/videos/{video_id}/stream").status_code == 404
+
+
+def test_only_cataloged_mp4_files_are_served(app_module, client, tmp_path):
+    script = tmp_path / "media" / "generated_scene.py"
+    script.parent.mkdir(parents=True, exist_ok=True)
+    script.write_text("print('hi')")
+    video_id = app_module.video_catalog.add(script)
+    assert client.get(f"/api/download/{video_id}").status_code == 404
+
+    video_id = _catalog_video(app_module, tmp_path)
+    response = client.get(f"/api/download/{video_id}")
+    assert response.status_code == 200
+    assert response.mimetype == "video/mp4"
+    assert "attachment" in response.headers["Content-Disposition"]
+
+
+def test_video_range_requests_return_partial_content(app_module, client, tmp_path):
+    video_id = _catalog_video(app_module, tmp_path)
+    response = client.get(f"/api/videos/{video_id}/stream", headers={"Range": "bytes=100-199"})
+
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == "bytes 100-199/1000"
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.data == (b"0123456789" * 100)[100:200]
+
+
+def test_video_revalidation_returns_not_modified(app_module, client, tmp_path):
+    video_id = _catalog_video(app_module, tmp_path)
+    first = client.get(f"/api/videos/{video_id}/stream")
+    assert first.status_code == 200
+    assert "max-age=" in first.headers["Cache-Control"]
+
+    again = client.get(f"/api/videos/{video_id}/stream", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.data == b""
+
+
+def test_video_delivery_can_be_offloaded_to_nginx(app_module, client, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, "MEDIA_OFFLOAD", "x-accel-redirect")
+    monkeypatch.setattr(app_module, "MEDIA_ACCEL_PREFIX", "/protected-media/")
+    video_id = _catalog_video(app_module, tmp_path, "unit circle.mp4")
+
+    response = client.get(f"/api/download/{video_id}")
+    assert response.status_code == 200
+    assert response.headers["X-Accel-Redirect"] == "/protected-media/jobs/job_1/unit%20circle.mp4"
+    assert response.data == b""
+
+    # Files outside MVG_MEDIA_ROOT cannot be mapped onto the internal location
+    outside = tmp_path / "elsewhere.mp4"
+    outside.write_bytes(b"v")
+    assert client.get(f"/api/download/{app_module.video_catalog.add(outside)}").status_code == 404
+
+
+def test_status_revalidation_returns_not_modified(app_module, client):
+    app_module.task_store.set("task_1", {"status": "generating", "progress": 10})
+    first = client.get("/api/status/task_1")
+    assert first.get_json()["progress"] == 10
+
+    again = client.get("/api/status/task_1", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+
+
+def test_status_long_poll_returns_on_change(app_module, client):
+    app_module.task_store.set("task_1", {"status": "generating", "progress": 10})
+    etag = client.get("/api/status/task_1").headers["ETag"]
+    timer = threading.Timer(0.2, app_module.task_store.update, args=("task_1",), kwargs={"progress": 50})
+    timer.start()
+
+    started = time.time()
+    response = client.get("/api/status/task_1?wait=10", headers={"If-None-Match": etag})
+    timer.join()
+    assert response.status_code == 200
+    assert response.get_json()["progress"] == 50
+    assert time.time() - started < 5
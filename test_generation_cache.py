@@ -0,0 +1,102 @@
+"""
+Tests for the code and render caches: expiry, LRU eviction and hard-linked entries.
+"""
+
+import os
+import time
+
+import generation_cache
+from generation_cache import CodeCache, RenderCache, link_or_copy
+
+
+def _set_mtime(path, seconds_ago):
+    stamp = time.time() - seconds_ago
+    os.utime(path, (stamp, stamp))
+
+
+def _video(path, size):
+    path.write_bytes(b"v" * size)
+    return path
+
+
+def test_code_cache_keys_ignore_topic_spelling(tmp_path):
+    cache = CodeCache(tmp_path)
+    assert cache.key_for("Pythagorean  Theorem", "beginner", 30, "m", 1) == \
+        cache.key_for("pythagorean theorem", "beginner", 30.0, "m", 1)
+    assert cache.key_for("x", "beginner", 30, "m", 1) != cache.key_for("x", "beginner", 30, "m", 2)
+
+
+def test_code_cache_expires_old_entries(tmp_path, monkeypatch):
+    cache = CodeCache(tmp_path, max_age_days=1)
+    cache.put("fresh", "code a")
+    cache.put("old", "code b")
+
+    real_time = time.time
+    monkeypatch.setattr(generation_cache.time, "time", lambda: real_time() + 2 * 24 * 3600)
+    assert cache.get("old") is None
+    assert not (tmp_path / "old.json").exists()
+    assert cache.stats()["misses"] == 1
+
+
+def test_code_cache_keeps_newest_entries(tmp_path):
+    cache = CodeCache(tmp_path, max_entries=2)
+    for age, key in ((30, "a"), (20, "b")):
+        cache.put(key, f"code {key}")
+        _set_mtime(tmp_path / f"{key}.json", age)
+    cache.put("c", "code c")
+
+    assert cache.get("a") is None
+    assert cache.get("b") == "code b"
+    assert cache.get("c") == "code c"
+
+
+def test_render_cache_evicts_least_recently_used_bytes(tmp_path):
+    cache = RenderCache(tmp_path / "renders", max_bytes=250)
+    for age, key in ((30, "a"), (20, "b")):
+        cache.put(key, _video(tmp_path / f"{key}.mp4", 100))
+        os.unlink(tmp_path / f"{key}.mp4")
+        _set_mtime(tmp_path / "renders" / f"{key}.mp4", age)
+
+    # A hit refreshes "a", so "b" is the least recently used
+    assert cache.get("a")
+    cache.put("c", _video(tmp_path / "c.mp4", 100))
+    os.unlink(tmp_path / "c.mp4")
+    cache.evict()
+
+    assert cache.get("b") is None
+    assert cache.get("a") and cache.get("c")
+    assert cache.stats()["bytes"] == 200
+
+
+def test_render_cache_keeps_entries_linked_into_jobs(tmp_path):
+    cache = RenderCache(tmp_path / "renders", max_bytes=50)
+    job_video = _video(tmp_path / "job.mp4", 100)
+    cached = cache.put("a", job_video)
+
+    # Removing the entry would free nothing while the job's copy shares its bytes
+    assert os.stat(cached).st_nlink == 2
+    assert cache.get("a") == cached
+
+    os.unlink(job_video)
+    cache.evict()
+    assert cache.get("a") is None
+
+
+def test_link_or_copy_links(tmp_path):
+    source = _video(tmp_path / "source.mp4", 10)
+    link_or_copy(source, tmp_path / "linked.mp4")
+    assert (tmp_path / "linked.mp4").read_bytes() == source.read_bytes()
+    assert os.path.samefile(source, tmp_path / "linked.mp4")
+
+
+def test_link_or_copy_falls_back_to_copying(tmp_path, monkeypatch):
+    def no_links(source, destination):
+        raise OSError("cross-device link")
+
+    monkeypatch.setattr(generation_cache.os, "link", no_links)
+    source = _video(tmp_path / "source.mp4", 10)
+    link_or_copy(source, tmp_path / "copy.mp4")
+
+    assert (tmp_path / "copy.mp4").read_bytes() == source.read_bytes()
+    assert not os.path.samefile(source, tmp_path / "copy.mp4")
+    assert [path.name for path in tmp_path.iterdir() if path.suffix == ".tmp"] == []
@@ -0,0 +1,142 @@
+"""
+Tests for the persistent job queue: priority ordering, capacity and recovery of jobs
+orphaned by a restart or a crashed worker.
+"""
+
+import sqlite3
+
+import job_queue
+from job_queue import JobQueue, WorkerPool, QueueFullError
+
+
+def _set_owner(queue, job_id, owner):
+    with queue._connect() as conn:
+        conn.execute("UPDATE jobs SET owner = ? WHERE id = ?", (owner, job_id))
+
+
+def test_claims_by_priority_then_fifo(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db")
+    queue.submit({"n": 1}, job_id="first")
+    queue.submit({"n": 2}, job_id="second")
+    queue.submit({"n": 3}, priority=5, job_id="urgent")
+
+    assert queue.position("urgent") == 1
+    assert queue.position("first") == 2
+    assert [queue.claim()["id"] for _ in range(3)] == ["urgent", "first", "second"]
+    assert queue.claim() is None
+
+
+def test_rejects_jobs_beyond_capacity(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db", max_queued=1)
+    queue.submit({})
+    try:
+        queue.submit({})
+    except QueueFullError:
+        pass
+    else:
+        raise AssertionError("second job should not fit")
+
+
+def test_keeps_jobs_of_a_live_owner(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db")
+    queue.submit({}, job_id="job")
+    queue.claim()
+
+    assert queue.recover() == 0
+    assert queue.get("job")["status"] == "running"
+
+
+def test_requeues_jobs_orphaned_by_a_restart(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db")
+    queue.submit({}, job_id="job")
+    queue.claim()
+    # Claimed before a reboot: same host, different boot ID, heartbeat still fresh
+    host, _, pid = job_queue.PROCESS_OWNER.rsplit(":", 2)
+    _set_owner(queue, "job", f"{host}:previous-boot:{pid}")
+
+    assert queue.recover() == 1
+    job = queue.get("job")
+    assert job["status"] == "queued"
+    assert job["owner"] is None
+    queue.claim()
+    assert queue.get("job")["attempts"] == 2
+
+
+def test_requeues_jobs_of_an_exited_process(tmp_path, monkeypatch):
+    queue = JobQueue(tmp_path / "jobs.db")
+    queue.submit({}, job_id="job")
+    queue.claim()
+    host, boot_id, _ = job_queue.PROCESS_OWNER.rsplit(":", 2)
+    _set_owner(queue, "job", f"{host}:{boot_id}:999999")
+    monkeypatch.setattr(job_queue, "_process_alive", lambda pid: False)
+
+    assert queue.recover() == 1
+
+
+def test_waits_for_heartbeats_of_other_hosts(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.db", stale_after=60)
+    queue.submit({}, job_id="job")
+    queue.claim()
+    _set_owner(queue, "job", "elsewhere:boot:1")
+    assert queue.recover() == 0
+
+    with queue._connect() as conn:
+        conn.execute("UPDATE jobs SET heartbeat_at = heartbeat_at - 120 WHERE id = 'job'")
+    assert queue.recover() == 1
+
+
+def test_migrates_databases_without_an_owner_column(tmp_path):
+    db_path = tmp_path / "jobs.db"
+    with sqlite3.connect(str(db_path)) as conn:
+        conn.execute("""
+            CREATE TABLE jobs (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT UNIQUE NOT NULL,
+                payload TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                heartbeat_at REAL,
+                finished_at REAL
+            )
+        """)
+    conn.close()
+
+    queue = JobQueue(db_path)
+    queue.submit({}, job_id="job")
+    queue.claim()
+    assert queue.get("job")["owner"] == job_queue.PROCESS_OWNER
+
+
+def test_max_running_is_shared_between_processes(tmp_path):
+    db_path = tmp_path / "jobs.db"
+    first = JobQueue(db_path, max_running=2)
+    # A second process opening the same database
+    second = JobQueue(db_path, max_running=2)
+    for n in range(3):
+        first.submit({"n": n}, job_id=f"job{n}")
+
+    assert first.claim()["id"] == "job0"
+    assert second.claim()["id"] == "job1"
+    assert first.claim() is None
+    assert second.claim() is None
+
+    second.complete("job1")
+    assert first.claim()["id"] == "job2"
+
+
+def test_worker_pool_restarts_after_fork(tmp_path, monkeypatch):
+    queue = JobQueue(tmp_path / "jobs.db")
+    pool = WorkerPool(queue, lambda job: None, num_workers=1, poll_interval=0.05)
+    pool.start()
+    try:
+        assert pool.started
+        # A forked child inherits the pool object but none of its threads
+        monkeypatch.setattr(job_queue.os, "getpid", lambda: -1)
+        assert not pool.started
+    finally:
+        pool.stop()
@@ -0,0 +1,61 @@
+"""
+Tests for math-aware text extraction: math fonts and glyphs, scripts, display formulas and regions.
+"""
+
+from math_text import extract_math_text, is_math_font, to_latex
+
+
+def _span(text, bbox, line=0, font="Times-Roman", size=10.0, flags=0):
+    return {"text": text, "bbox": bbox, "font": font, "size": size, "flags": flags, "line": line}
+
+
+def test_detects_math_fonts_with_subset_prefixes():
+    assert is_math_font("ABCDEF+CMMI10")
+    assert is_math_font("CambriaMath")
+    assert not is_math_font("ABCDEF+Times-Roman")
+
+
+def test_spells_glyphs_as_latex():
+    assert to_latex("α≤β") == r"\alpha\leq\beta"
+    assert to_latex("πr") == r"\pi r"
+
+
+def test_wraps_inline_math_in_text():
+    result = extract_math_text([
+        _span("where ", [0, 0, 30, 10]),
+        _span("x", [30, 0, 35, 10], font="CMMI10"),
+        _span(" is real", [35, 0, 75, 10]),
+    ])
+    assert result["text"] == "where $x$ is real"
+    assert result["regions"] == [{"latex": "x", "bbox": [30, 0, 35, 10], "display": False, "line": 0}]
+
+
+def test_merges_scripts_onto_their_base_word():
+    result = extract_math_text([
+        _span("Energy is E = mc", [0, 0, 80, 10]),
+        _span("2", [80, -2, 84, 4], size=7.0),
+    ])
+    assert result["text"] == "Energy is E = $mc^{2}$"
+    region = result["regions"][0]
+    assert region["latex"] == "mc^{2}"
+    # The region covers the base word's span as well as the script
+    assert region["bbox"] == [0, -2, 84, 10]
+
+
+def test_subscripts():
+    result = extract_math_text([
+        _span("the term a", [0, 0, 50, 10]),
+        _span("n", [50, 6, 54, 12], size=7.0),
+    ])
+    assert result["text"] == "the term $a_{n}$"
+
+
+def test_mostly_math_lines_are_display_formulas():
+    result = extract_math_text([
+        _span("∑", [0, 0, 10, 12], font="CMEX10"),
+        _span("x = ∞", [10, 0, 40, 12], font="CMMI10"),
+        _span("Next line", [0, 20, 50, 30], line=1),
+    ])
+    assert result["text"] == "$$\\sum x = \\infty$$\nNext line"
+    assert result["regions"][0]["display"]
+    assert result["regions"][0]["bbox"] == [0, 0, 40, 12]
@@ -0,0 +1,304 @@
+"""
+Tests for MathVideoGenerator helpers that run without the AI service or Manim.
+"""
+
+import time
+import types
+import threading
+import configparser
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("dotenv")
+
+import math_video_generator  # noqa: E402
+from math_video_generator import (  # noqa: E402
+    CompletionStreamMonitor,
+    GenerationAborted,
+    ManimProgressParser,
+    MathVideoGenerator,
+    extract_render_error,
+    is_fixable_render_failure,
+    write_manim_config,
+)
+
+TRACEBACK_OUTPUT = """Manim Community v0.18.0
+[01/02/24 10:00:00] INFO     Animation 0 : Partial movie file written in ...
+\x1b[31m╭──────────── Traceback (most recent call last) ────────────╮\x1b[0m
+│ generated_scene.py:12 in construct                          │
+│ ❱ 12         self.play(Craete(circle))                      │
+╰─────────────────────────────────────────────────────────────╯
+NameError: name 'Craete' is not defined
+"""
+
+
+def _generator(max_repair_attempts=2):
+    """A generator with no AI client, FFmpeg setup or catalog; tests stub what they call."""
+    generator = MathVideoGenerator.__new__(MathVideoGenerator)
+    generator.max_repair_attempts = max_repair_attempts
+    return generator
+
+
+def test_manim_config_shares_tex_and_text_caches(tmp_path):
+    config_path = write_manim_config(tmp_path / "cfg" / "manim.cfg", tmp_path / "shared")
+
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    assert config["CLI"]["tex_dir"] == (tmp_path / "shared" / "Tex").as_posix()
+    assert config["CLI"]["text_dir"] == (tmp_path / "shared" / "texts").as_posix()
+
+
+def test_manim_config_is_rewritten_only_when_it_changes(tmp_path):
+    config_path = write_manim_config(tmp_path / "manim.cfg", tmp_path / "shared")
+    mtime = config_path.stat().st_mtime_ns
+    write_manim_config(tmp_path / "manim.cfg", tmp_path / "shared")
+    assert config_path.stat().st_mtime_ns == mtime
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["manim.cfg"]
+
+
+def test_extract_render_error_keeps_the_last_traceback():
+    error = extract_render_error("Traceback (most recent call last):\nValueError: old\n" + TRACEBACK_OUTPUT)
+    assert error.startswith("Traceback (most recent call last)")
+    assert error.endswith("NameError: name 'Craete' is not defined")
+    assert "old" not in error
+    assert "\x1b" not in error and "│" not in error
+    assert "Partial movie file" not in error
+
+
+def test_extract_render_error_falls_back_to_the_log_tail():
+    output = "\n".join(f"line {n}" for n in range(100))
+    assert extract_render_error(output, max_lines=3) == "line 97\nline 98\nline 99"
+    assert len(extract_render_error("x" * 5000, max_chars=100)) == 100
+
+
+def test_scene_code_errors_are_fixable():
+    assert is_fixable_render_failure(TRACEBACK_OUTPUT)
+    assert is_fixable_render_failure("ValueError: latex error converting to dvi")
+
+
+@pytest.mark.parametrize("output", [
+    "'manim' is not recognized as an internal or external command",
+    "FileNotFoundError: [Errno 2] No such file or directory: 'latex'",
+    "RuntimeError: latex failed but did not produce a log file. Check your LaTeX installation.",
+    "subprocess.TimeoutExpired: Command '['ffmpeg']' timed out after 600 seconds",
+    "ModuleNotFoundError: No module named 'manim'",
+    "Render finished without output",
+])
+def test_environment_failures_are_not_fixable(output):
+    assert not is_fixable_render_failure(output)
+
+
+def test_repair_loop_stops_after_the_configured_attempts():
+    generator = _generator(max_repair_attempts=2)
+    renders = []
+    repairs = []
+    collected = {}
+
+    generator._plan_render = lambda scene, quality, use_cache, progress_callback: {"cached_video": None, "cmd": []}
+    generator._count_animations = lambda code: 1
+
+    def run_manim(cmd, total_animations, progress_callback):
+        renders.append(cmd)
+        return 1, TRACEBACK_OUTPUT
+
+    def repair_scene(scene, error, attempt, max_repairs, progress_callback=None):
+        repairs.append(attempt)
+        return {"code": f"repaired {attempt}"}
+
+    def collect_render(scene, plan, returncode, output, progress_callback=None, attempts=None):
+        collected.update(returncode=returncode, attempts=attempts, code=scene["code"])
+        return None
+
+    generator._run_manim = run_manim
+    generator._repair_scene = repair_scene
+    generator._collect_render = collect_render
+
+    assert generator.render_scene({"code": "original"}) is None
+    assert len(renders) == 3
+    assert repairs == [1, 2]
+    assert collected["code"] == "repaired 2"
+    assert [attempt["attempt"] for attempt in collected["attempts"]] == [1, 2, 3]
+    assert all(attempt["fixable"] for attempt in collected["attempts"])
+
+
+def test_repair_loop_skips_environment_failures():
+    generator = _generator(max_repair_attempts=2)
+    generator._plan_render = lambda *args: {"cached_video": None, "cmd": []}
+    generator._count_animations = lambda code: 1
+    generator._run_manim = lambda *args: (1, "'manim' is not recognized as an internal or external command")
+    generator._repair_scene = lambda *args, **kwargs: pytest.fail("environment failures must not be repaired")
+    generator._collect_render = lambda scene, plan, returncode, output, progress_callback=None, attempts=None: attempts
+
+    attempts = generator.render_scene({"code": "original"})
+    assert len(attempts) == 1
+    assert not attempts[0]["fixable"]
+
+
+class _Stream:
+    """Stand-in for a streamed completion: yields text chunks and records how far it was read."""
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.read = 0
+        self.closed = False
+
+    def __iter__(self):
+        for part in self.parts:
+            self.read += 1
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=part))])
+
+    def close(self):
+        self.closed = True
+
+
+def _streaming_generator(parts):
+    generator = _generator()
+    generator.model = "test-model"
+    generator.check_names = False
+    stream = _Stream(parts)
+    completions = types.SimpleNamespace(create=lambda **kwargs: stream)
+    generator.client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+    return generator, stream
+
+
+def test_stream_stops_at_the_closing_fence():
+    generator, stream = _streaming_generator([
+        "Here is the scene:\n```python\n", "from manim import *\n",
+        "class Demo(Scene):\n    def construct(self):\n", "        self.wait()\n", "```",
+        "\nThis explanation is never read.", "Nor is this."
+    ])
+    events = []
+
+    text = generator._stream_completion([], events.append)
+    assert text.startswith("```python") and text.endswith("```")
+    assert "explanation" not in text
+    assert stream.read == 5
+    assert stream.closed
+    assert any(event.get("scene_name") == "Demo" for event in events)
+
+
+def test_stream_aborts_on_malformed_code():
+    generator, stream = _streaming_generator([
+        "```python\nfrom manim import *\n", "def construct(self):\n    pass\n", "```", "\nmore prose"
+    ])
+
+    with pytest.raises(GenerationAborted, match="no Scene subclass"):
+        generator._stream_completion([])
+    assert stream.read == 3
+    assert stream.closed
+
+
+def test_stream_monitor_reports_latency_and_throughput(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(math_video_generator.time, "time", lambda: clock[0])
+    events = []
+    monitor = CompletionStreamMonitor(lambda code: None, events.append)
+
+    clock[0] = 102.0
+    monitor.feed("x")
+    clock[0] = 104.0
+    for _ in range(49):
+        monitor.feed("x")
+    clock[0] = 107.0
+    monitor.finish()
+
+    assert events[0]["time_to_first_token"] == 2.0
+    streaming_rate = [event["tokens_per_second"] for event in events if event["stage"] == "llm_streaming"
+                      and "tokens_per_second" in event]
+    assert streaming_rate == [25.0]
+    final = events[-1]
+    assert final["stage"] == "llm_response"
+    assert final["tokens"] == 50
+    assert final["time_to_first_token"] == 2.0
+    assert final["tokens_per_second"] == 10.0
+    assert [event["progress"] for event in events] == sorted(event["progress"] for event in events)
+
+
+def _manim_log(animations):
+    lines = ["Manim Community v0.18.0\n"]
+    for animation in range(animations):
+        for percent in (0, 25, 50, 100):
+            lines.append(f"Animation {animation} : Create(Circle):  {percent}%|#####     | {percent}/100 [00:01<00:01]\r")
+        lines.append(f"INFO     Animation {animation} : Partial movie file written in 'partial.mp4'\n")
+    lines.append("INFO     Combining to Movie file.\n")
+    lines.append("INFO     File ready at 'video.mp4'\n")
+    return lines
+
+
+def _parse(lines, total_animations):
+    events = []
+    parser = ManimProgressParser(total_animations, events.append)
+    for line in lines:
+        parser.feed(line)
+    return parser, events
+
+
+def test_manim_progress_is_monotonic_and_bounded():
+    parser, events = _parse(_manim_log(3), total_animations=3)
+    progress = [event["progress"] for event in events]
+
+    assert progress[0] == 30
+    assert progress[-1] == 92
+    assert progress == sorted(progress)
+    assert all(30 <= value <= 92 for value in progress)
+    assert events[-1]["stage"] == "combining"
+    rendering = [event for event in events if event["stage"] == "rendering"]
+    assert rendering[-1]["animation"] == 3
+    assert parser.output == "".join(_manim_log(3))
+
+
+def test_manim_progress_never_moves_back_when_there_are_more_animations():
+    # The static count underestimates scenes that play animations in loops
+    parser, events = _parse(_manim_log(5), total_animations=2)
+    progress = [event["progress"] for event in events]
+
+    assert progress == sorted(progress)
+    assert all(30 <= value <= 92 for value in progress)
+    assert parser.total_animations == 5
+    assert max(event["progress"] for event in events if event["stage"] == "rendering") <= 90
+
+
+def test_manim_progress_ignores_other_lines():
+    _, events = _parse(["INFO     Writing \"x\" to Tex file\n", "Rendering...\n"], total_animations=1)
+    assert [event["progress"] for event in events] == [30]
+
+
+def test_batch_keeps_input_order_isolates_failures_and_bounds_renders():
+    generator = _generator()
+    topics = [f"topic {n}" for n in range(8)]
+    lock = threading.Lock()
+    rendering = [0]
+    peak = [0]
+
+    def prepare_scene(topic, difficulty, duration):
+        index = int(topic.split()[1])
+        # Later topics finish generating first, so results arrive out of order
+        time.sleep(0.01 * (len(topics) - index))
+        if index == 2:
+            raise RuntimeError("AI service unavailable")
+        return {"topic": topic}
+
+    def render_scene(scene, quality):
+        with lock:
+            rendering[0] += 1
+            peak[0] = max(peak[0], rendering[0])
+        time.sleep(0.03)
+        with lock:
+            rendering[0] -= 1
+        if scene["topic"] == "topic 5":
+            return None
+        return f"{scene['topic']}.mp4"
+
+    generator.prepare_scene = prepare_scene
+    generator.render_scene = render_scene
+
+    results = generator.create_multiple_videos(topics, llm_concurrency=4, render_concurrency=2)
+
+    assert [result["topic"] for result in results] == topics
+    assert [result["success"] for result in results] == [n not in (2, 5) for n in range(8)]
+    assert results[0]["video_path"] == "topic 0.mp4"
+    assert results[2]["error"] == "AI service unavailable"
+    assert "render_seconds" not in results[2]["timings"]
+    assert results[5]["error"] == "Rendering failed"
+    assert 1 <= peak[0] <= 2
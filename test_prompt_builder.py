@@ -0,0 +1,57 @@
+"""
+Tests for prompt compaction: cleaning extracted PDF text and fitting it into a token budget.
+"""
+
+from prompt_builder import clean_text, compact_prompt, count_tokens, OMISSION
+
+
+def test_joins_hyphenation_and_collapses_whitespace():
+    assert clean_text("differen-\ntial   equations\r\n\n  of  order two") == \
+        "differential equations\nof order two"
+
+
+def test_drops_page_numbers_and_repeated_headers():
+    text = "Chapter 3 Calculus\nThe derivative of x^2\n12\nChapter 3 Calculus\nis 2x\n- 13 -"
+    assert clean_text(text) == "Chapter 3 Calculus\nThe derivative of x^2\nis 2x"
+
+
+def test_keeps_repeated_formulas():
+    text = "Since $a = b$\n$a = b$\nand again\n$a = b$"
+    assert clean_text(text).count("$a = b$") == 3
+
+
+def test_keeps_short_numeric_topics():
+    for topic in ("12", "1/2", "Page 3", "  7  "):
+        result = compact_prompt(topic)
+        assert result["text"] == topic.strip()
+        assert not result["truncated"]
+
+
+def test_keeps_numeric_lines_when_nothing_else_is_left():
+    assert clean_text("12\n1/2") == "12\n1/2"
+
+
+def test_short_topics_are_unchanged():
+    result = compact_prompt("Pythagorean theorem")
+    assert result["text"] == "Pythagorean theorem"
+    assert result["tokens_saved"] == 0
+    assert not result["truncated"]
+
+
+def test_long_text_fits_the_budget_and_keeps_key_lines():
+    filler = ["Some narrative sentence number %d about the history of the topic." % i for i in range(60)]
+    lines = filler[:30] + ["Theorem: $a^2 + b^2 = c^2$ for right triangles."] + filler[30:]
+    result = compact_prompt("\n".join(lines), token_budget=80)
+
+    assert result["truncated"]
+    assert result["tokens"] <= 80
+    assert count_tokens(result["text"]) == result["tokens"]
+    assert "Theorem: $a^2 + b^2 = c^2$" in result["text"]
+    assert OMISSION in result["text"]
+
+
+def test_single_long_line_is_truncated():
+    result = compact_prompt("word " * 1000, token_budget=20)
+    assert result["truncated"]
+    assert result["tokens"] <= 20
+    assert result["text"].endswith(OMISSION)
@@ -0,0 +1,88 @@
+"""
+Tests for the task status stores: versioned updates, TTL expiry of finished tasks
+and the bound on stored tasks.
+"""
+
+import time
+
+from task_store import TaskStore, SQLiteTaskStore
+
+
+def _age(store, task_id, seconds):
+    store._tasks[task_id]["updated_at"] -= seconds
+
+
+def test_update_merges_fields_and_bumps_version():
+    store = TaskStore()
+    store.update("task", status="processing", progress=10)
+    store.update("task", progress=50)
+
+    status = store.get("task")
+    assert status["status"] == "processing"
+    assert status["progress"] == 50
+    assert status["version"] == 2
+
+
+def test_finished_tasks_expire_after_ttl():
+    store = TaskStore(ttl=60)
+    store.set("done", {"status": "completed"})
+    store.set("running", {"status": "processing"})
+    _age(store, "done", 120)
+    _age(store, "running", 120)
+
+    assert store.get("done") is None
+    assert store.get("running") is not None
+
+    # Expired tasks are dropped on the next write
+    store.set("other", {"status": "queued"})
+    assert len(store) == 2
+
+
+def test_bound_drops_finished_tasks_first():
+    store = TaskStore(max_tasks=2)
+    store.set("running", {"status": "processing"})
+    store.set("done", {"status": "completed"})
+    store.set("new", {"status": "queued"})
+
+    assert len(store) == 2
+    assert store.get("done") is None
+    assert store.get("running") is not None
+
+
+def test_bound_drops_least_recently_updated():
+    store = TaskStore(max_tasks=2)
+    store.set("a", {"status": "processing"})
+    store.set("b", {"status": "processing"})
+    store.update("a", progress=10)
+    store.set("c", {"status": "processing"})
+
+    assert store.get("b") is None
+    assert store.get("a") is not None
+
+
+def test_wait_for_change_returns_on_update():
+    store = TaskStore()
+    store.set("task", {"status": "processing"})
+    started = time.time()
+    status = store.wait_for_change("task", 0, timeout=5)
+    assert status["version"] == 1
+    assert time.time() - started < 1
+
+
+def test_sqlite_store_expires_and_bounds(tmp_path):
+    store = SQLiteTaskStore(tmp_path / "tasks.db", ttl=60, max_tasks=2)
+    store.set("done", {"status": "completed"})
+    store.update("done", progress=100)
+    assert store.get("done")["version"] == 2
+
+    with store._connect() as conn:
+        conn.execute("UPDATE tasks SET updated_at = updated_at - 120 WHERE id = 'done'")
+    assert store.get("done") is None
+
+    for task_id in ("a", "b", "c"):
+        store.set(task_id, {"status": "processing"})
+    with store._connect() as conn:
+        conn.execute("UPDATE tasks SET updated_at = updated_at - 10 WHERE id = 'a'")
+    store.evict()
+    assert len(store) == 2
+    assert store.get("a") is None
@@ -0,0 +1,64 @@
+"""
+Tests for the page text index: rectangle and point selection, line blocks and serialization.
+"""
+
+from text_index import PageTextIndex
+
+
+def _span(text, bbox, line, size=10.0):
+    return {"text": text, "bbox": bbox, "size": size, "line": line}
+
+
+SPANS = [
+    _span("The ", [10, 10, 30, 20], 0),
+    _span("derivative", [30, 10, 90, 20], 0),
+    _span("of x", [10, 30, 40, 40], 1),
+    _span("Heading", [10, 60, 80, 76], 2, size=16.0),
+]
+
+
+def test_select_rect_returns_covered_lines_in_reading_order():
+    index = PageTextIndex.from_spans(SPANS)
+    assert index.select_rect(0, 0, 100, 45) == "The derivative\nof x"
+    assert index.select_rect(25, 5, 100, 25) == "derivative"
+
+
+def test_select_rect_requires_min_overlap():
+    index = PageTextIndex.from_spans(SPANS)
+    # Only the top quarter of the second line is inside
+    assert index.select_rect(0, 28, 100, 32) == ""
+    assert index.select_rect(0, 28, 100, 32, min_overlap=0.1) == "of x"
+
+
+def test_select_point_uses_tolerance():
+    index = PageTextIndex.from_spans(SPANS)
+    assert index.select_point(50, 15) == "derivative"
+    assert index.select_point(50, 22) == "derivative"
+    assert index.select_point(50, 26) == ""
+
+
+def test_tall_spans_are_found_from_below_their_top():
+    index = PageTextIndex.from_spans(SPANS)
+    assert index.select_point(40, 74) == "Heading"
+
+
+def test_line_blocks_merge_spans():
+    blocks = PageTextIndex.from_spans(SPANS).line_blocks()
+    assert [block["text"] for block in blocks] == ["The derivative", "of x", "Heading"]
+    assert blocks[0]["bbox"] == [10.0, 10.0, 90.0, 20.0]
+    assert blocks[2]["size"] == 16.0
+
+
+def test_round_trips_through_bytes():
+    index = PageTextIndex.from_spans(SPANS)
+    loaded = PageTextIndex.from_bytes(index.to_bytes())
+    assert loaded.text == index.text
+    assert loaded.select_rect(0, 0, 100, 45) == "The derivative\nof x"
+
+
+def test_empty_page():
+    index = PageTextIndex.from_spans([])
+    assert len(index) == 0
+    assert index.select_rect(0, 0, 100, 100) == ""
+    assert index.line_blocks() == []
+    assert len(PageTextIndex.from_bytes(index.to_bytes())) == 0
@@ -0,0 +1,75 @@
+"""
+Tests for the video catalog: recording renders, filtered and sorted listing, and pruning.
+"""
+
+import pytest
+
+from video_catalog import VideoCatalog
+
+
+def _add(catalog, tmp_path, name, size=10, **fields):
+    path = tmp_path / f"{name}.mp4"
+    path.write_bytes(b"v" * size)
+    return catalog.add(path, topic=name.replace("_", " "), **fields)
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    catalog = VideoCatalog(tmp_path / "catalog.db")
+    _add(catalog, tmp_path, "Pythagorean_theorem", size=30, difficulty="beginner", quality="low_quality")
+    _add(catalog, tmp_path, "Fourier_series", size=10, difficulty="advanced", quality="high_quality")
+    _add(catalog, tmp_path, "Unit_circle", size=20, difficulty="beginner", quality="high_quality")
+    return catalog
+
+
+def _topics(videos):
+    return [video["topic"] for video in videos]
+
+
+def test_lists_newest_first_with_totals(catalog):
+    videos, total = catalog.list(limit=2)
+    assert total == 3
+    assert _topics(videos) == ["Unit circle", "Fourier series"]
+    videos, _ = catalog.list(limit=2, offset=2)
+    assert _topics(videos) == ["Pythagorean theorem"]
+
+
+def test_filters_combine(catalog):
+    videos, total = catalog.list(difficulty="beginner", quality="high_quality")
+    assert total == 1
+    assert _topics(videos) == ["Unit circle"]
+    assert catalog.list(quality="medium_quality") == ([], 0)
+
+
+def test_topic_filter_is_a_literal_case_insensitive_substring(catalog, tmp_path):
+    _add(catalog, tmp_path, "100%_of_the_area")
+    assert _topics(catalog.list(topic="CIRCLE")[0]) == ["Unit circle"]
+    assert _topics(catalog.list(topic="100%")[0]) == ["100% of the area"]
+    # LIKE wildcards in the query are matched literally
+    assert catalog.list(topic="%")[1] == 1
+    assert catalog.list(topic="_")[1] == 0
+
+
+def test_sorts_by_any_allowed_column(catalog):
+    assert _topics(catalog.list(sort="size", descending=False)[0]) == \
+        ["Fourier series", "Unit circle", "Pythagorean theorem"]
+    assert _topics(catalog.list(sort="topic", descending=False)[0]) == \
+        ["Fourier series", "Pythagorean theorem", "Unit circle"]
+    with pytest.raises(ValueError):
+        catalog.list(sort="path; DROP TABLE videos")
+
+
+def test_looks_up_by_id_and_path(catalog, tmp_path):
+    video_id = _add(catalog, tmp_path, "Unit_circle", size=40, quality="medium_quality")
+    video = catalog.get(video_id)
+    # Re-adding the same file updates its entry instead of duplicating it
+    assert len(catalog) == 3
+    assert video["size"] == 40
+    assert catalog.get_by_path(tmp_path / "Unit_circle.mp4")["id"] == video_id
+    assert catalog.get("missing") is None
+
+
+def test_prunes_entries_whose_files_are_gone(catalog, tmp_path):
+    (tmp_path / "Fourier_series.mp4").unlink()
+    assert catalog.prune_missing() == 1
+    assert catalog.list(topic="fourier") == ([], 0)
@@ -0,0 +1,150 @@
+"""
+Text-Layer Index for PDF Pages
+Compact NumPy arrays of span boxes, font sizes and text offsets with a y-sorted band index,
+so rectangle and point selections resolve to text without walking Python dicts.
+"""
+
+import io
+
+import numpy as np
+
+
+class PageTextIndex:
+    """Spatial index over the text spans of one page, in PDF points."""
+
+    def __init__(self, boxes, sizes, lines, offsets, text):
+        """
+        Initialize the index.
+
+        Args:
+            boxes (array): (N, 4) span bounding boxes as x0, y0, x1, y1
+            sizes (array): (N,) font sizes
+            lines (array): (N,) line number of each span; spans of a line are contiguous
+            offsets (array): (N + 1,) start of each span in text, plus the end of the last
+            text (str): Every span's text, concatenated in reading order
+        """
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.sizes = np.asarray(sizes, dtype=np.float32)
+        self.lines = np.asarray(lines, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.text = str(text)
+
+        # Band index: spans sorted by top edge. A span overlapping [y0, y1] must start
+        # within max_height above y0, so two binary searches bound the candidates.
+        self._order = np.argsort(self.boxes[:, 1], kind="stable")
+        self._sorted_top = self.boxes[self._order, 1]
+        heights = self.boxes[:, 3] - self.boxes[:, 1]
+        self._max_height = float(heights.max()) if len(heights) else 0.0
+
+    @classmethod
+    def from_spans(cls, spans):
+        """Build the index from pdf_ingest span dicts (text, bbox, size, line)."""
+        texts = [span["text"] for span in spans]
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, texts), dtype=np.int64, count=len(texts)), out=offsets[1:])
+        return cls(
+            boxes=np.array([span["bbox"] for span in spans], dtype=np.float32).reshape(-1, 4),
+            sizes=np.fromiter((span["size"] for span in spans), dtype=np.float32, count=len(spans)),
+            lines=np.fromiter((span["line"] for span in spans), dtype=np.int32, count=len(spans)),
+            offsets=offsets,
+            text="".join(texts)
+        )
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def span_text(self, span_index):
+        return self.text[self.offsets[span_index]:self.offsets[span_index + 1]]
+
+    def _band(self, top, bottom):
+        """Indexes of spans that may overlap the horizontal band [top, bottom]."""
+        lo = np.searchsorted(self._sorted_top, top - self._max_height, side="left")
+        hi = np.searchsorted(self._sorted_top, bottom, side="right")
+        return self._order[lo:hi]
+
+    def _reading_order(self, indexes):
+        return indexes[np.lexsort((self.boxes[indexes, 0], self.lines[indexes]))]
+
+    def query_rect(self, x0, y0, x1, y1, min_overlap=0.5):
+        """
+        Find the spans covered by a rectangle.
+
+        Args:
+            x0, y0, x1, y1 (float): Rectangle in PDF points
+            min_overlap (float): Fraction of a span's area that must lie inside the rectangle
+
+        Returns:
+            ndarray: Span indexes in reading order
+        """
+        candidates = self._band(y0, y1)
+        boxes = self.boxes[candidates]
+        overlap_x = np.clip(np.minimum(boxes[:, 2], x1) - np.maximum(boxes[:, 0], x0), 0, None)
+        overlap_y = np.clip(np.minimum(boxes[:, 3], y1) - np.maximum(boxes[:, 1], y0), 0, None)
+        area = np.maximum((boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]), 1e-6)
+        return self._reading_order(candidates[overlap_x * overlap_y / area >= min_overlap])
+
+    def query_point(self, x, y, tolerance=2.0):
+        """Return the indexes of spans within tolerance points of (x, y), in reading order."""
+        candidates = self._band(y - tolerance, y + tolerance)
+        boxes = self.boxes[candidates]
+        hit = ((boxes[:, 0] - tolerance <= x) & (x <= boxes[:, 2] + tolerance) &
+               (boxes[:, 1] - tolerance <= y) & (y <= boxes[:, 3] + tolerance))
+        return self._reading_order(candidates[hit])
+
+    def text_of(self, span_indexes):
+        """Join spans into text, one output line per PDF line."""
+        parts = []
+        previous_line = None
+        for span_index in span_indexes:
+            line = self.lines[span_index]
+            if previous_line is not None and line != previous_line:
+                parts.append("\n")
+            parts.append(self.span_text(span_index))
+            previous_line = line
+        return "".join(parts)
+
+    def select_rect(self, x0, y0, x1, y1, min_overlap=0.5):
+        """Return the text covered by a rectangle in PDF points."""
+        return self.text_of(self.query_rect(x0, y0, x1, y1, min_overlap))
+
+    def select_point(self, x, y, tolerance=2.0):
+        """Return the text of the spans at a point in PDF points."""
+        return self.text_of(self.query_point(x, y, tolerance))
+
+    def line_blocks(self):
+        """
+        Merge spans into one overlay block per line.
+
+        Returns:
+            list: dicts with text, bbox (covering the line) and size (largest font on the line)
+        """
+        if not len(self):
+            return []
+        starts = np.flatnonzero(np.r_[True, self.lines[1:] != self.lines[:-1]])
+        ends = np.r_[starts[1:], len(self)]
+        x0 = np.minimum.reduceat(self.boxes[:, 0], starts)
+        y0 = np.minimum.reduceat(self.boxes[:, 1], starts)
+        x1 = np.maximum.reduceat(self.boxes[:, 2], starts)
+        y1 = np.maximum.reduceat(self.boxes[:, 3], starts)
+        sizes = np.maximum.reduceat(self.sizes, starts)
+        return [
+            {
+                "text": self.text[self.offsets[start]:self.offsets[end]],
+                "bbox": [float(x0[i]), float(y0[i]), float(x1[i]), float(y1[i])],
+                "size": float(sizes[i])
+            }
+            for i, (start, end) in enumerate(zip(starts, ends))
+        ]
+
+    def to_bytes(self):
+        """Serialize the index as an uncompressed .npz archive."""
+        buffer = io.BytesIO()
+        np.savez(buffer, boxes=self.boxes, sizes=self.sizes, lines=self.lines,
+                 offsets=self.offsets, text=np.array(self.text))
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Load an index written by to_bytes()."""
+        with np.load(io.BytesIO(data)) as arrays:
+            return cls(arrays["boxes"], arrays["sizes"], arrays["lines"], arrays["offsets"], arrays["text"].item())
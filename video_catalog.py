@@ -0,0 +1,184 @@
+"""
+Video Catalog for Math Video Generator
+SQLite index of rendered videos, so listing the library never walks the media tree.
+"""
+
+import os
+import time
+import uuid
+import sqlite3
+from pathlib import Path
+from contextlib import contextmanager
+
+# Columns the listing API may sort by
+SORT_COLUMNS = ("created_at", "updated_at", "topic", "size", "duration", "quality", "difficulty")
+
+
+class VideoCatalog:
+    """Persistent catalog of rendered videos with filtered, sorted and paginated listing."""
+
+    def __init__(self, db_path):
+        """
+        Initialize the catalog.
+
+        Args:
+            db_path (str | Path): SQLite database file
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS videos (
+                    id TEXT PRIMARY KEY,
+                    path TEXT UNIQUE NOT NULL,
+                    topic TEXT,
+                    difficulty TEXT,
+                    quality TEXT,
+                    duration INTEGER,
+                    size INTEGER,
+                    code_hash TEXT,
+                    scene_name TEXT,
+                    job_id TEXT,
+                    render_seconds REAL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_created ON videos (created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_topic ON videos (topic)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_quality ON videos (quality, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_code ON videos (code_hash)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def add(self, path, topic=None, difficulty=None, quality=None, duration=None, code_hash=None,
+            scene_name=None, job_id=None, render_seconds=None):
+        """
+        Record a rendered video, replacing the entry for the same file if there is one.
+
+        Args:
+            path (str | Path): Location of the mp4
+            topic (str): Topic the video explains
+            difficulty (str): Difficulty level
+            quality (str): Render quality (low_quality, medium_quality, high_quality)
+            duration (int): Requested duration in seconds
+            code_hash (str): Hash of the rendered scene code
+            scene_name (str): Manim scene class
+            job_id (str): Job directory the video was rendered in
+            render_seconds (float): Time spent in Manim
+
+        Returns:
+            str: The video ID
+        """
+        path = str(path)
+        now = time.time()
+        size = os.path.getsize(path)
+
+        with self._connect() as conn:
+            row = conn.execute("SELECT id FROM videos WHERE path = ?", (path,)).fetchone()
+            video_id = row["id"] if row else uuid.uuid4().hex
+            conn.execute(
+                """
+                INSERT INTO videos (id, path, topic, difficulty, quality, duration, size, code_hash,
+                                    scene_name, job_id, render_seconds, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    topic = excluded.topic, difficulty = excluded.difficulty, quality = excluded.quality,
+                    duration = excluded.duration, size = excluded.size, code_hash = excluded.code_hash,
+                    scene_name = excluded.scene_name, job_id = excluded.job_id,
+                    render_seconds = excluded.render_seconds, updated_at = excluded.updated_at
+                """,
+                (video_id, path, topic, difficulty, quality, duration, size, code_hash,
+                 scene_name, job_id, render_seconds, now, now)
+            )
+        return video_id
+
+    def get(self, video_id):
+        """Return a video by ID, or None if it is not cataloged."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM videos WHERE id = ?", (video_id,)).fetchone()
+        return dict(row) if row else None
+
+    def get_by_path(self, path):
+        """Return the video recorded for a file path, or None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM videos WHERE path = ?", (str(path),)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, limit=20, offset=0, topic=None, difficulty=None, quality=None,
+             sort="created_at", descending=True):
+        """
+        List videos with optional filters.
+
+        Args:
+            limit (int): Maximum number of videos returned
+            offset (int): Number of matching videos skipped
+            topic (str): Case-insensitive substring the topic must contain
+            difficulty (str): Exact difficulty level
+            quality (str): Exact quality
+            sort (str): One of SORT_COLUMNS
+            descending (bool): Sort order
+
+        Returns:
+            tuple: (list of video dicts, total number of matching videos)
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort!r}; choose one of {', '.join(SORT_COLUMNS)}")
+
+        clauses, params = [], []
+        if topic:
+            clauses.append("topic LIKE ? ESCAPE '\\'")
+            escaped = topic.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.append(f"%{escaped}%")
+        if difficulty:
+            clauses.append("difficulty = ?")
+            params.append(difficulty)
+        if quality:
+            clauses.append("quality = ?")
+            params.append(quality)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        order = "DESC" if descending else "ASC"
+
+        with self._connect() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM videos {where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT * FROM videos {where} ORDER BY {sort} {order}, rowid {order} LIMIT ? OFFSET ?",
+                (*params, int(limit), int(offset))
+            ).fetchall()
+        return [dict(row) for row in rows], total
+
+    def delete(self, video_id):
+        """Remove a video from the catalog (the file itself is left alone)."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM videos WHERE id = ?", (video_id,))
+
+    def prune_missing(self):
+        """
+        Drop entries whose files no longer exist.
+
+        Returns:
+            int: Number of entries removed
+        """
+        with self._connect() as conn:
+            rows = conn.execute("SELECT id, path FROM videos").fetchall()
+            missing = [(row["id"],) for row in rows if not os.path.exists(row["path"])]
+            conn.executemany("DELETE FROM videos WHERE id = ?", missing)
+        return len(missing)
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+
+
+def create_video_catalog():
+    """Open the video catalog at MVG_CATALOG_DB (default math_videos/catalog.db)."""
+    return VideoCatalog(os.environ.get("MVG_CATALOG_DB", "math_videos/catalog.db"))